@@ -0,0 +1,176 @@
+# ann_index.py
+import os
+import threading
+
+import numpy as np
+
+from vector_index import ExactSearch, top_k_rows
+
+# Approximate nearest-neighbour configuration
+ANN_BACKEND = os.getenv('ANN_BACKEND', 'exact')  # 'exact' or 'ivf'
+ANN_MIN_SIZE = int(os.getenv('ANN_MIN_SIZE', '20000'))  # exact scan below this many rows
+IVF_NLIST = int(os.getenv('IVF_NLIST', '0'))  # 0 = pick 4 * sqrt(rows)
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '16'))  # lists scanned per query (recall vs latency)
+
+
+def _kmeans(vectors, n_clusters: int, iterations: int = 10, seed: int = 0):
+    """Spherical k-means on normalized vectors; returns normalized centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        # Re-seed empty clusters so every list stays useful
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+def _assign(vectors, centroids, chunk_size: int = 8192):
+    """Return the nearest centroid for each vector, in memory-bounded chunks"""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk_size):
+        block = vectors[start:start + chunk_size]
+        assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFSearch:
+    """Inverted-file ANN backend built on NumPy.
+
+    Rows are clustered with spherical k-means into ``nlist`` lists; a query
+    only scores the rows in its ``nprobe`` closest lists. Indexes smaller than
+    ``min_size`` rows (or not trained yet) are searched exactly. Training runs
+    in a background thread and is repeated once the index has grown by
+    ``retrain_growth``; rows written after training are assigned to their
+    nearest list immediately.
+    """
+
+    name = 'ivf'
+
+    def __init__(self, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, min_size: int = ANN_MIN_SIZE,
+                 retrain_growth: float = 2.0, sample_per_list: int = 64, background: bool = True):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_size = min_size
+        self.retrain_growth = retrain_growth
+        self.sample_per_list = sample_per_list
+        self.background = background
+        self.exact = ExactSearch()
+        self.centroids = None
+        self.trained_size = 0
+        self._lists = []
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lock = threading.Lock()
+        self._trainer = None
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _needs_training(self, index) -> bool:
+        if index.size < self.min_size:
+            return False
+        return not self.trained or index.size >= self.trained_size * self.retrain_growth
+
+    def _maybe_train(self, index):
+        if not self._needs_training(index):
+            return
+        if not self.background:
+            self.train(index)
+            return
+        with self._lock:
+            if self._trainer is not None and self._trainer.is_alive():
+                return
+            self._trainer = threading.Thread(target=self.train, args=(index,), daemon=True)
+            self._trainer.start()
+
+    def train(self, index):
+        """Cluster the current rows and rebuild every inverted list"""
+        size = index.size
+        vectors = index.vectors[:size]
+        nlist = self.nlist or max(1, int(4 * np.sqrt(size)))
+        nlist = min(nlist, size)
+        rng = np.random.default_rng(0)
+        sample_size = min(size, nlist * self.sample_per_list)
+        sample = vectors[rng.choice(size, sample_size, replace=False)]
+        centroids = _kmeans(sample, nlist)
+        assignments = _assign(vectors, centroids)
+
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(nlist + 1))
+        lists = [list(order[bounds[i]:bounds[i + 1]]) for i in range(nlist)]
+
+        with self._lock:
+            # Rows appended while training ran are assigned to their nearest list
+            extra = _assign(index.vectors[size:], centroids)
+            for row, target in enumerate(extra, start=size):
+                lists[target].append(row)
+            self._assignments = np.concatenate([assignments, extra])
+            self._lists = [np.asarray(rows, dtype=np.int64) for rows in lists]
+            self.centroids = centroids
+            self.trained_size = size
+        print(f"IVF index trained: {size} rows, {nlist} lists")
+
+    def on_upsert(self, index, row, vector):
+        if self.trained:
+            with self._lock:
+                target = int(np.argmax(self.centroids @ vector))
+                if row >= len(self._assignments):
+                    grown = np.full(max(row + 1, len(self._assignments) * 2), -1, dtype=np.int32)
+                    grown[:len(self._assignments)] = self._assignments
+                    self._assignments = grown
+                if self._assignments[row] != target:
+                    self._assignments[row] = target
+                    self._lists[target] = np.append(self._lists[target], row)
+        self._maybe_train(index)
+
+    def on_attach(self, index):
+        # Every row was replaced at once: drop the lists and retrain from scratch
+        with self._lock:
+            self.centroids = None
+            self.trained_size = 0
+            self._lists = []
+            self._assignments = np.zeros(0, dtype=np.int32)
+        self._maybe_train(index)
+
+    def search(self, index, query, top_k: int):
+        self._maybe_train(index)
+        if not self.trained or index.size < self.min_size:
+            return self.exact.search(index, query, top_k)
+
+        with self._lock:
+            centroids = self.centroids
+            lists = self._lists
+            assignments = self._assignments
+        nprobe = min(self.nprobe, len(centroids))
+        probes = np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]
+        candidates = np.unique(np.concatenate([lists[p] for p in probes]))
+        # Rows that moved to another list since they were appended are stale here
+        candidates = candidates[np.isin(assignments[candidates], probes)]
+        if len(candidates) < top_k:
+            return self.exact.search(index, query, top_k)
+        return top_k_rows(index.vectors[candidates] @ query, top_k, rows=candidates)
+
+    def stats(self) -> dict:
+        return {
+            'backend': self.name,
+            'trained': self.trained,
+            'trained_size': self.trained_size,
+            'nlist': len(self.centroids) if self.trained else 0,
+            'nprobe': self.nprobe
+        }
+
+
+def make_backend(name: str = ANN_BACKEND):
+    """Return the search backend configured by ``ANN_BACKEND``"""
+    if name == 'ivf':
+        return IVFSearch()
+    if name != 'exact':
+        print(f"Unknown ANN_BACKEND '{name}', falling back to exact search")
+    return ExactSearch()
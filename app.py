@@ -1,25 +1,254 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import base64
+import hmac
+import io
 import json
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache, normalize_query, normalize_rows
+from scoring import ScoringEngine, MATCH_THRESHOLD, STYLE_PRECISION
+from vector_index import VectorIndex, top_k_rows
+from lexical_index import LexicalIndex
+from ann_index import make_backend
+from batch_encoder import BatchingEncoder
+from shared_store import SHARED_PENDING_LIMIT, SHARED_STORE_DIR
+from model_loader import ModelHolder, PRELOAD_MODEL
+from result_cache import RecommendationCache, SearchResultCache
+from group_index import GroupIndex
+from schedule_grid import mask_schedule, schedule_mask, schedule_overlap
+from profile_record import ProfileRecord
+from metrics import metrics, server_timing
+from auth import password_hasher, token_required, verified_tokens
+from chat_push import CHAT_WSGI_MAX_STREAMS
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize the BERT model (this will download on first run)
-model = SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')
+MODEL_NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+# Shared secret for /api/students/bulk (X-Import-Key header); empty disables the endpoint
+BULK_IMPORT_KEY = os.getenv('BULK_IMPORT_KEY', '')
+
+# Largest page /api/recommend returns when a 'limit' is given
+MAX_RECOMMENDATION_PAGE = int(os.getenv('MAX_RECOMMENDATION_PAGE', '100'))
+
+# /api/search: 'hybrid' fuses BM25 and embedding scores, 'semantic' and 'lexical' use one of them
+SEARCH_MODE = os.getenv('SEARCH_MODE', 'hybrid')
+SEARCH_MODES = ('hybrid', 'semantic', 'lexical')
+SEARCH_LEXICAL_WEIGHT = float(os.getenv('SEARCH_LEXICAL_WEIGHT', '0.3'))  # share of BM25 in the fused score
+SEARCH_SHORTLIST = int(os.getenv('SEARCH_SHORTLIST', '200'))  # candidates taken from each stage
+# Above this many students the semantic stage only reranks the BM25 shortlist
+SEARCH_RERANK_MIN_ROWS = int(os.getenv('SEARCH_RERANK_MIN_ROWS', '20000'))
+
+# Load all user profiles from MySQL into the matcher when the app starts
+WARM_START = os.getenv('STUDYSYNC_WARM_START', '1') == '1'
+
+# Initialize the BERT model (this will download on first run). With
+# STUDYSYNC_PRELOAD_MODEL=0 the app starts immediately and loads it in the
+# background; under gunicorn's preload_app it is loaded once in the master.
+model = ModelHolder(MODEL_NAME)
+if PRELOAD_MODEL:
+    model.load()
+
+# Stored embeddings (disk cache and text_embeddings rows) are keyed by the
+# weights actually served, so fp32 and int8 vectors never mix
+EMBEDDING_MODEL = model.variant
+EMBEDDING_NAMESPACE = model.quantize if EMBEDDING_MODEL != MODEL_NAME else ''
+
+# All request threads share one encoder so concurrent encodes run as one batch
+encoder = BatchingEncoder(model)
+
+# Row-aligned students, scoring features, profile embeddings and profile terms;
+# swapped as one unit when a shared snapshot is attached
+MatcherState = namedtuple('MatcherState', ['students', 'scoring', 'search_index', 'lexical_index'])
+
+def encode_cursor(match_percentage: int, rec_id: int) -> str:
+    """Opaque pagination cursor pointing after the given card"""
+    return base64.urlsafe_b64encode(f"{match_percentage}:{rec_id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        match_percentage, rec_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return int(match_percentage), int(rec_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
 
 class AIStudentMatcher:
-    def __init__(self):
+    def __init__(self, embeddings=None):
         self.model = model
-        self.students = []
+        # Content-hash keyed LRU shared by every embedding lookup
+        self.embeddings = embeddings or EmbeddingCache(encoder.encode, namespace=EMBEDDING_NAMESPACE)
+        # scoring: columnar features used to score every candidate at once
+        # search_index: profile-text embeddings used by /api/search, one row per student
+        # lexical_index: BM25 postings of the same profile text, None until the first keyword search
+        self.state = MatcherState([], ScoringEngine(), VectorIndex(make_backend()), None)
+        # Incremented on every write; the shared store republishes when it changes
+        self.version = 0
+        self.write_lock = threading.Lock()
+        self._lexical_build_lock = threading.Lock()
+        # Latest SHARED_PENDING_LIMIT (version, profile) writes since the last shared snapshot (None = not tracked)
+        self.pending_profiles = None
+        # Ranked matches per target profile, invalidated by subject/slot
+        self.results = RecommendationCache()
+        # /api/search: embeddings per normalized query, and recent results per index version
+        self.query_embeddings = QueryEmbeddingCache(encoder.encode)
+        self.search_results = SearchResultCache()
+        # Real study groups as aggregate member profiles, one scoring row per group
+        self.groups = GroupIndex()
+    
+    @property
+    def students(self):
+        return self.state.students
+    
+    @property
+    def scoring(self):
+        return self.state.scoring
+    
+    @property
+    def search_index(self):
+        return self.state.search_index
+    
+    @property
+    def lexical_index(self):
+        return self.state.lexical_index
     
     def add_student(self, student_data):
-        self.students.append(student_data)
-        print(f"Added student: {student_data.get('name')}. Total students: {len(self.students)}")
-        return len(self.students) - 1
+        """Add a student, or replace their profile if the id is already known"""
+        return self.add_students([student_data])[0]
+    
+    def add_students(self, profiles):
+        """Add or replace many students with one batched encode and one write; returns their rows"""
+        # Encode every text in one call; get_style_vector then hits the cache
+        texts = [text for profile in profiles for text in self.get_embedding_texts(profile)]
+        with metrics.timer('add_student.encode'):
+            self.embeddings.encode_many(texts)
+        with metrics.timer('add_student.store'), self.write_lock:
+            rows = [self._store(profile) for profile in profiles]
+            self.version += 1
+            if self.pending_profiles is not None:
+                self.pending_profiles.extend((self.version, profile) for profile in profiles)
+        return rows
+    
+    def _store(self, student_data):
+        students, scoring, search_index, lexical_index = self.state
+        student_data['scheduleMask'] = schedule_mask(student_data.get('schedule'))
+        style_vector = self.get_style_vector(student_data)
+        student_id = student_data.get('id')
+        rows = scoring.rows_for(student_id) if student_id is not None else []
+        if rows:
+            row = rows[0]
+            # Targets that could match the old or the new profile must be re-ranked
+            self.results.invalidate(students[row], student_data)
+            students[row] = ProfileRecord.from_profile(student_data)
+            scoring.update(row, student_data, style_vector)
+            metrics.increment('students.updated')
+        else:
+            self.results.invalidate(student_data)
+            students.append(ProfileRecord.from_profile(student_data))
+            row = scoring.add(student_data, style_vector)
+            metrics.increment('students.added')
+        search_index.upsert(row, self.embeddings.encode(self.get_profile_text(student_data)))
+        if lexical_index is not None:
+            lexical_index.upsert(row, *self.search_terms(students[row]))
+        return row
+    
+    def attach(self, scoring, search_index, students, lexical_index, published=None):
+        """Switch to a shared snapshot, replaying profiles it does not contain yet.
+
+        ``published`` is the matcher version the snapshot was written from
+        when this matcher wrote it: profiles stored up to that version are in
+        it, later ones (written while it was published) are replayed.
+        """
+        with self.write_lock:
+            pending = self.pending_profiles or []
+            if published is not None:
+                pending = [(version, profile) for version, profile in pending if version > published]
+            self.state = MatcherState(students, scoring, search_index, lexical_index)
+            self.results.clear()
+            self.search_results.clear()
+            self.pending_profiles = deque(maxlen=SHARED_PENDING_LIMIT)
+            for version, profile in pending:
+                rows = scoring.rows_for(profile.get('id')) if profile.get('id') is not None else []
+                if rows and students[rows[0]].matches(profile):
+                    continue
+                self._store(profile)
+                self.pending_profiles.append((version, profile))
+    
+    def get_embedding_texts(self, student):
+        """Every text add_student needs an embedding for"""
+        learning_style = student.get('learningStyle', '')
+        profile_text = self.get_profile_text(student)
+        return [profile_text, learning_style] if learning_style else [profile_text]
+    
+    @staticmethod
+    def get_profile_text(student):
+        """Text that represents a student in semantic search"""
+        text_parts = []
+        name = student.get('name', '')
+        major = student.get('major', '')
+        subjects = ", ".join(student.get('subjects', []))
+        learning_style = student.get('learningStyle', '')
+        if name:
+            text_parts.append(name)
+        if major:
+            text_parts.append(major)
+        if subjects:
+            text_parts.append(subjects)
+        if learning_style:
+            text_parts.append(learning_style)
+        return ' '.join(text_parts).strip()
+    
+    def search_version(self) -> tuple:
+        """Changes whenever a search could rank differently (student or group writes)"""
+        # The keyword index is written with the search index, so its version adds nothing
+        return self.state.search_index.version, self.groups.version
+    
+    def keyword_index(self):
+        """The students' BM25 index, built from the current students on first use.
+
+        Shared snapshots carry their index; without one, a worker that never
+        serves a keyword search never holds it. Once built it is kept up to
+        date by _store.
+        """
+        lexical_index = self.state.lexical_index
+        if lexical_index is not None:
+            return lexical_index
+        with self._lexical_build_lock, metrics.timer('search.lexical_build'):
+            # Built off the write lock; a profile stored meanwhile means building again under it
+            state, version = self.state, self.version
+            if state.lexical_index is not None:
+                return state.lexical_index
+            lexical_index = LexicalIndex.build(self.search_terms(record) for record in state.students)
+            with self.write_lock:
+                if self.state is not state or self.version != version:
+                    lexical_index = self.state.lexical_index or LexicalIndex.build(
+                        self.search_terms(record) for record in self.state.students)
+                self.state = self.state._replace(lexical_index=lexical_index)
+            return lexical_index
+    
+    @classmethod
+    def search_terms(cls, record):
+        """Text and whole-field phrases a student record is indexed under for keyword search"""
+        return cls.get_profile_text(record), [record.major, *record.subjects]
+    
+    def get_style_vector(self, student):
+        """Return the normalized learningStyle embedding, encoding only when the text changed"""
+        style = student.get('learningStyle', '')
+        if not style:
+            return None
+        student_id = student.get('id')
+        rows = self.scoring.rows_for(student_id) if student_id is not None else []
+        if rows:
+            # Reuse the row already stored for this student if the text is unchanged
+            stored = self.scoring.stored_style_vector(rows[0], style)
+            if stored is not None:
+                return stored
+        return self.embeddings.encode(style)
     
     def calculate_subject_similarity(self, student1, student2):
         subjects1 = set(student1.get('subjects', []))
@@ -33,114 +262,127 @@ class AIStudentMatcher:
     def calculate_schedule_overlap(self, schedule1, schedule2):
         if not schedule1 or not schedule2:
             return 0
-        
-        overlap_count = 0
-        total_slots = 0
-        
-        for day in schedule1:
-            if day in schedule2:
-                slots1 = set(schedule1[day])
-                slots2 = set(schedule2[day])
-                overlap_count += len(slots1.intersection(slots2))
-                total_slots += len(slots1.union(slots2))
-        
-        return overlap_count / max(total_slots, 1)
+        # Shared free cells over the union of cells on days both listed, as popcounts
+        return schedule_overlap(schedule_mask(schedule1), schedule_mask(schedule2))
     
     def calculate_learning_style_similarity(self, student1, student2):
-        style1 = student1.get('learningStyle', '')
-        style2 = student2.get('learningStyle', '')
+        embedding1 = self.get_style_vector(student1)
+        embedding2 = self.get_style_vector(student2)
         
-        if not style1 or not style2:
+        if embedding1 is None or embedding2 is None:
             return 0
         
-        # Use BERT embeddings for semantic similarity
-        embeddings = self.model.encode([style1, style2])
-        similarity = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
-        return max(0, float(similarity))  # Convert to float and ensure non-negative
+        # Cached embeddings are normalized, so the dot product is the cosine similarity
+        similarity = round(float(np.dot(embedding1, embedding2)), STYLE_PRECISION)
+        return max(0, similarity)  # Convert to float and ensure non-negative
     
-    def generate_recommendations(self, target_student):
-        print(f"\n=== Generating recommendations for: {target_student.get('name')} ===")
-        print(f"Total students in database: {len(self.students)}")
-        print(f"Target student subjects: {target_student.get('subjects')}")
-        
-        recommendations = []
-        
+    def rank_matches(self, target_student, state=None):
+        """Score every candidate and return the matches in row order.
+
+        Returns the ``ScoringEngine.match`` arrays without the target's own
+        rows, plus ``ids``: the 1-based position of each match in row order,
+        which is the id the recommendation card gets.
+        """
+        state = state or self.state
+        # Only students sharing a subject or time slot can pass the threshold;
+        # they are scored in one vectorized pass
+        with metrics.timer('recommend.encode'):
+            style_vector = self.get_style_vector(target_student)
+        with metrics.timer('recommend.score'):
+            scores = state.scoring.match(target_student, style_vector, MATCH_THRESHOLD)
+        metrics.increment('recommend.candidates', scores['candidates'])
+        metrics.increment('recommend.scored', scores['scored'])
+        metrics.increment('recommend.pruned', scores['candidates'] - scores['scored'])
         # Only match with OTHER students (not yourself)
-        for i, student in enumerate(self.students):
-            if student['id'] == target_student['id']:
-                print(f"Skipping self: {student.get('name')}")
-                continue
-            
-            print(f"\nComparing with: {student.get('name')}")
-            
-            # Calculate compatibility scores
-            subject_score = float(self.calculate_subject_similarity(target_student, student))
-            schedule_score = float(self.calculate_schedule_overlap(
-                target_student.get('schedule', {}), 
-                student.get('schedule', {})
-            ))
-            learning_style_score = float(self.calculate_learning_style_similarity(target_student, student))
-            
-            print(f"  Subject similarity: {subject_score:.2f}")
-            print(f"  Schedule overlap: {schedule_score:.2f}")
-            print(f"  Learning style similarity: {learning_style_score:.2f}")
-            
-            # Performance balance (prefer similar levels)
-            perf1 = target_student.get('performanceLevel', 3)
-            perf2 = student.get('performanceLevel', 3)
-            performance_score = 1 - abs(perf1 - perf2) / 4  # Normalize to 0-1
-            
-            # Weighted composite score
-            weights = {
-                'subject': 0.4,
-                'schedule': 0.3,
-                'learning_style': 0.2,
-                'performance': 0.1
+        own_rows = state.scoring.rows_for(target_student['id'])
+        if own_rows:
+            keep = ~np.isin(scores['rows'], own_rows)
+            scores = {key: value[keep] if isinstance(value, np.ndarray) else value for key, value in scores.items()}
+        scores['ids'] = np.arange(1, len(scores['rows']) + 1)
+        return scores
+    
+    def build_recommendation(self, student, scores, i):
+        """Response card for match ``i`` (``student`` is its ProfileRecord); strings are built here only"""
+        subject_score = float(scores['subject'][i])
+        schedule_score = float(scores['schedule'][i])
+        learning_style_score = float(scores['learning_style'][i])
+        performance_score = float(scores['performance'][i])
+        return {
+            'id': int(scores['ids'][i]),
+            'title': f"{student.get('major', 'Study')} Group",
+            # IMPORTANT: use int() to avoid numpy int64 serialization error
+            'matchPercentage': int(scores['match_percentage'][i]),
+            'memberInfo': '3-5 members, actively seeking',
+            'schedule': self.format_schedule(student.schedule),
+            'focus': ', '.join(student.subjects[:2]),
+            'location': 'Campus Study Areas',
+            'action': 'Request to Join',
+            'suggested': False,
+            'explanation': self.generate_explanation(
+                subject_score, schedule_score, learning_style_score, performance_score
+            ),
+            'compatibility': {
+                'subject': subject_score,
+                'schedule': schedule_score,
+                'learningStyle': learning_style_score,
+                'performance': performance_score
             }
-            
-            composite_score = (
-                subject_score * weights['subject'] +
-                schedule_score * weights['schedule'] +
-                learning_style_score * weights['learning_style'] +
-                performance_score * weights['performance']
-            )
-            
-            # Convert to percentage - IMPORTANT: use int() to avoid float32 serialization error
-            match_percentage = int(composite_score * 100)
-            print(f"  COMPOSITE MATCH: {match_percentage}%")
-            
-            if match_percentage > 50:  # Only include decent matches
-                recommendations.append({
-                    'id': len(recommendations) + 1,
-                    'title': f"{student.get('major', 'Study')} Group",
-                    'matchPercentage': match_percentage,
-                    'memberInfo': '3-5 members, actively seeking',
-                    'schedule': self.format_schedule(student.get('schedule', {})),
-                    'focus': ', '.join(student.get('subjects', [])[:2]),
-                    'location': 'Campus Study Areas',
-                    'action': 'Request to Join',
-                    'suggested': False,
-                    'explanation': self.generate_explanation(
-                        subject_score, schedule_score, learning_style_score, performance_score
-                    ),
-                    'compatibility': {
-                        'subject': float(subject_score),
-                        'schedule': float(schedule_score),
-                        'learningStyle': float(learning_style_score),
-                        'performance': float(performance_score)
-                    }
-                })
-        
-        # Sort by match percentage
-        recommendations.sort(key=lambda x: x['matchPercentage'], reverse=True)
+        }
+    
+    def generate_recommendations(self, target_student, limit=None, cursor=None):
+        """Return recommendation cards, best first.
+
+        Without ``limit`` every match is returned. With ``limit`` only the
+        next ``limit`` matches after ``cursor`` are built; use
+        ``recommendation_page`` to also get the cursor of the following page.
+        """
+        return self.recommendation_page(target_student, limit, cursor)['recommendations']
+    
+    def recommendation_page(self, target_student, limit=None, cursor=None):
+        """One page of recommendations plus the cursor of the next page (None on the last page)"""
+        key = self.results.fingerprint(target_student)
+        cached = self.results.get(key, target_student)
+        if cached is not None:
+            state, scores = cached
+        else:
+            tokens = self.results.tokens(target_student)
+            # A shared snapshot may be attached meanwhile; keep using one consistent state
+            state = self.state
+            scores = self.rank_matches(target_student, state)
+            self.results.put(key, tokens, (state, scores))
+        total = len(scores['rows'])
+        metrics.increment('recommend.matches', total)
         
-        print(f"\nFound {len(recommendations)} matches above 50%")
+        # Sort by match percentage, ties in row order (as a stable sort would);
+        # the cursor is the (matchPercentage, id) of the last card returned
+        order_key = (100 - scores['match_percentage']) * (total + 1) + scores['ids']
+        remaining = np.arange(total)
+        if cursor is not None:
+            last_percentage, last_id = decode_cursor(cursor)
+            remaining = np.flatnonzero(order_key > (100 - last_percentage) * (total + 1) + last_id)
+        page_size = len(remaining) if limit is None else min(limit, len(remaining))
+        with metrics.timer('recommend.sort'):
+            page, _ = top_k_rows(-order_key[remaining], page_size, rows=remaining)
+        with metrics.timer('recommend.materialize'):
+            recommendations = [self.build_recommendation(state.students[scores['rows'][i]], scores, i) for i in page]
+        metrics.increment('recommend.returned', len(recommendations))
+        has_more = page_size < len(remaining)
+        next_cursor = None
+        if has_more:
+            last = recommendations[-1]
+            next_cursor = encode_cursor(last['matchPercentage'], last['id'])
         
         # LOGIC: If matches found, show matches + create option
         # If NO matches found, ONLY show create option
-        if len(recommendations) == 0:
-            print("No matches found - suggesting to create own group")
-            recommendations.append({
+        if total == 0 or not has_more:
+            recommendations.append(self.create_group_card(target_student, total))
+        
+        return {'recommendations': recommendations, 'nextCursor': next_cursor, 'totalMatches': total}
+    
+    def create_group_card(self, target_student, total):
+        """'Create your own group' card: the only card without matches, else the last one"""
+        if total == 0:
+            return {
                 'id': 1,
                 'title': 'Create Your Own Study Group',
                 'matchPercentage': None,
@@ -152,26 +394,94 @@ class AIStudentMatcher:
                 'suggested': True,
                 'explanation': f"Be the first to start a {target_student.get('major', 'study')} group! Other students studying {', '.join(target_student.get('subjects', [])[:2])} are looking for groups to join.",
                 'compatibility': {'subject': 1.0, 'schedule': 1.0, 'learningStyle': 1.0, 'performance': 1.0}
-            })
-        else:
-            print(f"Matches found - adding create option as additional choice")
-            # Add create group as an ADDITIONAL option when matches exist
+            }
+        # Add create group as an ADDITIONAL option when matches exist (on the last page)
+        return {
+            'id': total + 1,
+            'title': 'Create Your Own Group',
+            'matchPercentage': None,
+            'memberInfo': f"Or start your own {target_student.get('major', 'study')} group",
+            'schedule': f"Lead a group based on your preferences",
+            'focus': ', '.join(target_student.get('subjects', [])[:2]),
+            'location': 'Your preferred location',
+            'action': 'Start Group',
+            'suggested': True,
+            'explanation': 'Perfect opportunity to lead your own study group based on your preferences',
+            'compatibility': {'subject': 1.0, 'schedule': 1.0, 'learningStyle': 1.0, 'performance': 1.0}
+        }
+    
+    def join_group(self, group_id, student):
+        """Add ``student`` to the aggregate of the registered group ``group_id``"""
+        self.groups.join(group_id, student, self.get_style_vector(student))
+    
+    def group_recommendations(self, target_student, limit=None):
+        """Open study groups ranked by compatibility with the group's aggregate member profile"""
+        with metrics.timer('recommend.encode'):
+            style_vector = self.get_style_vector(target_student)
+        with metrics.timer('recommend.score_groups'):
+            scores = self.groups.match(target_student, style_vector)
+        total = len(scores['rows'])
+        metrics.increment('recommend.group_matches', total)
+        # Best first, ties in row (registration) order
+        order = np.argsort(-scores['match_percentage'], kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        recommendations = []
+        for i in order:
+            row = int(scores['rows'][i])
+            group = self.groups.groups[row]
+            subject_score = float(scores['subject'][i])
+            schedule_score = float(scores['schedule'][i])
+            learning_style_score = float(scores['learning_style'][i])
+            performance_score = float(scores['performance'][i])
             recommendations.append({
-                'id': len(recommendations) + 1,
-                'title': 'Create Your Own Group',
-                'matchPercentage': None,
-                'memberInfo': f"Or start your own {target_student.get('major', 'study')} group",
-                'schedule': f"Lead a group based on your preferences",
-                'focus': ', '.join(target_student.get('subjects', [])[:2]),
-                'location': 'Your preferred location',
-                'action': 'Start Group',
-                'suggested': True,
-                'explanation': 'Perfect opportunity to lead your own study group based on your preferences',
-                'compatibility': {'subject': 1.0, 'schedule': 1.0, 'learningStyle': 1.0, 'performance': 1.0}
+                'id': group['id'],
+                'title': group.get('title') or f"{group.get('subject', 'Study')} Group",
+                'matchPercentage': int(scores['match_percentage'][i]),
+                'memberInfo': f"{group['currentMembers']}/{group.get('maxMembers') or 6} members",
+                'schedule': self.format_schedule(self.groups.schedule_of(row)),
+                'focus': group.get('subject', ''),
+                'location': group.get('location') or 'Campus Study Areas',
+                'leader': group.get('leader'),
+                'action': 'Request to Join',
+                'suggested': False,
+                'explanation': self.generate_explanation(
+                    subject_score, schedule_score, learning_style_score, performance_score
+                ),
+                'compatibility': {
+                    'subject': subject_score,
+                    'schedule': schedule_score,
+                    'learningStyle': learning_style_score,
+                    'performance': performance_score
+                }
             })
-        
-        print(f"=== Returning {len(recommendations)} total recommendations ===\n")
-        return recommendations
+        return {'recommendations': recommendations, 'totalMatches': total}
+    
+    def free_at(self, schedule, exclude_id=None, limit=None, min_overlap: int = 1):
+        """Students free in at least ``min_overlap`` of the cells of ``schedule``, most shared cells first"""
+        mask = schedule_mask(schedule)
+        state = self.state
+        rows, common = state.scoring.available_rows(mask, min_overlap)
+        if exclude_id is not None:
+            keep = ~np.isin(rows, state.scoring.rows_for(exclude_id))
+            rows, common = rows[keep], common[keep]
+        total = len(rows)
+        # Most shared cells first, ties in row order
+        order = np.argsort(-common, kind='stable')
+        if limit is not None:
+            order = order[:limit]
+        results = []
+        for i in order:
+            student = state.students[rows[i]]
+            shared = mask_schedule(student.schedule_mask & mask)
+            # Only what recommendation and search cards already show: no names
+            results.append({
+                'id': student.student_id,
+                'major': student.major,
+                'commonSlots': int(common[i]),
+                'commonSchedule': {day: slots for day, slots in shared.items() if slots}
+            })
+        return {'students': results, 'total': total}
     
     def format_schedule(self, schedule):
         available_days = [day for day, slots in schedule.items() if slots]
@@ -197,6 +507,134 @@ class AIStudentMatcher:
 # Initialize matcher
 matcher = AIStudentMatcher()
 
+shared_store = None
+
+if SHARED_STORE_DIR:
+    # Workers map one snapshot instead of each loading every profile;
+    # the writer worker keeps it in sync with the database
+    from shared_store import SharedStore
+    shared_store = SharedStore(SHARED_STORE_DIR)
+    matcher.pending_profiles = deque(maxlen=SHARED_PENDING_LIMIT)
+    shared_store.attach(matcher)
+elif WARM_START:
+    try:
+        from student_store import warm_start
+        warm_start(matcher, EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"Warm start skipped, starting with an empty matcher: {e}")
+
+if WARM_START:
+    try:
+        from student_store import load_groups
+        load_groups(matcher)
+    except Exception as e:
+        print(f"Study groups not loaded: {e}")
+
+def _refresh_students(matcher, since):
+    if not WARM_START:
+        return since
+    from student_store import refresh_students
+    return refresh_students(matcher, EMBEDDING_MODEL, since)
+
+def start_background_work():
+    # Background threads do not survive fork(), so start them in each worker
+    model.start_background()
+    # Search traffic is dominated by course names, so every subject seen in a profile is encoded up front;
+    # the scoring columns list them on every worker, including those serving a mapped shared snapshot
+    matcher.query_embeddings.start_prewarm(lambda: list(matcher.scoring.subject_ids))
+    if shared_store is not None:
+        shared_store.start(matcher, _refresh_students)
+
+@app.before_request
+def _before_request():
+    metrics.begin_request()
+    start_background_work()
+
+@app.after_request
+def _record_request_timing(response):
+    breakdown = metrics.end_request(f"http.{request.endpoint}")
+    if breakdown is not None:
+        response.headers['Server-Timing'] = server_timing(breakdown)
+    return response
+
+@app.route('/api/auth/register', methods=['POST'])
+def register():
+    """Create an account from a profile plus ``password``; the profile is added to the matcher"""
+    from uuid import uuid4
+    from sqlalchemy import select
+    from sqlalchemy.exc import IntegrityError
+    from auth import AuthBusy, generate_token, hash_password
+    from bulk_import import validate, user_row
+    from database import close_db, db_session
+    from models import User
+    data = dict(request.json or {})
+    password = data.pop('password', None)
+    data['id'] = f"user_{time.time():.3f}_{uuid4().hex[:6]}"
+    errors = validate(data) + ([] if isinstance(password, str) and password else ['missing password'])
+    if errors:
+        return jsonify({'success': False, 'error': '; '.join(errors)}), 400
+    try:
+        if db_session.execute(select(User.id).where(User.email == data['email'])).first() is not None:
+            return jsonify({'success': False, 'error': 'Email is already registered'}), 409
+        user = User(**dict(user_row(data), password_hash=hash_password(password)))
+        db_session.add(user)
+        db_session.commit()
+        profile = user.to_dict()
+    except IntegrityError:
+        # A concurrent registration with the same email committed between the check and ours
+        db_session.rollback()
+        return jsonify({'success': False, 'error': 'Email is already registered'}), 409
+    except AuthBusy:
+        return jsonify({'success': False, 'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+    finally:
+        close_db()
+    matcher.add_student(profile)
+    return jsonify({
+        'success': True,
+        'message': 'Registration successful',
+        'token': generate_token(profile['id'], profile['email']),
+        'user': {'id': profile['id'], 'name': profile['name'], 'email': profile['email']}
+    })
+
+@app.route('/api/auth/login', methods=['POST'])
+def login():
+    """Exchange email and password for a token; hashes made with an older BCRYPT_ROUNDS are upgraded"""
+    from sqlalchemy import select
+    from auth import AuthBusy, generate_token, rehash_if_needed, verify_password
+    from database import close_db, db_session
+    from models import User
+    data = request.json or {}
+    email, password = data.get('email'), data.get('password')
+    if not email or not password:
+        return jsonify({'success': False, 'error': 'Email and password are required'}), 400
+    try:
+        user = db_session.execute(select(User).where(User.email == email)).scalars().first()
+        # Unknown emails are checked against a dummy hash so they take as long as a wrong password
+        if not verify_password(password, user.password_hash if user is not None else None):
+            return jsonify({'success': False, 'error': 'Invalid email or password'}), 401
+        upgraded = rehash_if_needed(password, user.password_hash)
+        if upgraded is not None:
+            user.password_hash = upgraded
+            db_session.commit()
+        return jsonify({
+            'success': True,
+            'token': generate_token(user.id, user.email),
+            'user': {'id': user.id, 'name': user.name, 'email': user.email}
+        })
+    except AuthBusy:
+        return jsonify({'success': False, 'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
+    finally:
+        close_db()
+
+@app.route('/api/auth/me', methods=['GET'])
+@token_required
+def current_user():
+    from student_store import fetch_profiles
+    profile = fetch_profiles([request.user_id]).get(request.user_id)
+    if profile is None:
+        return jsonify({'success': False, 'error': 'User not found'}), 404
+    return jsonify({'success': True, 'user': profile})
+
 @app.route('/api/student', methods=['POST'])
 def create_student():
     try:
@@ -208,6 +646,9 @@ def create_student():
         
         # Add to our matcher
         matcher.add_student(student_data)
+        if shared_store is not None and not shared_store.is_writer:
+            # Not in the database, so the writer would never see it otherwise
+            shared_store.forward([student_data])
         
         return jsonify({
             'success': True,
@@ -217,101 +658,395 @@ def create_student():
         print(f"Error creating student: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/recommend', methods=['POST'])
-def get_recommendations():
+# Profile fields any signed-in student may read about another
+PUBLIC_PROFILE_FIELDS = ('id', 'name', 'major', 'subjects', 'learningStyle', 'schedule')
+
+@app.route('/api/student/<student_id>', methods=['GET'])
+@token_required
+def get_student(student_id):
+    """Stored profile of a student: all of it for the caller's own, PUBLIC_PROFILE_FIELDS for anyone else's.
+
+    The matcher only keeps compact records, so this reads the database.
+    """
+    from student_store import fetch_profiles
+    profile = fetch_profiles([student_id]).get(student_id)
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Student not found'}), 404
+    if student_id != request.user_id:
+        profile = {key: profile.get(key) for key in PUBLIC_PROFILE_FIELDS}
+    return jsonify({'success': True, 'student': profile})
+
+@app.route('/api/students/bulk', methods=['POST'])
+def bulk_import_students():
+    """Import many profiles from a JSONL or CSV request body"""
+    from bulk_import import BulkImporter, read_records
+    provided = request.headers.get('X-Import-Key', '')
+    if not BULK_IMPORT_KEY or not hmac.compare_digest(provided, BULK_IMPORT_KEY):
+        return jsonify({'success': False, 'error': 'Bulk import is not allowed'}), 403
+    fmt = request.args.get('format') or ('csv' if 'csv' in (request.content_type or '') else 'jsonl')
+    importer = BulkImporter(matcher, EMBEDDING_MODEL, write_db=request.args.get('db', '1') == '1')
+    try:
+        # The body is read as a stream, one batch at a time
+        stream = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8', newline='')
+        report = importer.run(read_records(stream, fmt))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error during bulk import: {e}")
+        return jsonify({'success': False, 'error': str(e), **importer.report()}), 500
+    return jsonify({'success': True, **report})
+
+def recommend_response(data):
+    """Body and status code of /api/recommend for a parsed JSON request"""
     try:
-        data = request.json
         student_data = data.get('student_data')
+        # Optional pagination: without 'limit' every match is returned
+        limit = data.get('limit')
+        cursor = data.get('cursor')
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be a positive integer')
+            limit = min(limit, MAX_RECOMMENDATION_PAGE)
+        if cursor is not None:
+            decode_cursor(cursor)
+    except (AttributeError, TypeError, ValueError) as e:
+        return {'success': False, 'error': str(e)}, 400
+    try:
+        page, source = None, 'live'
+        if data.get('source') == 'graph' and cursor is None:
+            # Precomputed top-K neighbours (compat_graph), one page without a cursor
+            from compat_graph import graph_page
+            page = graph_page(matcher, student_data, limit)
+            source = 'graph' if page is not None else source
+        if page is None:
+            # Generate AI-powered recommendations; only the returned page is materialized
+            page = matcher.recommendation_page(student_data, limit, cursor)
         
-        # Generate AI-powered recommendations
-        recommendations = matcher.generate_recommendations(student_data)
-        
-        return jsonify({
+        return {
             'success': True,
-            'recommendations': recommendations
-        })
+            'recommendations': page['recommendations'],
+            'nextCursor': page['nextCursor'],
+            'totalMatches': page['totalMatches'],
+            'source': source
+        }, 200
     except Exception as e:
         print(f"Error generating recommendations: {e}")
         import traceback
         traceback.print_exc()
+        return {'success': False, 'error': str(e)}, 500
+
+@app.route('/api/recommend', methods=['POST'])
+def get_recommendations():
+    body, status = recommend_response(request.json)
+    return jsonify(body), status
+
+@app.route('/api/recommend/groups', methods=['POST'])
+def get_group_recommendations():
+    """Existing study groups ranked against the aggregate profile of their members"""
+    data = request.json or {}
+    try:
+        student_data = data['student_data']
+        limit = data.get('limit')
+        if limit is not None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be a positive integer')
+            limit = min(limit, MAX_RECOMMENDATION_PAGE)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    try:
+        result = matcher.group_recommendations(student_data, limit)
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        print(f"Error generating group recommendations: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def _build_group_corpus():
-    corpus = []
-    for student in matcher.students:
-        text_parts = []
-        name = student.get('name', '')
-        major = student.get('major', '')
-        subjects = ", ".join(student.get('subjects', []))
-        learning_style = student.get('learningStyle', '')
-        if name:
-            text_parts.append(name)
-        if major:
-            text_parts.append(major)
-        if subjects:
-            text_parts.append(subjects)
-        if learning_style:
-            text_parts.append(learning_style)
-        corpus.append({
-            'id': student.get('id', len(corpus) + 1),
-            'title': f"{major or 'Study'} Group",
-            'text': ' '.join(text_parts).strip(),
-            'student': student
-        })
-    return corpus
+@app.route('/api/availability', methods=['POST'])
+@token_required
+def who_is_free():
+    """Students free at the same times as the given schedule (or student_data's schedule), never the caller"""
+    data = request.json or {}
+    try:
+        student_data = data.get('student_data') or {}
+        schedule = data.get('schedule', student_data.get('schedule'))
+        if not isinstance(schedule, dict):
+            raise ValueError('schedule must be an object of day -> time slots')
+        limit = min(int(data.get('limit', 20)), MAX_RECOMMENDATION_PAGE)
+        min_overlap = int(data.get('minOverlap', 1))
+        if limit < 1 or min_overlap < 1:
+            raise ValueError('limit and minOverlap must be positive integers')
+    except (AttributeError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    with metrics.timer('availability.query'):
+        result = matcher.free_at(schedule, student_data.get('id', request.user_id), limit, min_overlap)
+    return jsonify({'success': True, **result})
+
+def _sync_group_response(group_id):
+    # The stored rows are the only source: nothing in the request body is trusted
+    from student_store import sync_group
+    if not sync_group(matcher, group_id):
+        return jsonify({'success': False, 'error': f"Unknown group {group_id}"}), 404
+    return jsonify({'success': True, 'group': matcher.groups.groups[matcher.groups.rows[group_id]]})
+
+@app.route('/api/groups/<group_id>/members', methods=['POST'])
+@token_required
+def group_member_joined(group_id):
+    """Reload a group's details and members from the database after a membership was stored"""
+    return _sync_group_response(group_id)
+
+@app.route('/api/groups/<group_id>/members/<user_id>', methods=['DELETE'])
+@token_required
+def group_member_left(group_id, user_id):
+    """Reload a group from the database after ``user_id`` left it (or the group was deleted)"""
+    return _sync_group_response(group_id)
+
+def _student_search_card(student, row, score):
+    major = student.major
+    return {
+        'id': student.get('id', int(row) + 1),
+        'title': f"{major or 'Study'} Group",
+        'matchPercentage': int(max(0.0, min(1.0, float(score))) * 100),
+        'memberInfo': 'Actively seeking members',
+        'schedule': matcher.format_schedule(student.schedule),
+        'focus': ', '.join(student.subjects[:2]),
+        'location': 'Campus Study Areas',
+        'action': 'Request to Join',
+        'suggested': False
+    }
+
+def _group_search_card(row, score):
+    group = matcher.groups.groups[row]
+    return {
+        'id': group['id'],
+        'title': group.get('title') or f"{group.get('subject', 'Study')} Group",
+        'matchPercentage': int(max(0.0, min(1.0, float(score))) * 100),
+        'memberInfo': f"{group['currentMembers']}/{group.get('maxMembers') or 6} members",
+        'schedule': matcher.format_schedule(matcher.groups.schedule_of(row)),
+        'focus': group.get('subject', ''),
+        'location': group.get('location') or 'Campus Study Areas',
+        'action': 'Request to Join',
+        'suggested': False
+    }
 
 def semantic_search_groups(query_embedding, top_k: int = 5):
-    corpus = _build_group_corpus()
-    if not corpus:
-        return []
-    texts = [item['text'] for item in corpus]
-    corpus_embeddings = model.encode(texts)
-    scores = cosine_similarity(query_embedding, corpus_embeddings)[0]
-    indices = np.argsort(scores)[::-1][:top_k]
-    results = []
-    for rank, idx in enumerate(indices, start=1):
-        item = corpus[idx]
-        student = item['student']
-        results.append({
-            'id': item['id'],
-            'title': item['title'],
-            'matchPercentage': int(max(0.0, min(1.0, float(scores[idx]))) * 100),
-            'memberInfo': 'Actively seeking members',
-            'schedule': AIStudentMatcher().format_schedule(student.get('schedule', {})),
-            'focus': ', '.join(student.get('subjects', [])[:2]),
-            'location': 'Campus Study Areas',
-            'action': 'Request to Join',
-            'suggested': False
-        })
-    return results
+    # Profile embeddings are kept up to date by add_student, so a query is a
+    # single matrix-vector product over the resident index
+    query_vector = normalize_rows(query_embedding).reshape(-1)
+    state = matcher.state
+    rows, scores = state.search_index.search(query_vector, top_k)
+    return [_student_search_card(state.students[row], row, score) for row, score in zip(rows, scores)]
+
+def hybrid_search_groups(query: str, top_k: int = 5, mode: str = SEARCH_MODE):
+    """Students and study groups for ``query`` by fused BM25 and embedding scores; returns (results, mode used).
+
+    BM25 scores (relative to a profile made of exactly the query, see
+    LexicalIndex.search) are fused with the profile-embedding cosine as
+    SEARCH_LEXICAL_WEIGHT * bm25 + (1 - weight) * cosine. A query that is
+    exactly a subject, major or group title skips the encoder. With more
+    than SEARCH_RERANK_MIN_ROWS students the cosine is only computed for
+    the BM25 shortlist. Study groups have no profile embedding and are
+    ranked by BM25 alone.
+    """
+    if mode == 'semantic':
+        with metrics.timer('search.encode'):
+            query_embedding = matcher.query_embeddings.encode(query)
+        with metrics.timer('search.query'):
+            return semantic_search_groups(query_embedding, top_k), mode
+    lexical_index = matcher.keyword_index()
+    state = matcher.state  # after the build, which may swap in a new state
+    with metrics.timer('search.lexical'):
+        student_rows, student_bm25 = lexical_index.search(query, SEARCH_SHORTLIST)
+        group_rows, group_bm25 = matcher.groups.lexical.search(query, SEARCH_SHORTLIST)
+    matched = len(student_rows) + len(group_rows) > 0
+    exact = lexical_index.is_phrase(query) or matcher.groups.lexical.is_phrase(query)
+    if mode == 'hybrid' and matched and exact:
+        # Keyword lookup: an embedding pass would not change which rows hold the phrase
+        mode = 'lexical'
+        metrics.increment('search.encoder_skipped')
+    lexical = dict(zip(student_rows.tolist(), student_bm25.tolist()))
+    # Without any keyword hit the ranking is purely semantic, on the same scale as mode 'semantic'
+    weight = SEARCH_LEXICAL_WEIGHT if lexical else 0.0
+    fused = {}
+    if mode == 'lexical':
+        fused = dict(lexical)
+    else:
+        with metrics.timer('search.encode'):
+            query_vector = matcher.query_embeddings.encode(query)
+        with metrics.timer('search.query'):
+            candidates = set(lexical)
+            if not candidates or len(state.search_index) <= SEARCH_RERANK_MIN_ROWS:
+                candidates.update(state.search_index.search(query_vector, SEARCH_SHORTLIST)[0].tolist())
+            rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+            cosines = state.search_index.vectors[rows] @ query_vector
+            for row, cosine in zip(rows.tolist(), cosines.tolist()):
+                fused[row] = weight * lexical.get(row, 0.0) + (1 - weight) * max(0.0, cosine)
+    ranked = [(score, 0, row) for row, score in fused.items()]
+    ranked.extend((score, 1, row) for row, score in zip(group_rows.tolist(), group_bm25.tolist()))
+    # Best first; on equal scores students before groups, then in row order
+    ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+    results = [
+        _group_search_card(row, score) if kind else _student_search_card(state.students[row], row, score)
+        for score, kind, row in ranked[:top_k]
+    ]
+    return results, mode
+
+def search_response(data):
+    """Body and status code of /api/search for a parsed JSON request"""
+    query = data.get('query', '')
+    mode = data.get('mode') or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        return {'success': False, 'error': f"mode must be one of {', '.join(SEARCH_MODES)}"}, 400
+    # Repeated queries (course names, 'calculus') share one entry whatever their case or punctuation
+    key = (normalize_query(query), mode)
+    version = matcher.search_version()
+    cached = matcher.search_results.get(key, version)
+    if cached is None:
+        # The raw query, so the model sees 'C++' and not only its key
+        cached = hybrid_search_groups(query, mode=mode)
+        matcher.search_results.put(key, version, cached)
+    else:
+        metrics.increment('search.result_cache_hits')
+    results, mode = cached
+    metrics.increment('search.returned', len(results))
+    return {'results': results, 'mode': mode}, 200
 
 @app.route('/api/search', methods=['POST'])
 def search_groups():
-    data = request.json
-    query = data.get('query', '')
-    print(f"Search query: {query}")
-    query_embedding = model.encode([query])
-    results = semantic_search_groups(query_embedding)
-    print(f"Found {len(results)} results")
-    return jsonify({'results': results})
+    body, status = search_response(request.json)
+    return jsonify(body), status
+
+@app.route('/api/chat/<group_id>/messages', methods=['GET'])
+@token_required
+def get_messages(group_id):
+    """One page of a group's messages: the newest by default, older ones with ?before=<nextCursor>"""
+    from chat_store import message_page, is_member, CHAT_PAGE_SIZE, CHAT_MAX_PAGE
+    from database import close_db
+    try:
+        limit = int(request.args.get('limit', CHAT_PAGE_SIZE))
+        if limit < 1:
+            raise ValueError('limit must be a positive integer')
+        limit = min(limit, CHAT_MAX_PAGE)
+        if not is_member(group_id, request.user_id):
+            return jsonify({'success': False, 'error': 'Not a member of this group'}), 403
+        page = message_page(group_id, limit, request.args.get('before'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    finally:
+        close_db()
+    return jsonify({'success': True, **page})
+
+@app.route('/api/chat/<group_id>/send', methods=['POST'])
+@token_required
+def send_chat_message(group_id):
+    from chat_store import send_message, is_member
+    from database import close_db
+    from models import MESSAGE_TYPES
+    data = request.json or {}
+    if not data.get('message') and not data.get('imageUri') and not data.get('fileName'):
+        return jsonify({'success': False, 'error': 'Message is empty'}), 400
+    # The column is an ENUM; anything else would fail in the database
+    if (data.get('type') or 'text') not in MESSAGE_TYPES:
+        return jsonify({'success': False, 'error': f"type must be one of {', '.join(MESSAGE_TYPES)}"}), 400
+    try:
+        if not is_member(group_id, request.user_id):
+            return jsonify({'success': False, 'error': 'Not a member of this group'}), 403
+        return jsonify({'success': True, 'message': send_message(group_id, request.user_id, data)})
+    finally:
+        close_db()
+
+# Open Flask-served chat streams in this process, capped at CHAT_WSGI_MAX_STREAMS
+_wsgi_streams = threading.BoundedSemaphore(CHAT_WSGI_MAX_STREAMS)
+
+@app.route('/api/chat/<group_id>/stream', methods=['GET'])
+@token_required
+def stream_messages(group_id):
+    """Server-Sent Events stream of the group's new messages, resuming after the ``since`` cursor"""
+    from chat_push import open_member_stream, EventStream, CHAT_STREAM_RETRY_SECONDS
+    since = request.args.get('since') or request.headers.get('Last-Event-ID')
+    # Each stream holds a server thread while open; the ASGI entry point serves them on its event loop instead
+    if not _wsgi_streams.acquire(blocking=False):
+        response = jsonify({'success': False, 'error': 'Too many open chat streams; poll /messages or retry later'})
+        response.headers['Retry-After'] = str(CHAT_STREAM_RETRY_SECONDS)
+        return response, 503
+    try:
+        opened = open_member_stream(group_id, request.user_id, since)
+    except ValueError as e:
+        _wsgi_streams.release()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception:
+        _wsgi_streams.release()
+        raise
+    if opened is None:
+        _wsgi_streams.release()
+        return jsonify({'success': False, 'error': 'Not a member of this group'}), 403
+    response = Response(iter(EventStream(*opened)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Called when the server closes the response, whether or not the stream was ever iterated
+    response.call_on_close(_wsgi_streams.release)
+    return response
+
+@app.route('/api/chat/message/<message_id>/react', methods=['POST'])
+@token_required
+def react_to_message(message_id):
+    from chat_store import toggle_reaction, is_member
+    from database import close_db, db_session
+    from models import Message
+    emoji = (request.json or {}).get('emoji')
+    if not emoji:
+        return jsonify({'success': False, 'error': 'emoji is required'}), 400
+    try:
+        message = db_session.get(Message, message_id)
+        if message is None:
+            return jsonify({'success': False, 'error': 'Message not found'}), 404
+        if not is_member(message.group_id, request.user_id):
+            return jsonify({'success': False, 'error': 'Not a member of this group'}), 403
+        return jsonify({'success': True, 'reactions': toggle_reaction(message, request.user_id, emoji)})
+    finally:
+        close_db()
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms, counters and cache statistics"""
+    snapshot = metrics.snapshot()
+    snapshot['components'] = {
+        'model': model.stats(),
+        'encoder': encoder.stats(),
+        'embedding_cache': matcher.embeddings.stats(),
+        'recommendation_cache': matcher.results.stats(),
+        'query_embedding_cache': matcher.query_embeddings.stats(),
+        'search_result_cache': matcher.search_results.stats(),
+        'search_index': matcher.search_index.backend.stats(),
+        'lexical_index': matcher.lexical_index.stats() if matcher.lexical_index is not None else None,
+        'group_lexical_index': matcher.groups.lexical.stats(),
+        'shared_store': shared_store.stats() if shared_store is not None else None,
+        'password_hashing': password_hasher.stats(),
+        'token_cache': verified_tokens.stats(),
+        'total_students': len(matcher.students),
+        'total_groups': len(matcher.groups)
+    }
+    return jsonify(snapshot)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
-        'status': 'healthy',
-        'ai_model': 'loaded',
+        'status': {'ready': 'healthy', 'failed': 'unhealthy'}.get(model.status, 'starting'),
+        'ai_model': model.status,
+        'ai_model_details': model.stats(),
         'total_students': len(matcher.students),
+        'total_groups': len(matcher.groups),
+        'recommendation_cache': matcher.results.stats(),
+        'shared_store': shared_store.stats() if shared_store is not None else None,
         'timestamp': str(__import__('datetime').datetime.now())
     })
 
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get('PORT', 5000))
     print(f"\n{'='*60}")
     print("StudySync Backend - AI Study Group Matcher")
     print(f"{'='*60}")
     print(f"Starting server on http://0.0.0.0:{port}")
-    print(f"BERT Model: sentence-transformers/all-MiniLM-L6-v2")
+    print(f"BERT Model: {MODEL_NAME}")
     print(f"{'='*60}\n")
     
     # Optional demo/test students (only loaded when running this file directly)
@@ -369,4 +1104,5 @@ if __name__ == '__main__':
     print(f"Initial students loaded: {len(matcher.students)}")
     print(f"{'='*60}\n")
 
+    model.start_background()
     app.run(debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
@@ -0,0 +1,288 @@
+# asgi.py
+"""ASGI entry point: inference endpoints run in a bounded pool, everything else through Flask.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --config gunicorn.conf.py
+"""
+import asyncio
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+from app import app as flask_app, recommend_response, search_response, start_background_work
+from auth import decode_token
+from metrics import metrics, server_timing
+
+# Inference pool configuration
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', str(os.cpu_count() or 2)))
+INFERENCE_MAX_PENDING = int(os.getenv('INFERENCE_MAX_PENDING', str(4 * INFERENCE_WORKERS)))  # running + queued
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv('INFERENCE_TIMEOUT_SECONDS', '10'))
+MAX_BODY_BYTES = int(os.getenv('MAX_BODY_BYTES', str(1024 * 1024)))
+# Threads per worker for the Flask routes; gunicorn's own `threads` setting does not apply to ASGI workers
+WSGI_THREADS = int(os.getenv('GUNICORN_THREADS', '4'))
+
+CHAT_STREAM_PATH = re.compile(r'^/api/chat/([^/]+)/stream$')
+
+
+class Overloaded(Exception):
+    """Raised when the inference pool already holds ``max_pending`` requests"""
+
+
+class InferencePool:
+    """Thread pool with admission control for CPU-bound request handlers.
+
+    Encoding and scoring spend most of their time in NumPy/torch with the
+    GIL released, so threads scale across cores while sharing one matcher.
+    At most ``max_pending`` requests are running or queued; further ones are
+    rejected immediately instead of piling up. A request that exceeds
+    ``timeout`` gets an error response, but its slot is only freed once the
+    handler actually finishes.
+    """
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, max_pending: int = INFERENCE_MAX_PENDING,
+                 timeout: float = INFERENCE_TIMEOUT_SECONDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # Pool threads do not survive fork(), so each worker process builds its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='inference')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, fn, *args):
+        """Run ``fn(*args)`` in the pool; raises Overloaded or asyncio.TimeoutError"""
+        executor = self._get_executor()
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                metrics.increment('inference.rejected')
+                raise Overloaded()
+            self.pending += 1
+        future = executor.submit(fn, *args)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            metrics.increment('inference.timed_out')
+            raise
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'max_pending': self.max_pending,
+            'pending': self.pending,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out
+        }
+
+
+# The plain function behind asgiref's thread-sensitive WsgiToAsgiInstance.run_wsgi_app
+_run_wsgi_app = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that runs each request on a thread of a per-process pool.
+
+    asgiref's adapter is thread-sensitive, so by default every Flask request
+    of a worker runs on one shared thread and a slow login or bulk import
+    blocks all of them. Here up to ``threads`` requests run at once; further
+    ones wait for a free thread.
+    """
+
+    def __init__(self, wsgi_application, threads: int = WSGI_THREADS):
+        super().__init__(wsgi_application)
+        self.threads = threads
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # Pool threads do not survive fork(), so each worker process builds its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='wsgi')
+                self._pid = os.getpid()
+            return self._executor
+
+    async def __call__(self, scope, receive, send):
+        instance = WsgiToAsgiInstance(self.wsgi_application)
+        instance.run_wsgi_app = sync_to_async(partial(_run_wsgi_app, instance),
+                                              thread_sensitive=False, executor=self._get_executor())
+        await instance(scope, receive, send)
+
+
+def _handle(handler, data, name):
+    # Runs on a pool thread, so the per-request breakdown is collected there
+    metrics.begin_request()
+    body, status = handler(data)
+    return body, status, metrics.end_request(name)
+
+
+class StudySyncASGI:
+    """Serves the inference routes from ``pool`` and passes every other request to Flask"""
+
+    routes = {
+        ('POST', '/api/recommend'): (recommend_response, 'http.get_recommendations'),
+        ('POST', '/api/search'): (search_response, 'http.search_groups')
+    }
+
+    def __init__(self, wsgi_app, pool):
+        self.wsgi = PooledWsgiToAsgi(wsgi_app)
+        self.pool = pool
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        route = self.routes.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        stream = CHAT_STREAM_PATH.match(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if stream is not None:
+            await self._chat_stream(scope, receive, send, stream.group(1))
+            return
+        if route is None:
+            await self.wsgi(scope, receive, send)
+            return
+        await self._inference(route, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                start_background_work()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _inference(self, route, receive, send):
+        handler, name = route
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if len(body) > MAX_BODY_BYTES:
+                await self._respond(send, {'success': False, 'error': 'Request body too large'}, 413)
+                return
+            if not message.get('more_body'):
+                break
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            await self._respond(send, {'success': False, 'error': 'Invalid JSON'}, 400)
+            return
+        if not isinstance(data, dict):
+            await self._respond(send, {'success': False, 'error': 'Expected a JSON object'}, 400)
+            return
+
+        try:
+            payload, status, breakdown = await self.pool.run(_handle, handler, data, name)
+        except Overloaded:
+            await self._respond(send, {'success': False, 'error': 'Server busy, please retry'}, 503,
+                                extra_headers=[(b'retry-after', b'1')])
+            return
+        except asyncio.TimeoutError:
+            await self._respond(send, {'success': False, 'error': 'Request timed out'}, 504)
+            return
+        except Exception as e:
+            await self._respond(send, {'success': False, 'error': str(e)}, 500)
+            return
+        headers = [(b'server-timing', server_timing(breakdown).encode())] if breakdown else []
+        await self._respond(send, payload, status, extra_headers=headers)
+
+    async def _chat_stream(self, scope, receive, send, group_id):
+        """Chat push on the event loop, so an open stream costs a task rather than a thread"""
+        from chat_push import open_member_stream, EventStream, CHAT_PUSH_HEARTBEAT_SECONDS
+        headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope['headers']}
+        token = headers.get('authorization', '').partition(' ')[2]
+        if not token:
+            await self._respond(send, {'error': 'Authentication token is missing'}, 401)
+            return
+        payload = decode_token(token)
+        if not payload:
+            await self._respond(send, {'error': 'Invalid or expired token'}, 401)
+            return
+        since = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('since', [None])[0]
+        loop = asyncio.get_running_loop()
+        wake = asyncio.Event()
+        try:
+            # Membership and backlog are database reads, so they run off the loop
+            opened = await loop.run_in_executor(None, open_member_stream, group_id, payload['user_id'],
+                                                since or headers.get('last-event-id'),
+                                                lambda: loop.call_soon_threadsafe(wake.set))
+        except ValueError as e:
+            await self._respond(send, {'success': False, 'error': str(e)}, 400)
+            return
+        if opened is None:
+            await self._respond(send, {'success': False, 'error': 'Not a member of this group'}, 403)
+            return
+        stream = EventStream(*opened)
+        disconnected = asyncio.ensure_future(self._disconnect(receive))
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'access-control-allow-origin', b'*')
+            ]})
+            chunk = stream.opening()
+            while True:
+                await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+                if stream.closed:
+                    await send({'type': 'http.response.body', 'body': b''})
+                    return
+                woken = asyncio.ensure_future(wake.wait())
+                await asyncio.wait({woken, disconnected}, timeout=CHAT_PUSH_HEARTBEAT_SECONDS,
+                                   return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                if disconnected.done():
+                    return
+                # Cleared before taking, so a message queued meanwhile wakes the next wait
+                wake.clear()
+                chunk = stream.take()
+        finally:
+            disconnected.cancel()
+            stream.close()
+
+    @staticmethod
+    async def _disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    async def _respond(send, payload, status, extra_headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            # Same policy flask-cors applies to the Flask routes
+            (b'access-control-allow-origin', b'*')
+        ]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers + list(extra_headers)})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+inference_pool = InferencePool()
+app = StudySyncASGI(flask_app, inference_pool)
@@ -1,6 +1,10 @@
 # auth.py
 import jwt
 import bcrypt
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
@@ -10,15 +14,125 @@ SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
 
+# Password hashing configuration
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))  # cost factor; stored hashes are upgraded on login
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(max((os.cpu_count() or 2) // 2, 1))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', str(8 * PASSWORD_HASH_WORKERS)))
+
+# Verified-token cache configuration
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '10000'))  # 0 disables
+TOKEN_CACHE_TTL = float(os.getenv('TOKEN_CACHE_TTL', '300'))  # seconds, never past the token's exp
+
+# Stored for accounts created without a password (e.g. bulk imports); never matches
+UNUSABLE_PASSWORD = '!'
+
+class AuthBusy(Exception):
+    """Raised when the password hashing pool already holds ``max_pending`` requests"""
+
+class PasswordHasher:
+    """bcrypt on a small bounded thread pool.
+
+    bcrypt releases the GIL, so at most ``workers`` hashes run at once per
+    process however many requests arrive together, and the request threads
+    serving everything else keep their CPU. Up to ``max_pending`` hashes
+    may run or wait; further ones raise AuthBusy instead of queueing.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING,
+                 rounds: int = BCRYPT_ROUNDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._dummy_hash = None
+
+    def _get_executor(self):
+        # Pool threads do not survive fork(), so each worker process builds its own
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn, *args):
+        """Run ``fn(*args)`` in the pool and wait for it; raises AuthBusy when full"""
+        executor = self._get_executor()
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise AuthBusy()
+            self.pending += 1
+        try:
+            return executor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def hash(self, password: str) -> str:
+        return self.run(_hashpw, password, self.rounds)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        if not hashed or hashed.startswith(UNUSABLE_PASSWORD):
+            # Same bcrypt work as a real account, so timing does not reveal which emails exist
+            self.run(_checkpw, password, self._get_dummy_hash())
+            return False
+        return self.run(_checkpw, password, hashed)
+
+    def _get_dummy_hash(self) -> str:
+        # Made once per process at the current cost factor; two racing threads just make two equivalent hashes
+        if self._dummy_hash is None:
+            self._dummy_hash = _hashpw(UNUSABLE_PASSWORD, self.rounds)
+        return self._dummy_hash
+
+    def rehash(self, password: str, hashed: str):
+        """New hash for a just-verified ``password`` if ``hashed`` uses an outdated cost factor, else None"""
+        if not self.needs_rehash(hashed):
+            return None
+        upgraded = self.hash(password)
+        with self._lock:
+            self.rehashed += 1
+        return upgraded
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Whether ``hashed`` was made with a different cost factor than ``rounds``"""
+        try:
+            return int(hashed.split('$')[2]) != self.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'rounds': self.rounds,
+            'pending': self.pending,
+            'rejected': self.rejected,
+            'rehashed': self.rehashed
+        }
+
+def _hashpw(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _checkpw(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+password_hasher = PasswordHasher()
+
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash a password using bcrypt (in the hashing pool, with BCRYPT_ROUNDS)"""
+    return password_hasher.hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    """Verify a password against its hash (None for an unknown account still costs one bcrypt check)"""
+    return password_hasher.verify(password, hashed)
+
+def rehash_if_needed(password: str, hashed: str):
+    """New hash for a just-verified ``password`` if ``hashed`` uses an outdated cost factor, else None"""
+    return password_hasher.rehash(password, hashed)
 
 def generate_token(user_id: str, email: str) -> str:
     """Generate a JWT token for a user"""
@@ -31,15 +145,69 @@ def generate_token(user_id: str, email: str) -> str:
     token = jwt.encode(payload, SECRET_KEY, algorithm=JWT_ALGORITHM)
     return token
 
+class TokenCache:
+    """Payloads of tokens whose signature already verified, LRU-bounded.
+
+    An entry is served until ``ttl_seconds`` after it was verified or the
+    token's own ``exp``, whichever comes first, so a cached token never
+    outlives its expiry. Failed verifications are not cached.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl_seconds: float = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # token -> (expires_at, payload)
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and time.time() >= entry[0]:
+                del self._entries[token]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, payload: dict):
+        if self.max_size <= 0:
+            return
+        expires_at = min(time.time() + self.ttl, payload.get('exp', 0))
+        with self._lock:
+            self._entries[token] = (expires_at, payload)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+verified_tokens = TokenCache()
+
 def decode_token(token: str) -> dict:
-    """Decode and verify a JWT token"""
+    """Decode and verify a JWT token (tokens verified recently are served from verified_tokens)"""
+    payload = verified_tokens.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    verified_tokens.put(token, payload)
+    return payload
 
 def token_required(f):
     """Decorator to protect routes that require authentication"""
@@ -0,0 +1,101 @@
+# batch_encoder.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Micro-batching configuration
+ENCODER_MAX_BATCH = int(os.getenv('ENCODER_MAX_BATCH', '64'))  # sentences per forward pass
+ENCODER_MAX_WAIT_MS = float(os.getenv('ENCODER_MAX_WAIT_MS', '5'))  # 0 disables batching
+
+
+class BatchingEncoder:
+    """Shared front end for ``model.encode`` that coalesces concurrent calls.
+
+    Request threads enqueue their sentences and block on a future. A single
+    worker thread waits up to ``max_wait_ms`` (or until ``max_batch_size``
+    sentences are pending), runs one batched forward pass and hands each
+    caller back its own rows. The wait only applies while requests are
+    actually arriving together, so a lone caller is not delayed.
+    """
+
+    def __init__(self, model, max_batch_size: int = ENCODER_MAX_BATCH, max_wait_ms: float = ENCODER_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.sentences = 0
+        self._last_batch_callers = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._pid = None
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so each gunicorn worker starts its own
+        with self._lock:
+            if self._pid == os.getpid() and self._worker.is_alive():
+                return self._queue
+            self._queue = queue.Queue()
+            self._worker = threading.Thread(target=self._run, args=(self._queue,), daemon=True)
+            self._worker.start()
+            self._pid = os.getpid()
+            return self._queue
+
+    def encode(self, texts) -> np.ndarray:
+        """Encode ``texts`` as part of the next batch and return their embeddings"""
+        texts = list(texts)
+        if self.max_wait <= 0 or not texts:
+            return self._forward(texts)
+        future = Future()
+        self._ensure_worker().put((texts, future))
+        return future.result()
+
+    def _forward(self, texts):
+        self.batches += 1
+        self.sentences += len(texts)
+        return np.asarray(self.model.encode(texts, batch_size=max(len(texts), 1)))
+
+    def _collect(self, pending):
+        first = pending.get()
+        batch = [first]
+        count = len(first[0])
+        # Only hold the batch open if the previous one was shared by several callers
+        wait = self.max_wait if self._last_batch_callers > 1 else 0
+        deadline = time.monotonic() + wait
+        while count < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = pending.get(timeout=remaining) if remaining > 0 else pending.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            count += len(item[0])
+        self._last_batch_callers = len(batch)
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = self._collect(pending)
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = self._forward(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[start:start + len(item_texts)])
+                start += len(item_texts)
+
+    def stats(self) -> dict:
+        """Return batching counters for monitoring"""
+        return {
+            'batches': self.batches,
+            'sentences': self.sentences,
+            'mean_batch_size': self.sentences / self.batches if self.batches else 0.0
+        }
@@ -0,0 +1,91 @@
+# benchmarks/ann_recall.py
+"""Recall@k and latency of the IVF search backend against exact cosine similarity.
+
+Usage (from the repository root):
+    python -m benchmarks.ann_recall --rows 200000 --queries 200 --k 5
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from ann_index import IVFSearch
+from embedding_cache import normalize_rows
+from vector_index import VectorIndex
+
+
+def synthetic_embeddings(rows: int, dim: int, clusters: int, seed: int = 0):
+    """Clustered unit vectors, roughly shaped like profile embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(0, clusters, size=rows)
+    return normalize_rows(centers[labels] + rng.normal(scale=0.6, size=(rows, dim)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nlist', type=int, default=0)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    vectors = synthetic_embeddings(args.rows + args.queries, args.dim, args.clusters)
+    corpus, queries = vectors[:args.rows], vectors[args.rows:]
+
+    # Ground truth from the same cosine_similarity call the original search used
+    exact_top = np.argsort(-cosine_similarity(queries, corpus), axis=1)[:, :args.k]
+
+    # Load everything first, then train once on the full corpus
+    backend = IVFSearch(nlist=args.nlist, min_size=args.rows + 1, background=False)
+    index = VectorIndex(backend)
+    start = time.perf_counter()
+    for row, vector in enumerate(corpus):
+        index.upsert(row, vector)
+    build_s = time.perf_counter() - start
+    backend.min_size = 0
+    start = time.perf_counter()
+    backend.train(index)
+    train_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        backend.exact.search(index, query, args.k)
+    exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+    results = {
+        'rows': args.rows,
+        'dim': args.dim,
+        'k': args.k,
+        'nlist': backend.stats()['nlist'],
+        'build_seconds': round(build_s, 3),
+        'train_seconds': round(train_s, 3),
+        'exact_ms_per_query': round(exact_ms, 3),
+        'ivf': []
+    }
+    print(f"{args.rows} rows, nlist={results['nlist']}, exact scan {exact_ms:.2f} ms/query")
+    for nprobe in args.nprobe:
+        backend.nprobe = nprobe
+        hits = 0
+        start = time.perf_counter()
+        for query, expected in zip(queries, exact_top):
+            rows, _ = index.search(query, args.k)
+            hits += len(set(rows.tolist()) & set(expected.tolist()))
+        ms = (time.perf_counter() - start) * 1000 / args.queries
+        recall = hits / (args.queries * args.k)
+        results['ivf'].append({'nprobe': nprobe, 'recall_at_k': round(recall, 4), 'ms_per_query': round(ms, 3)})
+        print(f"  nprobe={nprobe:<4} recall@{args.k}={recall:.3f}  {ms:.2f} ms/query")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
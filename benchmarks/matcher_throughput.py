@@ -0,0 +1,193 @@
+# benchmarks/matcher_throughput.py
+"""Latency and throughput of registration, recommendations and search at several population sizes.
+
+Usage (from the repository root):
+    python -m benchmarks.matcher_throughput --sizes 1000 10000 100000 --output results.json
+
+By default a deterministic stub replaces the sentence-transformer, so the
+suite runs offline and repeatably; pass --model to use the real model.
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+
+import numpy as np
+
+# app.py must not load the model or the database at import
+os.environ['STUDYSYNC_PRELOAD_MODEL'] = '0'
+os.environ['STUDYSYNC_WARM_START'] = '0'
+
+import app  # noqa: E402
+
+SUBJECTS = ['Mathematics', 'Physics', 'Computer Science', 'Biology', 'Chemistry', 'Organic Chemistry',
+            'History', 'Economics', 'Psychology', 'Statistics', 'English Literature', 'Philosophy']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SLOTS = ['Morning (8-12 PM)', 'Afternoon (12-5 PM)', 'Evening (5-9 PM)']
+LEARNING_STYLES = [
+    'I prefer visual learning with diagrams and practice problems',
+    'Hands-on coding practice with peer discussions',
+    'I learn best by teaching others and group discussions',
+    'Reading and quiet review of lecture notes',
+    'Practice tests and flashcards before exams',
+    ''
+]
+ENVIRONMENTS = ['Quiet Library', 'Study Room', 'Coffee Shop', 'Online']
+METHODS = ['Flashcards', 'Practice Tests', 'Group Discussion', 'Summaries']
+QUERIES = ['Mathematics visual learner', 'Organic Chemistry exam prep', 'Computer Science coding practice',
+           'History reading group', 'Physics problem sets']
+
+
+class StubEncoder:
+    """Deterministic offline stand-in for SentenceTransformer.encode"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def encode(self, sentences, **kwargs):
+        vectors = np.empty((len(sentences), self.dim), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            seed = int.from_bytes(hashlib.sha1(sentence.encode('utf-8')).digest()[:8], 'little')
+            vectors[i] = np.random.default_rng(seed).normal(size=self.dim)
+        return vectors
+
+
+def synthetic_students(count: int, seed: int = 0, prefix: str = 'bench'):
+    """Profiles shaped like the test_students fixtures in app.py"""
+    rng = random.Random(seed)
+    students = []
+    for i in range(count):
+        subjects = rng.sample(SUBJECTS, rng.randint(1, 3))
+        schedule = {day: rng.sample(SLOTS, rng.randint(1, 2)) for day in rng.sample(DAYS, rng.randint(1, 3))}
+        students.append({
+            'id': f"{prefix}_{i}",
+            'name': f"Student {prefix} {i}",
+            'email': f"{prefix}{i}@university.edu",
+            'university': 'State University',
+            'major': subjects[0],
+            'year': rng.choice(['Freshman', 'Sophomore', 'Junior', 'Senior']),
+            'learningStyle': rng.choice(LEARNING_STYLES),
+            'subjects': subjects,
+            'studyEnvironments': rng.sample(ENVIRONMENTS, 2),
+            'studyMethods': rng.sample(METHODS, 2),
+            'schedule': schedule,
+            'performanceLevel': rng.randint(1, 5),
+            'groupPreferences': {
+                'groupSize': rng.randint(3, 6),
+                'sessionDuration': rng.randint(1, 3),
+                'studyGoals': ['Exam Preparation']
+            }
+        })
+    return students
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def summarize(latencies_ms) -> dict:
+    latencies = np.asarray(latencies_ms)
+    return {
+        'calls': len(latencies),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'throughput_per_s': round(len(latencies) / (latencies.sum() / 1000), 1) if latencies.sum() else None
+    }
+
+
+def timed(fn, items):
+    latencies = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)
+
+
+def run_size(size: int, args) -> dict:
+    # Profiles arrive as request bodies; only what the matcher keeps counts towards memory
+    population = [json.dumps(student) for student in synthetic_students(size, seed=args.seed)]
+    rss_before = rss_bytes()
+    matcher = app.AIStudentMatcher()
+    # Measure computation, not cache hits, unless asked otherwise
+    if not args.result_cache:
+        matcher.results.max_entries = 0
+    app.matcher = matcher
+
+    start = time.perf_counter()
+    for body in population:
+        matcher.add_student(json.loads(body))
+    load_s = time.perf_counter() - start
+    rss_after = rss_bytes()
+
+    rng = random.Random(args.seed + 1)
+    targets = [json.loads(population[rng.randrange(size)]) for _ in range(args.queries)]
+    newcomers = synthetic_students(args.registrations, seed=args.seed + 2, prefix=f"new{size}")
+    queries = [QUERIES[i % len(QUERIES)] + f" {i}" for i in range(args.queries)]
+
+    result = {
+        'students': size,
+        'load_seconds': round(load_s, 3),
+        'load_per_s': round(size / load_s, 1),
+        'memory_bytes_per_student': round((rss_after - rss_before) / size, 1),
+        'recommend': timed(matcher.generate_recommendations, targets),
+        'recommend_page': timed(lambda t: matcher.recommendation_page(t, limit=10), targets),
+        'search': timed(lambda q: app.search_response({'query': q}), queries),
+        'register': timed(matcher.add_student, newcomers)
+    }
+    print(f"{size:>9} students: load {result['load_per_s']:.0f}/s, "
+          f"{result['memory_bytes_per_student']:.0f} B/student, "
+          f"recommend p50 {result['recommend']['p50_ms']} ms p99 {result['recommend']['p99_ms']} ms, "
+          f"search p50 {result['search']['p50_ms']} ms, register p50 {result['register']['p50_ms']} ms")
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--registrations', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', action='store_true', help='use the real sentence-transformer instead of the stub')
+    parser.add_argument('--result-cache', action='store_true', help='keep the recommendation result cache enabled')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    if not args.model:
+        app.encoder.model = StubEncoder()
+    # Per-call timing is measured here; keep the app's own instrumentation out of the numbers
+    app.metrics.enabled = False
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'encoder': 'model' if args.model else 'stub',
+        'result_cache': args.result_cache,
+        'runs': [run_size(size, args) for size in args.sizes]
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
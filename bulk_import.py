@@ -0,0 +1,269 @@
+# bulk_import.py
+"""Bulk import of student profiles from JSONL or CSV.
+
+Usage (from the repository root):
+    python -m bulk_import students.jsonl
+    python -m bulk_import students.csv --batch-size 5000
+
+Profiles have the same shape /api/student accepts. In CSV files the list
+columns (subjects, studyEnvironments, studyMethods) are ';'-separated or
+JSON arrays, and schedule/groupPreferences are JSON objects.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+
+from embedding_cache import content_hash
+
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+MAX_REPORTED_ERRORS = 100
+
+REQUIRED_FIELDS = ('id', 'name', 'email', 'university', 'major', 'year')
+LIST_FIELDS = ('subjects', 'studyEnvironments', 'studyMethods')
+OBJECT_FIELDS = ('schedule', 'groupPreferences')
+
+
+def read_jsonl(stream):
+    """Yield ``(line_number, profile or error message)`` from a JSONL text stream"""
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, f"invalid JSON: {e}"
+
+
+def _csv_list(value):
+    value = (value or '').strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [item.strip() for item in value.split(';') if item.strip()]
+
+
+def read_csv(stream):
+    """Yield ``(line_number, profile or error message)`` from a CSV text stream with a header row"""
+    for number, row in enumerate(csv.DictReader(stream), start=2):
+        try:
+            profile = {key: value for key, value in row.items() if key and value not in (None, '')}
+            for field in LIST_FIELDS:
+                if field in profile:
+                    profile[field] = _csv_list(profile[field])
+            for field in OBJECT_FIELDS:
+                if field in profile:
+                    profile[field] = json.loads(profile[field])
+            yield number, profile
+        except ValueError as e:
+            yield number, f"invalid column value: {e}"
+
+
+def validate(profile) -> list:
+    """Return the problems with ``profile`` (empty if it can be imported); normalizes it in place"""
+    if not isinstance(profile, dict):
+        return ['expected a JSON object']
+    errors = [f"missing {field}" for field in REQUIRED_FIELDS if not profile.get(field)]
+    for field in LIST_FIELDS:
+        value = profile.setdefault(field, [])
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            errors.append(f"{field} must be a list of strings")
+    for field in OBJECT_FIELDS:
+        if not isinstance(profile.setdefault(field, {}), dict):
+            errors.append(f"{field} must be an object")
+    schedule = profile['schedule'] if isinstance(profile['schedule'], dict) else {}
+    if not all(isinstance(slots, list) for slots in schedule.values()):
+        errors.append('schedule values must be lists of time slots')
+    try:
+        level = int(profile.get('performanceLevel', 3))
+        if not 1 <= level <= 5:
+            raise ValueError
+        profile['performanceLevel'] = level
+    except (TypeError, ValueError):
+        errors.append('performanceLevel must be an integer from 1 to 5')
+    profile['learningStyle'] = profile.get('learningStyle') or ''
+    if not isinstance(profile['learningStyle'], str):
+        errors.append('learningStyle must be a string')
+    for field in REQUIRED_FIELDS:
+        if field in profile and not isinstance(profile[field], str):
+            profile[field] = str(profile[field])
+    return errors
+
+
+def user_row(profile) -> dict:
+    """users table row for a validated profile"""
+    from auth import UNUSABLE_PASSWORD
+    from schedule_grid import schedule_mask
+    return {
+        'id': profile['id'],
+        'name': profile['name'],
+        'email': profile['email'],
+        # Imported students set a password through the normal flow before they can log in
+        'password_hash': UNUSABLE_PASSWORD,
+        'university': profile['university'],
+        'major': profile['major'],
+        'year': profile['year'],
+        'learning_style': profile['learningStyle'],
+        'study_environments': profile['studyEnvironments'],
+        'study_methods': profile['studyMethods'],
+        'subjects': profile['subjects'],
+        'schedule': profile['schedule'],
+        'schedule_mask': schedule_mask(profile['schedule']),
+        'performance_level': profile['performanceLevel'],
+        'group_preferences': profile['groupPreferences']
+    }
+
+
+class BulkImporter:
+    """Imports validated profiles batch by batch.
+
+    Per batch: one query for ids/emails that already exist, one lookup of
+    stored embeddings, one encode call for the remaining texts, one
+    multi-row insert each for new embeddings and users, and one
+    ``add_students`` call on the matcher.
+    """
+
+    def __init__(self, matcher, model_name: str, write_db: bool = True, update_matcher: bool = True,
+                 batch_size: int = IMPORT_BATCH_SIZE, progress=print):
+        self.matcher = matcher
+        self.model_name = model_name
+        self.write_db = write_db
+        self.update_matcher = update_matcher
+        self.batch_size = batch_size
+        self.progress = progress
+        self.received = 0
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self.error_count = 0
+        self._seen_ids = set()
+        self._seen_emails = set()
+        self._started = time.perf_counter()
+
+    def _reject(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def run(self, records) -> dict:
+        """Import ``(line_number, profile)`` records and return the report"""
+        batch = []
+        for line, profile in records:
+            self.received += 1
+            errors = [profile] if isinstance(profile, str) else validate(profile)
+            if not errors and profile['id'] in self._seen_ids:
+                errors = [f"duplicate id {profile['id']}"]
+            elif not errors and profile['email'] in self._seen_emails:
+                errors = [f"duplicate email {profile['email']}"]
+            if errors:
+                self._reject(line, errors)
+                continue
+            self._seen_ids.add(profile['id'])
+            self._seen_emails.add(profile['email'])
+            batch.append(profile)
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+        if batch:
+            self._import_batch(batch)
+        return self.report()
+
+    def _existing(self, session, profiles):
+        from sqlalchemy import or_, select
+        from models import User
+        ids = [p['id'] for p in profiles]
+        emails = [p['email'] for p in profiles]
+        rows = session.execute(select(User.id, User.email).where(or_(User.id.in_(ids), User.email.in_(emails))))
+        existing_ids, existing_emails = set(), set()
+        for user_id, email in rows:
+            existing_ids.add(user_id)
+            existing_emails.add(email)
+        return existing_ids, existing_emails
+
+    def _import_batch(self, profiles):
+        if self.write_db:
+            from sqlalchemy import insert
+            from sqlalchemy.orm import Session
+            from database import engine
+            from models import User
+            from student_store import load_embeddings, save_embeddings
+            with Session(engine) as session:
+                existing_ids, existing_emails = self._existing(session, profiles)
+                fresh = []
+                for profile in profiles:
+                    if profile['id'] in existing_ids or profile['email'] in existing_emails:
+                        self.skipped += 1
+                    else:
+                        fresh.append(profile)
+                profiles = fresh
+
+                texts = {}
+                for profile in profiles:
+                    for text in self.matcher.get_embedding_texts(profile):
+                        texts.setdefault(content_hash(text), text)
+                stored = load_embeddings(session, self.model_name, list(texts))
+                for key, vector in stored.items():
+                    self.matcher.embeddings.put(key, vector, persist=False)
+                missing = {key: text for key, text in texts.items() if key not in stored}
+                if missing:
+                    vectors = self.matcher.embeddings.encode_many(list(missing.values()))
+                    save_embeddings(session, self.model_name, dict(zip(missing.keys(), vectors)))
+                if profiles:
+                    session.execute(insert(User), [user_row(profile) for profile in profiles])
+                    session.commit()
+        if self.update_matcher and profiles:
+            self.matcher.add_students(profiles)
+        self.imported += len(profiles)
+        if self.progress:
+            report = self.report()
+            self.progress(f"Bulk import: {self.imported} imported, {self.skipped} skipped, "
+                          f"{self.error_count} invalid ({report['per_second']}/s)")
+
+    def report(self) -> dict:
+        seconds = time.perf_counter() - self._started
+        return {
+            'received': self.received,
+            'imported': self.imported,
+            'skipped_existing': self.skipped,
+            'invalid': self.error_count,
+            'errors': self.errors,
+            'seconds': round(seconds, 2),
+            'per_second': round(self.imported / seconds, 1) if seconds else 0.0
+        }
+
+
+def read_records(stream, fmt: str):
+    """Records from a text stream in ``fmt`` ('jsonl' or 'csv')"""
+    if fmt == 'csv':
+        return read_csv(stream)
+    if fmt == 'jsonl':
+        return read_jsonl(stream)
+    raise ValueError(f"Unsupported format '{fmt}' (expected jsonl or csv)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='default: from the file extension')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    fmt = args.format or ('csv' if args.path.lower().endswith('.csv') else 'jsonl')
+
+    # Only the users table and stored embeddings are written here; running
+    # servers pick the students up through warm start / shared store refresh
+    os.environ.setdefault('STUDYSYNC_WARM_START', '0')
+    os.environ.setdefault('STUDYSYNC_PRELOAD_MODEL', '0')
+    import app
+
+    importer = BulkImporter(app.matcher, app.EMBEDDING_MODEL, update_matcher=False, batch_size=args.batch_size)
+    with io.open(args.path, encoding='utf-8', newline='') as f:
+        report = importer.run(read_records(f, fmt))
+    print(json.dumps({key: value for key, value in report.items() if key != 'errors'}))
+    for error in report['errors']:
+        print(f"  line {error['line']}: {'; '.join(error['errors'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+# chat_push.py
+"""Server push for group chat.
+
+Instead of polling GET /api/chat/<group_id>/messages, a client keeps one
+Server-Sent Events stream per open chat. Every worker keeps a ChatHub of
+the streams it serves, per group, and a send is fanned out to them through
+the configured broker (CHAT_BROKER):
+
+- ``local``: delivers inside this process only (one worker, or tests)
+- ``database``: also polls the messages table every CHAT_PUSH_POLL_SECONDS
+  for the groups that have streams in this worker, so messages sent through
+  other workers arrive with one query per worker instead of one per client
+- ``module:Class``: any class with the LocalBroker interface, e.g. one
+  backed by an external pub/sub service
+"""
+import importlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Push configuration
+CHAT_BROKER = os.getenv('CHAT_BROKER', 'database')
+CHAT_PUSH_POLL_SECONDS = float(os.getenv('CHAT_PUSH_POLL_SECONDS', '1'))
+CHAT_PUSH_HEARTBEAT_SECONDS = float(os.getenv('CHAT_PUSH_HEARTBEAT_SECONDS', '15'))
+CHAT_PUSH_QUEUE = int(os.getenv('CHAT_PUSH_QUEUE', '256'))  # undelivered messages per stream before it is reset
+# Streams served through Flask hold a server thread each; beyond this many per process they get 503.
+# The default leaves half of gunicorn's GUNICORN_THREADS for ordinary requests (ASGI mode has no cap).
+CHAT_WSGI_MAX_STREAMS = int(os.getenv('CHAT_WSGI_MAX_STREAMS',
+                                      str(max(1, int(os.getenv('GUNICORN_THREADS', '4')) // 2))))
+CHAT_STREAM_RETRY_SECONDS = 30
+# Rows can commit slightly out of timestamp order, so each poll re-reads this window
+POLL_LOOKBACK = timedelta(seconds=5)
+
+
+class Subscription:
+    """One stream's queue of messages for a group"""
+
+    def __init__(self, group_id, notify=None, max_queued: int = CHAT_PUSH_QUEUE):
+        self.group_id = group_id
+        self.closed = False
+        self._queue = queue.Queue(max_queued)
+        self._notify = notify
+
+    def put(self, message) -> bool:
+        """Queue ``message``; False once the stream has fallen too far behind"""
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.closed = True
+        if self._notify is not None:
+            self._notify()
+        return not self.closed
+
+    def get(self, timeout: float = 0) -> list:
+        """Queued messages, waiting up to ``timeout`` seconds for the first (0 = don't wait)"""
+        messages = []
+        try:
+            messages.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+            while True:
+                messages.append(self._queue.get_nowait())
+        except queue.Empty:
+            return messages
+
+
+class ChatHub:
+    """The streams served by this process, per group"""
+
+    def __init__(self):
+        self.delivered = 0
+        self.dropped = 0
+        self._groups = {}  # group id -> set of Subscription
+        self._lock = threading.Lock()
+
+    def subscribe(self, group_id, notify=None) -> Subscription:
+        subscription = Subscription(group_id, notify)
+        with self._lock:
+            self._groups.setdefault(group_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscriptions = self._groups.get(subscription.group_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._groups[subscription.group_id]
+
+    def groups(self) -> list:
+        """Groups with at least one stream in this process"""
+        with self._lock:
+            return list(self._groups)
+
+    def deliver(self, group_id, message: dict):
+        with self._lock:
+            subscriptions = list(self._groups.get(group_id, ()))
+        for subscription in subscriptions:
+            if not subscription.put(message):
+                self.dropped += 1
+                self.unsubscribe(subscription)
+        self.delivered += len(subscriptions)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'groups': len(self._groups),
+                'streams': sum(len(subscriptions) for subscriptions in self._groups.values()),
+                'delivered': self.delivered,
+                'dropped': self.dropped
+            }
+
+
+class LocalBroker:
+    """Delivers sends to this process's streams only.
+
+    Brokers implement ``publish(group_id, message)``, called after a
+    message is stored, and ``start()``, called once per process before the
+    first stream opens; messages from other processes are handed to
+    ``hub.deliver``.
+    """
+
+    name = 'local'
+
+    def __init__(self, hub: ChatHub):
+        self.hub = hub
+
+    def start(self):
+        pass
+
+    def publish(self, group_id, message: dict):
+        self.hub.deliver(group_id, message)
+
+    def stats(self) -> dict:
+        return {'broker': self.name}
+
+
+class DatabaseBroker(LocalBroker):
+    """LocalBroker plus a poll of the messages table for sends made by other workers"""
+
+    name = 'database'
+
+    def __init__(self, hub: ChatHub, poll_seconds: float = CHAT_PUSH_POLL_SECONDS):
+        super().__init__(hub)
+        self.poll_seconds = poll_seconds
+        self.polls = 0
+        self._watermark = None  # newest message timestamp seen
+        self._seen = {}  # message id -> timestamp, for messages inside the lookback window
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def start(self):
+        # Threads do not survive fork(), so each worker starts its own poller
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def publish(self, group_id, message: dict):
+        with self._lock:
+            # Pushed here already; the poll must not deliver it a second time
+            self._seen[message['id']] = datetime.fromisoformat(message['timestamp'])
+        super().publish(group_id, message)
+
+    def _run(self):
+        from database import close_db
+        while True:
+            started = time.monotonic()
+            groups = self.hub.groups()
+            if groups:
+                try:
+                    self.poll(groups)
+                except Exception as e:
+                    print(f"Chat push: poll failed: {e}")
+                finally:
+                    close_db()
+            time.sleep(max(self.poll_seconds - (time.monotonic() - started), 0))
+
+    def poll(self, group_ids):
+        """Deliver messages of ``group_ids`` stored since the last poll that this process has not pushed"""
+        from chat_store import latest_timestamp, messages_since, recent_messages
+        if self._watermark is None:
+            self._watermark = latest_timestamp() or datetime.min + POLL_LOOKBACK
+        messages = messages_since(group_ids, self._watermark - POLL_LOOKBACK)
+        self.polls += 1
+        for message in messages:
+            timestamp = datetime.fromisoformat(message['timestamp'])
+            with self._lock:
+                if message['id'] in self._seen:
+                    continue
+                self._seen[message['id']] = timestamp
+            self._watermark = max(self._watermark, timestamp)
+            recent_messages.add(message['groupId'], message)
+            self.hub.deliver(message['groupId'], message)
+        with self._lock:
+            cutoff = self._watermark - POLL_LOOKBACK
+            self._seen = {key: value for key, value in self._seen.items() if value >= cutoff}
+
+    def stats(self) -> dict:
+        return {'broker': self.name, 'polls': self.polls, 'poll_seconds': self.poll_seconds}
+
+
+BROKERS = {'local': LocalBroker, 'database': DatabaseBroker}
+
+
+def make_broker(name: str, hub: ChatHub):
+    """Return the broker configured by ``CHAT_BROKER``"""
+    if ':' in name:
+        module, _, attribute = name.partition(':')
+        return getattr(importlib.import_module(module), attribute)(hub)
+    if name not in BROKERS:
+        print(f"Unknown CHAT_BROKER '{name}', falling back to local delivery")
+        name = 'local'
+    return BROKERS[name](hub)
+
+
+hub = ChatHub()
+broker = make_broker(CHAT_BROKER, hub)
+
+
+def publish(group_id, message: dict):
+    """Push a stored message to every stream of its group"""
+    broker.publish(group_id, message)
+
+
+def open_member_stream(group_id, user_id, since: str = None, notify=None):
+    """Subscribe ``user_id`` to ``group_id``; returns ``(subscription, backlog)``, or None for non-members.
+
+    ``backlog`` holds the messages after the ``since`` cursor, or None when
+    more than a page was missed and the client should reload the chat.
+    Raises ValueError for a malformed cursor.
+    """
+    from chat_store import decode_cursor, is_member, messages_after
+    from database import close_db
+    try:
+        if since:
+            decode_cursor(since)
+        if not is_member(group_id, user_id):
+            return None
+        broker.start()
+        # Subscribe before reading the backlog so nothing sent in between is lost
+        subscription = hub.subscribe(group_id, notify)
+        backlog, missed = messages_after(group_id, since) if since else ([], False)
+        return subscription, None if missed else backlog
+    finally:
+        close_db()
+
+
+class EventStream:
+    """SSE encoding of one subscription: the backlog, then live messages, each sent once"""
+
+    def __init__(self, subscription: Subscription, backlog):
+        self.subscription = subscription
+        self.backlog = backlog
+        self._sent = OrderedDict()  # recent message ids; the backlog and live pushes overlap
+
+    @property
+    def closed(self) -> bool:
+        return self.subscription.closed
+
+    def opening(self) -> str:
+        """First chunk; also flushes the response headers to the client"""
+        if self.backlog is None:
+            return self._reset('missed')
+        return self._events(self.backlog) or ': connected\n\n'
+
+    def take(self, timeout: float = 0) -> str:
+        """Events for the queued messages (a keep-alive comment if none arrive within ``timeout``)"""
+        chunk = self._events(self.subscription.get(timeout))
+        if self.closed:
+            chunk += self._reset('behind')
+        return chunk or ': keep-alive\n\n'
+
+    def close(self):
+        hub.unsubscribe(self.subscription)
+
+    def __iter__(self):
+        try:
+            yield self.opening()
+            while not self.closed:
+                yield self.take(CHAT_PUSH_HEARTBEAT_SECONDS)
+        finally:
+            self.close()
+
+    def _events(self, messages) -> str:
+        from chat_store import encode_cursor
+        chunks = []
+        for message in messages:
+            if message['id'] in self._sent:
+                continue
+            self._sent[message['id']] = True
+            if len(self._sent) > CHAT_PUSH_QUEUE:
+                self._sent.popitem(last=False)
+            # The event id is a resume cursor; EventSource sends it back as Last-Event-ID
+            chunks.append(f"id: {encode_cursor(message)}\nevent: message\ndata: {json.dumps(message)}\n\n")
+        return ''.join(chunks)
+
+    @staticmethod
+    def _reset(reason: str) -> str:
+        # The client reloads the chat with GET /messages and reconnects
+        return f"event: reset\ndata: {json.dumps({'reason': reason})}\n\n"
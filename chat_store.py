@@ -0,0 +1,308 @@
+# chat_store.py
+import base64
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select
+
+from database import db_session
+from metrics import metrics
+from models import GroupMember, Message, MessageReaction, User
+
+# Chat paging and cache configuration
+CHAT_PAGE_SIZE = int(os.getenv('CHAT_PAGE_SIZE', '50'))
+CHAT_MAX_PAGE = int(os.getenv('CHAT_MAX_PAGE', '200'))
+CHAT_CACHE_GROUPS = int(os.getenv('CHAT_CACHE_GROUPS', '1000'))  # 0 disables
+CHAT_CACHE_MESSAGES = int(os.getenv('CHAT_CACHE_MESSAGES', '100'))  # newest messages kept per group
+CHAT_CACHE_TTL = float(os.getenv('CHAT_CACHE_TTL', '30'))  # seconds before an entry is re-read in full
+
+
+def encode_cursor(message: dict) -> str:
+    """Opaque cursor at ``message`` (a Message.to_dict()); pages run before it, streams resume after it"""
+    return base64.urlsafe_b64encode(json.dumps([message['timestamp'], message['id']]).encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor as ``(timestamp, id)``; raises ValueError for malformed cursors"""
+    try:
+        timestamp, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(timestamp), str(message_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+class RecentMessages:
+    """Per-group cache of the newest messages, LRU over groups.
+
+    Entries hold up to ``per_group`` message dicts, oldest first, and are
+    extended in place when a message is sent through this process. The
+    ``complete`` flag records that the group has no older messages, so a
+    short history is served entirely from memory. Sends and reactions
+    handled by other workers are caught by the ``is_current`` check passed
+    to ``get``; ``ttl`` only bounds how long an entry is reused at all.
+    """
+
+    def __init__(self, max_groups: int = CHAT_CACHE_GROUPS, per_group: int = CHAT_CACHE_MESSAGES,
+                 ttl_seconds: float = CHAT_CACHE_TTL):
+        self.max_groups = max_groups
+        self.per_group = per_group
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._entries = OrderedDict()  # group id -> (loaded_at, messages, complete, newest reaction id)
+        self._lock = threading.Lock()
+
+    def get(self, group_id, limit: int, is_current=None):
+        """Newest ``limit`` messages and whether older ones exist, or None if not cached.
+
+        ``is_current(group_id, messages, complete, reaction_mark)`` is called
+        outside the lock to confirm the entry against the database; when it
+        returns False the entry is dropped and None returned.
+        """
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[group_id]
+                entry = None
+            if entry is None or (len(entry[1]) < limit and not entry[2]):
+                self.misses += 1
+                return None
+            _, messages, complete, reaction_mark = entry
+            messages = list(messages)
+        if is_current is not None and not is_current(group_id, messages, complete, reaction_mark):
+            with self._lock:
+                if self._entries.get(group_id) is entry:
+                    del self._entries[group_id]
+                self.stale += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            if group_id in self._entries:
+                self._entries.move_to_end(group_id)
+            self.hits += 1
+        return messages[-limit:], len(messages) > limit or not complete
+
+    def put(self, group_id, messages, complete: bool, reaction_mark=None):
+        """Cache a group's newest ``messages``; ``reaction_mark`` is the newest reaction id among them"""
+        if self.max_groups <= 0:
+            return
+        with self._lock:
+            self._entries[group_id] = (time.monotonic(), list(messages[-self.per_group:]),
+                                       complete and len(messages) <= self.per_group, reaction_mark)
+            self._entries.move_to_end(group_id)
+            while len(self._entries) > self.max_groups:
+                self._entries.popitem(last=False)
+
+    def add(self, group_id, message: dict):
+        """Insert a new message into the group's entry, if it is cached and does not hold it yet"""
+        with self._lock:
+            entry = self._entries.get(group_id)
+            if entry is None:
+                return
+            loaded_at, messages, complete, reaction_mark = entry
+            # Messages pushed from other workers can arrive after newer local ones
+            key = (message['timestamp'], message['id'])
+            position = len(messages)
+            while position and (messages[position - 1]['timestamp'], messages[position - 1]['id']) >= key:
+                position -= 1
+                if messages[position]['id'] == message['id']:
+                    return
+            if position == 0 and messages and not complete:
+                return  # older than the window; it is read from the database with that page
+            messages.insert(position, message)
+            if len(messages) > self.per_group:
+                del messages[0]
+                complete = False
+            self._entries[group_id] = (loaded_at, messages, complete, reaction_mark)
+
+    def invalidate(self, group_id):
+        with self._lock:
+            self._entries.pop(group_id, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'groups': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+recent_messages = RecentMessages()
+
+
+def is_member(group_id, user_id) -> bool:
+    """Whether ``user_id`` is an active member of ``group_id``"""
+    return db_session.execute(
+        select(GroupMember.id).where(GroupMember.group_id == group_id, GroupMember.user_id == user_id,
+                                     GroupMember.status == 'active').limit(1)
+    ).first() is not None
+
+
+def load_reactions(message_ids) -> dict:
+    """Reactions of every message in ``message_ids`` with one query, as {message_id: [reaction, ...]}"""
+    reactions = {message_id: [] for message_id in message_ids}
+    if not message_ids:
+        return reactions
+    rows = db_session.execute(
+        select(MessageReaction).where(MessageReaction.message_id.in_(list(message_ids)))
+        .order_by(MessageReaction.id)
+    ).scalars()
+    for reaction in rows:
+        reactions[reaction.message_id].append(reaction.to_dict())
+    return reactions
+
+
+def _with_reactions(rows) -> list:
+    messages = [row.to_dict() for row in rows]
+    reactions = load_reactions([message['id'] for message in messages])
+    for message in messages:
+        message['reactions'] = reactions[message['id']]
+    return messages
+
+
+def _fetch(group_id, limit: int, before=None):
+    """Up to ``limit`` messages older than the ``before`` cursor, oldest first, plus whether more exist.
+
+    Walks the (group_id, timestamp, id) index backwards from the cursor, so
+    the cost depends on the page size, not on the length of the history.
+    """
+    statement = select(Message).where(Message.group_id == group_id)
+    if before is not None:
+        timestamp, message_id = before
+        statement = statement.where(or_(
+            Message.timestamp < timestamp,
+            and_(Message.timestamp == timestamp, Message.id < message_id)
+        ))
+    rows = db_session.execute(
+        statement.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1)
+    ).scalars().all()
+    return _with_reactions(reversed(rows[:limit])), len(rows) > limit
+
+
+def messages_after(group_id, after: str, limit: int = CHAT_MAX_PAGE):
+    """Up to ``limit`` messages newer than the ``after`` cursor, oldest first, plus whether more exist"""
+    timestamp, message_id = decode_cursor(after)
+    rows = db_session.execute(
+        select(Message).where(Message.group_id == group_id, or_(
+            Message.timestamp > timestamp,
+            and_(Message.timestamp == timestamp, Message.id > message_id)
+        )).order_by(Message.timestamp, Message.id).limit(limit + 1)
+    ).scalars().all()
+    return _with_reactions(rows[:limit]), len(rows) > limit
+
+
+def messages_since(group_ids, since: datetime) -> list:
+    """Messages of any of ``group_ids`` stored at or after ``since``, oldest first"""
+    rows = db_session.execute(
+        select(Message).where(Message.group_id.in_(list(group_ids)), Message.timestamp >= since)
+        .order_by(Message.timestamp, Message.id)
+    ).scalars().all()
+    return _with_reactions(rows)
+
+
+def latest_timestamp():
+    """Timestamp of the newest stored message, or None"""
+    return db_session.execute(select(func.max(Message.timestamp))).scalar()
+
+
+def window_state(group_id, messages, complete: bool) -> tuple:
+    """(messages, reactions, newest reaction id) the database holds for a cached window, in one query.
+
+    The window is every message from its oldest one on (the whole group
+    when ``complete``), so any send lands in it; reactions are counted on
+    the window's messages, so any add or removal changes the count or id.
+    """
+    in_window = Message.group_id == group_id
+    if messages and not complete:
+        timestamp, message_id = datetime.fromisoformat(messages[0]['timestamp']), messages[0]['id']
+        in_window = and_(in_window, or_(Message.timestamp > timestamp,
+                                        and_(Message.timestamp == timestamp, Message.id >= message_id)))
+    reactions = MessageReaction.message_id.in_([message['id'] for message in messages])
+    return tuple(db_session.execute(select(
+        select(func.count(Message.id)).where(in_window).scalar_subquery(),
+        select(func.count(MessageReaction.id)).where(reactions).scalar_subquery(),
+        select(func.max(MessageReaction.id)).where(reactions).scalar_subquery()
+    )).one())
+
+
+def _is_current(group_id, messages, complete, reaction_mark) -> bool:
+    with metrics.timer('chat.check'):
+        state = window_state(group_id, messages, complete)
+    return state == (len(messages), sum(len(message['reactions']) for message in messages), reaction_mark)
+
+
+def message_page(group_id, limit: int = CHAT_PAGE_SIZE, before: str = None) -> dict:
+    """One page of a group's messages, oldest first, ending just before ``before`` (newest page if None)"""
+    cursor = None if before is None else decode_cursor(before)
+    result = None
+    if cursor is None:
+        result = recent_messages.get(group_id, limit, _is_current)
+        if result is None and limit <= recent_messages.per_group:
+            # Read the whole cached window once; the next opens of this chat are served from memory
+            with metrics.timer('chat.fetch'):
+                window, has_more = _fetch(group_id, recent_messages.per_group)
+                # Same transaction as the fetch, so the mark matches the reactions just read
+                reaction_mark = window_state(group_id, window, not has_more)[2]
+            recent_messages.put(group_id, window, complete=not has_more, reaction_mark=reaction_mark)
+            result = window[-limit:], has_more or len(window) > limit
+    if result is None:
+        with metrics.timer('chat.fetch'):
+            result = _fetch(group_id, limit, cursor)
+    messages, has_more = result
+    return {
+        'messages': messages,
+        'nextCursor': encode_cursor(messages[0]) if has_more and messages else None
+    }
+
+
+def send_message(group_id, user_id, data: dict) -> dict:
+    """Store a message from ``user_id``, add it to the group's cached window and push it to open streams"""
+    from chat_push import publish
+    sender = db_session.get(User, user_id)
+    message = Message(
+        # Time-ordered ids keep (timestamp, id) increasing within a second, so resume cursors skip nothing
+        id=f"msg_{time.time_ns():020d}_{uuid.uuid4().hex[:8]}",
+        group_id=group_id,
+        sender_id=user_id,
+        sender_name=sender.name if sender is not None else '',
+        message=data.get('message'),
+        type=data.get('type') or 'text',
+        image_uri=data.get('imageUri'),
+        file_name=data.get('fileName')
+    )
+    db_session.add(message)
+    db_session.commit()
+    # Read back the stored timestamp so cursors match what later queries compare against
+    db_session.refresh(message)
+    result = message.to_dict()
+    result['reactions'] = []
+    recent_messages.add(group_id, result)
+    publish(group_id, result)
+    return result
+
+
+def toggle_reaction(message, user_id, emoji: str) -> list:
+    """Add ``user_id``'s ``emoji`` reaction to ``message`` or remove it if present; returns the reactions"""
+    existing = db_session.execute(
+        select(MessageReaction).where(MessageReaction.message_id == message.id,
+                                      MessageReaction.user_id == user_id, MessageReaction.emoji == emoji)
+    ).scalars().first()
+    if existing is not None:
+        db_session.delete(existing)
+    else:
+        sender = db_session.get(User, user_id)
+        db_session.add(MessageReaction(message_id=message.id, user_id=user_id,
+                                       user_name=sender.name if sender is not None else '', emoji=emoji))
+    db_session.commit()
+    # Cached windows carry reactions; reload this group's on its next read
+    recent_messages.invalidate(message.group_id)
+    return load_reactions([message.id])[message.id]
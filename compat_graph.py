@@ -0,0 +1,291 @@
+# compat_graph.py
+"""Offline all-pairs compatibility graph.
+
+Usage (from the repository root, e.g. nightly):
+    python -m compat_graph
+    python -m compat_graph --top-k 50 --workers 8
+
+Loads every student like a warm-started server, scores all pairs with the
+four-factor composite in blocks of target rows (one matrix product per
+factor instead of one Python call per pair), and stores each student's
+best GRAPH_TOP_K matches above MATCH_THRESHOLD in the compatibility_edges
+table. Batch consumers (digests, onboarding suggestions) read that table
+directly; /api/recommend serves from it with ``"source": "graph"``,
+re-scoring live only the students changed since the run.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from schedule_grid import overlap_matrix
+from scoring import MATCH_THRESHOLD, STYLE_PRECISION, WEIGHTS
+
+GRAPH_TOP_K = int(os.getenv('GRAPH_TOP_K', '20'))
+GRAPH_WORKERS = int(os.getenv('GRAPH_WORKERS', str(os.cpu_count() or 1)))
+GRAPH_BLOCK_ELEMENTS = int(os.getenv('GRAPH_BLOCK_ELEMENTS', '2000000'))  # pairs scored per block
+GRAPH_MAX_TOPUP = int(os.getenv('GRAPH_MAX_TOPUP', '5000'))  # changed students re-scored live per request
+WRITE_BATCH_SIZE = 5000
+
+FACTORS = ('subject', 'schedule', 'learning_style', 'performance')
+
+# Set in the parent before the pool forks; workers read it copy-on-write
+_FEATURES = None
+
+
+def features(arrays: dict) -> dict:
+    """Block-scoring inputs from ScoringEngine.export_arrays().
+
+    Subject sets, schedules, performance levels and learning styles repeat
+    a lot between students, so each block is scored against the distinct
+    values of a factor only and the result is gathered back out to every row.
+    """
+    subjects = arrays['subjects'].astype(np.float32)
+    subject_sets, subject_inverse = np.unique(subjects, axis=0, return_inverse=True)
+    schedule = np.asarray(arrays['schedule'], dtype=np.uint64)
+    schedules, schedule_inverse = np.unique(schedule, return_inverse=True)
+    performance = np.asarray(arrays['performance'], dtype=np.float64)
+    levels, performance_inverse = np.unique(performance, return_inverse=True)
+    styles = arrays.get('styles')
+    if styles is not None:
+        _, first, style_inverse = np.unique(arrays['style_keys'], return_index=True, return_inverse=True)
+        distinct_styles = np.asarray(styles, dtype=np.float32)[first]
+    return {
+        'subjects': subjects,
+        'subject_sets': subject_sets,
+        'subject_inverse': subject_inverse.reshape(-1),
+        'schedule': schedule,
+        'schedules': schedules,
+        'schedule_inverse': schedule_inverse,
+        'performance': performance,
+        'levels': levels,
+        'performance_inverse': performance_inverse,
+        'has_style': np.asarray(arrays['has_style'], dtype=bool),
+        'styles': None if styles is None else np.asarray(styles, dtype=np.float32),
+        'distinct_styles': None if styles is None else distinct_styles,
+        'style_inverse': None if styles is None else style_inverse
+    }
+
+
+def score_block(data: dict, start: int, stop: int) -> dict:
+    """Every factor and the composite for rows ``start:stop`` against every row, as matrices.
+
+    Same formulas as ScoringEngine.score; the diagonal (a student against
+    themself) gets a match percentage of -1.
+    """
+    block = slice(start, stop)
+    counts = data['subjects'][block].sum(axis=1, dtype=np.float64)[:, None]
+    set_counts = data['subject_sets'].sum(axis=1, dtype=np.float64)[None, :]
+    intersection = (data['subjects'][block] @ data['subject_sets'].T).astype(np.float64)
+    union = counts + set_counts - intersection
+    subject = np.where((counts > 0) & (set_counts > 0), intersection / np.maximum(union, 1), 0.0)
+    subject = subject[:, data['subject_inverse']]
+
+    schedule = overlap_matrix(data['schedule'][block], data['schedules'])[:, data['schedule_inverse']]
+
+    if data['styles'] is None:
+        learning_style = np.zeros_like(subject)
+    else:
+        similarity = np.round((data['styles'][block] @ data['distinct_styles'].T).astype(np.float64), STYLE_PRECISION)
+        has_style = data['has_style'][block, None] & data['has_style'][None, :]
+        learning_style = np.where(has_style, np.maximum(similarity[:, data['style_inverse']], 0.0), 0.0)
+
+    performance = 1 - np.abs(data['performance'][block, None] - data['levels'][None, :]) / 4
+    performance = performance[:, data['performance_inverse']]
+
+    # Same order of additions as ScoringEngine._combine, so truncation agrees
+    composite = subject * WEIGHTS['subject']
+    composite += schedule * WEIGHTS['schedule']
+    composite += learning_style * WEIGHTS['learning_style']
+    composite += performance * WEIGHTS['performance']
+    composite *= 100
+    match_percentage = composite.astype(np.int64)
+    match_percentage[np.arange(stop - start), np.arange(start, stop)] = -1
+    return {'subject': subject, 'schedule': schedule, 'learning_style': learning_style,
+            'performance': performance, 'match_percentage': match_percentage}
+
+
+def top_neighbours(scores: dict, top_k: int, threshold: int = MATCH_THRESHOLD) -> dict:
+    """Best ``top_k`` columns per row above ``threshold``, ties in row order; -1 pads short rows"""
+    match_percentage = scores['match_percentage']
+    size = match_percentage.shape[1]
+    top_k = min(top_k, size)
+    # One sortable key per pair: higher percentage first, then lower row
+    key = np.where(match_percentage > threshold, match_percentage * (size + 1) + (size - np.arange(size)), -1)
+    candidates = np.argpartition(-key, top_k - 1, axis=1)[:, :top_k] if top_k < size else \
+        np.tile(np.arange(size), (len(key), 1))
+    order = np.take_along_axis(candidates, np.argsort(-np.take_along_axis(key, candidates, axis=1), axis=1,
+                                                      kind='stable'), axis=1)
+    valid = np.take_along_axis(key, order, axis=1) >= 0
+    result = {'neighbours': np.where(valid, order, -1)}
+    for name in FACTORS + ('match_percentage',):
+        result[name] = np.take_along_axis(scores[name], order, axis=1)
+    return result
+
+
+def _block_task(bounds):
+    start, stop, top_k = bounds
+    return start, top_neighbours(score_block(_FEATURES, start, stop), top_k)
+
+
+def compute_graph(arrays: dict, top_k: int = GRAPH_TOP_K, workers: int = GRAPH_WORKERS,
+                  block_elements: int = GRAPH_BLOCK_ELEMENTS):
+    """Yield ``(first_row, top_neighbours result)`` per block of target rows, in row order.
+
+    Blocks are sized so a block's score matrices hold about
+    ``block_elements`` pairs. With ``workers`` > 1 they are spread over a
+    forked process pool that shares the feature arrays copy-on-write.
+    """
+    global _FEATURES
+    _FEATURES = features(arrays)
+    size = len(_FEATURES['schedule'])
+    block = max(1, min(size, block_elements // max(size, 1)))
+    tasks = [(start, min(start + block, size), top_k) for start in range(0, size, block)]
+    if workers <= 1 or len(tasks) == 1:
+        for task in tasks:
+            yield _block_task(task)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+        yield from pool.map(_block_task, tasks)
+
+
+def edge_rows(student_ids, first_row: int, result: dict, computed_at) -> list:
+    """compatibility_edges rows for one block"""
+    rows = []
+    for i, neighbours in enumerate(result['neighbours']):
+        for rank, neighbour in enumerate(neighbours):
+            if neighbour < 0:
+                break
+            rows.append({
+                'student_id': student_ids[first_row + i],
+                'rank': rank,
+                'neighbor_id': student_ids[neighbour],
+                'match_percentage': int(result['match_percentage'][i, rank]),
+                **{name: float(result[name][i, rank]) for name in FACTORS},
+                'computed_at': computed_at
+            })
+    return rows
+
+
+def build_graph(matcher, top_k: int = GRAPH_TOP_K, workers: int = GRAPH_WORKERS, progress=print) -> dict:
+    """Recompute compatibility_edges for every student resident in ``matcher``"""
+    from sqlalchemy import delete, func, insert, select
+    from sqlalchemy.orm import Session
+    from database import engine
+    from models import CompatibilityEdge
+
+    started = time.perf_counter()
+    student_ids = [record.student_id for record in matcher.students]
+    edges = 0
+    with Session(engine) as session:
+        # Database time, so serving can compare it with users.updated_at
+        computed_at = session.execute(select(func.now())).scalar()
+        for first_row, result in compute_graph(matcher.scoring.export_arrays(), top_k, workers):
+            rows = edge_rows(student_ids, first_row, result, computed_at)
+            stop = first_row + len(result['neighbours'])
+            session.execute(delete(CompatibilityEdge).where(
+                CompatibilityEdge.student_id.in_(student_ids[first_row:stop])))
+            for i in range(0, len(rows), WRITE_BATCH_SIZE):
+                session.execute(insert(CompatibilityEdge), rows[i:i + WRITE_BATCH_SIZE])
+            session.commit()
+            edges += len(rows)
+            if progress:
+                progress(f"Compatibility graph: {stop}/{len(student_ids)} students, {edges} edges")
+        # Students that no longer exist keep no edges from older runs
+        session.execute(delete(CompatibilityEdge).where(CompatibilityEdge.computed_at < computed_at))
+        session.commit()
+    seconds = time.perf_counter() - started
+    return {
+        'students': len(student_ids),
+        'edges': edges,
+        'top_k': top_k,
+        'workers': workers,
+        'seconds': round(seconds, 2),
+        'per_second': round(len(student_ids) / seconds, 1) if seconds else 0.0
+    }
+
+
+def graph_page(matcher, target_student, limit=None):
+    """Recommendation page for ``target_student`` from the stored graph, or None to rank live.
+
+    The stored neighbours are used as they are, except those whose profile
+    changed since the run: they and any students added since are re-scored
+    live against the target and merged in. The graph cannot answer for a
+    target that changed since the run (or whose request profile differs from
+    the stored one), that has no stored neighbours, or when more than
+    GRAPH_MAX_TOPUP students changed.
+    """
+    from sqlalchemy import select
+    from database import db_session
+    from models import CompatibilityEdge, User
+
+    student_id = target_student.get('id')
+    state = matcher.state
+    own_rows = state.scoring.rows_for(student_id) if student_id is not None else []
+    if not own_rows or not state.students[own_rows[0]].matches(target_student):
+        return None
+    try:
+        edges = db_session.execute(
+            select(CompatibilityEdge).where(CompatibilityEdge.student_id == student_id)
+            .order_by(CompatibilityEdge.rank)
+        ).scalars().all()
+        if not edges:
+            return None
+        changed = set(db_session.execute(
+            select(User.id).where(User.updated_at >= edges[0].computed_at).limit(GRAPH_MAX_TOPUP + 1)
+        ).scalars())
+    finally:
+        db_session.remove()
+    if student_id in changed or len(changed) > GRAPH_MAX_TOPUP:
+        return None
+
+    # (match_percentage, subject, schedule, learning_style, performance) per neighbour, stored order first
+    ranked = {edge.neighbor_id: (edge.match_percentage, edge.subject, edge.schedule, edge.learning_style,
+                                 edge.performance) for edge in edges if edge.neighbor_id not in changed}
+    changed_rows = np.array([row for changed_id in changed for row in state.scoring.rows_for(changed_id)],
+                            dtype=np.int64)
+    if len(changed_rows):
+        scores = state.scoring.score(target_student, matcher.get_style_vector(target_student), changed_rows)
+        for i in np.flatnonzero(scores['match_percentage'] > MATCH_THRESHOLD):
+            ranked[state.students[changed_rows[i]].student_id] = (
+                int(scores['match_percentage'][i]), *(float(scores[name][i]) for name in FACTORS))
+
+    neighbours = []
+    for neighbour_id, values in ranked.items():
+        rows = state.scoring.rows_for(neighbour_id)
+        if rows:
+            neighbours.append((rows[0], values))
+    # Best first; the stable sort keeps stored order, then top-up order, among ties
+    neighbours.sort(key=lambda item: -item[1][0])
+    total = len(neighbours)
+    size = max(len(edges), GRAPH_TOP_K)
+    neighbours = neighbours[:size if limit is None else min(limit, size)]
+    scores = {name: np.array([values[k + 1] for _, values in neighbours]) for k, name in enumerate(FACTORS)}
+    scores['match_percentage'] = np.array([values[0] for _, values in neighbours], dtype=np.int64)
+    scores['ids'] = np.arange(1, len(neighbours) + 1)
+    recommendations = [matcher.build_recommendation(state.students[row], scores, i)
+                       for i, (row, _) in enumerate(neighbours)]
+    recommendations.append(matcher.create_group_card(target_student, len(neighbours)))
+    return {'recommendations': recommendations, 'nextCursor': None, 'totalMatches': total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--top-k', type=int, default=GRAPH_TOP_K)
+    parser.add_argument('--workers', type=int, default=GRAPH_WORKERS)
+    args = parser.parse_args()
+
+    # Every student is loaded (embeddings come from the database) before scoring
+    os.environ.setdefault('STUDYSYNC_WARM_START', '1')
+    os.environ.setdefault('STUDYSYNC_PRELOAD_MODEL', '0')
+    import app
+
+    report = build_graph(app.matcher, args.top_k, args.workers)
+    print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 import os
 from dotenv import load_dotenv
+from metrics import instrument_engine
 
 load_dotenv()
 
@@ -25,6 +26,9 @@ engine = create_engine(
     echo=False  # Set to True for SQL query logging
 )
 
+# Time every query for /api/metrics
+instrument_engine(engine)
+
 # Create session
 db_session = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=engine))
 
@@ -35,7 +39,7 @@ Base.query = db_session.query_property()
 def init_db():
     """Initialize the database"""
     # Import all models here
-    from models import User, StudyGroup, GroupMember, Message, MessageReaction, StudySession, SessionAttendee
+    from models import User, TextEmbedding, StudyGroup, GroupMember, Message, MessageReaction, StudySession, SessionAttendee
     Base.metadata.create_all(bind=engine)
     print("Database initialized successfully!")
 
@@ -0,0 +1,256 @@
+# embedding_cache.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from lexical_index import phrase_key
+
+# Embedding cache configuration
+EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '20000'))
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', '')  # empty = memory only
+
+# Search query embedding cache configuration
+QUERY_CACHE_BYTES = int(os.getenv('QUERY_CACHE_BYTES', str(16 * 1024 * 1024)))  # 0 disables
+QUERY_PREWARM_LIMIT = int(os.getenv('QUERY_PREWARM_LIMIT', '2000'))  # catalogue entries encoded at startup
+QUERY_PREWARM_BATCH = 64
+
+
+def content_hash(text: str) -> str:
+    """Return the cache key for a piece of text"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def normalize_query(query) -> str:
+    """Canonical form of a search query, the same one the keyword index uses for phrases.
+
+    Case-folded words with single spaces; punctuation is dropped except the
+    '+' and '#' ending a word, so 'C++', 'C#' and 'C' stay distinct queries.
+    """
+    return phrase_key(query)
+
+
+def normalize_rows(vectors) -> np.ndarray:
+    """L2-normalize embeddings so cosine similarity becomes a dot product"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingCache:
+    """LRU cache of normalized sentence embeddings keyed by content hash.
+
+    Misses are encoded in a single batch with ``encode_fn``. When ``cache_dir``
+    is set, vectors are also written to disk so they survive restarts; a
+    ``namespace`` (e.g. the quantization mode) gets its own subdirectory so
+    vectors from different weights never mix.
+    """
+
+    def __init__(self, encode_fn, max_entries: int = EMBEDDING_CACHE_SIZE, cache_dir: str = EMBEDDING_CACHE_DIR,
+                 namespace: str = ''):
+        self.encode_fn = encode_fn
+        self.max_entries = max_entries
+        self.cache_dir = os.path.join(cache_dir, namespace) if cache_dir and namespace else cache_dir or None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def _load_from_disk(self, key: str):
+        if not self.cache_dir:
+            return None
+        try:
+            return np.load(self._disk_path(key))
+        except (OSError, ValueError):
+            return None
+
+    def _save_to_disk(self, key: str, vector: np.ndarray):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, vector)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not persist embedding {key}: {e}")
+
+    def _remember(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str):
+        """Return the cached vector for ``key`` or None"""
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                return vector
+        vector = self._load_from_disk(key)
+        if vector is not None:
+            self._remember(key, vector)
+        return vector
+
+    def _store(self, key: str, vector: np.ndarray, persist: bool = True):
+        self._remember(key, vector)
+        if persist and self.cache_dir:
+            self._save_to_disk(key, vector)
+
+    def put(self, key: str, vector, persist: bool = True):
+        """Store an already computed embedding under ``key``"""
+        vector = normalize_rows(vector)
+        self._store(key, vector, persist)
+        return vector
+
+    def encode(self, text: str) -> np.ndarray:
+        """Return the normalized embedding for one text"""
+        return self.encode_many([text])[0]
+
+    def encode_many(self, texts) -> np.ndarray:
+        """Return normalized embeddings for ``texts``, encoding only the misses"""
+        keys = [content_hash(text) for text in texts]
+        vectors = [self.get(key) for key in keys]
+
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        self.hits += len(texts) - sum(1 for v in vectors if v is None)
+        self.misses += len(missing)
+
+        if missing:
+            encoded = normalize_rows(self.encode_fn(list(missing.values())))
+            for key, vector in zip(missing.keys(), encoded):
+                self._store(key, vector)
+            fresh = dict(zip(missing.keys(), encoded))
+            vectors = [fresh[keys[i]] if v is None else v for i, v in enumerate(vectors)]
+
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(vectors)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for monitoring"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
+
+
+class QueryEmbeddingCache:
+    """LRU cache of search-query embeddings, bounded by bytes.
+
+    Keys are normalize_query forms, so 'Calculus', ' calculus!' and
+    'CALCULUS' share one entry; the model encodes the query as first typed.
+    Each entry is charged the bytes of its vector and its key; the least
+    recently used entries are evicted once ``max_bytes`` is exceeded.
+    ``prewarm`` encodes a catalogue (e.g. every subject name) in batches
+    ahead of the first searches.
+    """
+
+    def __init__(self, encode_fn, max_bytes: int = QUERY_CACHE_BYTES):
+        self.encode_fn = encode_fn
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prewarmed = 0
+        self._entries = OrderedDict()  # normalized query -> (vector, bytes charged)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remember(self, key: str, vector: np.ndarray):
+        if self.max_bytes <= 0:
+            return
+        size = vector.nbytes + len(key.encode('utf-8'))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (vector, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and self._entries:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+                self.evictions += 1
+
+    def encode(self, query) -> np.ndarray:
+        """Return the normalized embedding of ``query``, cached under its normalized form"""
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        vector = normalize_rows(self.encode_fn([str(query).strip()]))[0]
+        self._remember(key, vector)
+        return vector
+
+    def prewarm(self, texts, limit: int = QUERY_PREWARM_LIMIT) -> int:
+        """Encode the first ``limit`` distinct normalized ``texts`` not cached yet; returns how many"""
+        originals = {}  # normalized key -> first text with that key
+        for text in texts:
+            originals.setdefault(normalize_query(text), str(text).strip())
+        keys = [key for key in originals if key][:limit]
+        with self._lock:
+            keys = [key for key in keys if key not in self._entries]
+        for start in range(0, len(keys), QUERY_PREWARM_BATCH):
+            batch = keys[start:start + QUERY_PREWARM_BATCH]
+            encoded = normalize_rows(self.encode_fn([originals[key] for key in batch]))
+            for key, vector in zip(batch, encoded):
+                self._remember(key, vector)
+        self.prewarmed += len(keys)
+        return len(keys)
+
+    def start_prewarm(self, catalogue):
+        """Prewarm from ``catalogue()`` in a background thread of this process (once per pid)"""
+        with self._lock:
+            if self._pid == os.getpid() or self.max_bytes <= 0:
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._prewarm, args=(catalogue,), daemon=True)
+            self._thread.start()
+
+    def _prewarm(self, catalogue):
+        try:
+            count = self.prewarm(catalogue())
+            print(f"Query cache: prewarmed {count} catalogue entries")
+        except Exception as e:
+            print(f"Query cache prewarm failed: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'evictions': self.evictions,
+            'prewarmed': self.prewarmed
+        }
@@ -0,0 +1,286 @@
+# group_formation.py
+"""Automatic study-group formation.
+
+Usage (from the repository root):
+    python -m group_formation                      # cohorts by university and major
+    python -m group_formation --by subject         # cohorts by each student's first subject
+    python -m group_formation --university "State University" --dry-run
+
+Students not yet active in any group are split into cohorts, and every
+cohort is partitioned into groups that maximize the total pairwise match
+percentage (the /api/recommend composite): greedy seeding, hardest-to-place
+students first, then local swaps between groups. Group sizes follow each
+student's groupPreferences.groupSize, capped at GROUP_MAX_MEMBERS.
+"""
+import argparse
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+from compat_graph import features, score_block, GRAPH_BLOCK_ELEMENTS
+from schedule_grid import cells, mask_schedule, DAY_SHIFT, DAYS, SLOTS
+
+GROUP_MIN_SIZE = int(os.getenv('GROUP_MIN_SIZE', '2'))
+GROUP_MAX_MEMBERS = int(os.getenv('GROUP_MAX_MEMBERS', '6'))  # StudyGroup.max_members default
+GROUP_DEFAULT_SIZE = int(os.getenv('GROUP_DEFAULT_SIZE', '4'))  # for profiles without a groupSize
+GROUP_MAX_COHORT = int(os.getenv('GROUP_MAX_COHORT', '4000'))  # larger cohorts are formed in slices
+GROUP_SWAP_PASSES = int(os.getenv('GROUP_SWAP_PASSES', '3'))
+# Match-percentage points a placement loses per member of difference from the preferred size
+SIZE_PENALTY = 10
+SWAP_NEIGHBOURS = 10  # best matches of each student considered for swaps
+
+
+def cohort_matrix(arrays: dict, rows) -> np.ndarray:
+    """Match percentages between every pair of ``rows`` (ScoringEngine rows), diagonal 0"""
+    data = features({name: value[rows] for name, value in arrays.items()})
+    size = len(rows)
+    matrix = np.zeros((size, size), dtype=np.float32)
+    block = max(1, min(size, GRAPH_BLOCK_ELEMENTS // max(size, 1)))
+    for start in range(0, size, block):
+        stop = min(start + block, size)
+        matrix[start:stop] = score_block(data, start, stop)['match_percentage']
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+
+def _penalty(preferred, capacity):
+    return SIZE_PENALTY * np.abs(preferred - capacity)
+
+
+def form_groups(matrix: np.ndarray, preferred, max_members: int = GROUP_MAX_MEMBERS,
+                min_size: int = GROUP_MIN_SIZE, passes: int = GROUP_SWAP_PASSES) -> list:
+    """Partition ``range(len(matrix))`` into groups; returns lists of indexes, ungroupable ones left out.
+
+    Seeding: the student whose best possible partner is weakest opens the
+    next group, sized by their preference, and the candidate adding the
+    most compatibility (less a penalty for a different size preference)
+    joins until the group is full. Students left over once fewer than
+    ``min_size`` remain join the group they fit best if it has room.
+    Swaps: for each student and their best matches in other groups, a
+    swap is applied whenever it raises the total within-group score.
+    """
+    size = len(matrix)
+    preferred = np.clip(np.asarray(preferred, dtype=np.float32), min_size, max_members)
+    unassigned = np.ones(size, dtype=bool)
+    groups = []
+    # Hardest to place first: their few good partners are still free
+    for seed in np.argsort(matrix.max(axis=1, initial=0), kind='stable'):
+        if not unassigned[seed] or unassigned.sum() < min_size:
+            continue
+        capacity = int(preferred[seed])
+        unassigned[seed] = False
+        members = [seed]
+        gain = matrix[seed].copy()
+        penalty = _penalty(preferred, capacity)
+        while len(members) < capacity and unassigned.any():
+            candidate = int(np.argmax(np.where(unassigned, gain - penalty, -np.inf)))
+            unassigned[candidate] = False
+            members.append(candidate)
+            gain += matrix[candidate]
+        groups.append(members)
+
+    for student in np.flatnonzero(unassigned):
+        open_groups = [g for g in groups if len(g) < max_members]
+        if open_groups:
+            max(open_groups, key=lambda g: matrix[student, g].sum()).append(int(student))
+
+    capacities = [len(group) for group in groups]
+    group_of = np.full(size, -1)
+    for g, group in enumerate(groups):
+        group_of[group] = g
+    neighbours = np.argsort(-matrix, axis=1, kind='stable')[:, :SWAP_NEIGHBOURS]
+    for _ in range(passes):
+        swaps = 0
+        for a in range(size):
+            for b in neighbours[a]:
+                ga, gb = group_of[a], group_of[b]
+                if ga < 0 or gb < 0 or ga == gb:
+                    continue
+                A, B = groups[ga], groups[gb]
+                # Score of b replacing a in A plus a replacing b in B, minus the current score
+                delta = (matrix[b, A].sum() - matrix[b, a] - matrix[a, A].sum() +
+                         matrix[a, B].sum() - matrix[a, b] - matrix[b, B].sum())
+                delta -= (_penalty(preferred[a], capacities[gb]) + _penalty(preferred[b], capacities[ga]) -
+                          _penalty(preferred[a], capacities[ga]) - _penalty(preferred[b], capacities[gb]))
+                if delta > 0:
+                    A[A.index(a)], B[B.index(b)] = int(b), int(a)
+                    group_of[a], group_of[b] = gb, ga
+                    swaps += 1
+                    break
+        if not swaps:
+            break
+    return groups
+
+
+def group_score(matrix: np.ndarray, groups) -> float:
+    """Mean match percentage over all pairs that share a group"""
+    pairs = sum(len(group) * (len(group) - 1) // 2 for group in groups)
+    total = sum(matrix[np.ix_(group, group)].sum() / 2 for group in groups)
+    return float(total / pairs) if pairs else 0.0
+
+
+def load_cohorts(by: str = 'major', university=None, include_grouped: bool = False) -> dict:
+    """{cohort key: [(user id, name, major, preferred group size)]} of the students to group"""
+    from sqlalchemy import select
+    from database import db_session
+    from models import GroupMember, User
+    statement = select(User.id, User.name, User.university, User.major, User.subjects, User.group_preferences)
+    if university is not None:
+        statement = statement.where(User.university == university)
+    if not include_grouped:
+        statement = statement.where(User.id.not_in(
+            select(GroupMember.user_id).where(GroupMember.status == 'active')))
+    cohorts = {}
+    for user_id, name, user_university, major, subjects, preferences in db_session.execute(statement):
+        if by == 'subject':
+            if not subjects:
+                continue
+            key = (user_university, subjects[0])
+        else:
+            key = (user_university, major)
+        try:
+            preferred = int((preferences or {}).get('groupSize') or GROUP_DEFAULT_SIZE)
+        except (TypeError, ValueError):
+            preferred = GROUP_DEFAULT_SIZE
+        cohorts.setdefault(key, []).append((user_id, name, major, preferred))
+    db_session.remove()
+    return cohorts
+
+
+def plan_groups(matcher, cohorts: dict, by: str = 'major', max_members: int = GROUP_MAX_MEMBERS) -> list:
+    """StudyGroup-shaped dicts (with a ``members`` list) for every cohort"""
+    state = matcher.state
+    arrays = state.scoring.export_arrays()
+    planned = []
+    numbers = Counter()  # groups titled per label so far
+    for (_, label), students in sorted(cohorts.items(), key=lambda item: str(item[0])):
+        resident = [(state.scoring.rows_for(student[0]), student) for student in students]
+        resident = [(rows[0], student) for rows, student in resident if rows]
+        label = label or 'General'
+        for start in range(0, len(resident), GROUP_MAX_COHORT):
+            part = resident[start:start + GROUP_MAX_COHORT]
+            if len(part) < GROUP_MIN_SIZE:
+                continue
+            rows = np.array([row for row, _ in part], dtype=np.int64)
+            matrix = cohort_matrix(arrays, rows)
+            for group in form_groups(matrix, [student[3] for _, student in part], max_members):
+                records = [state.students[rows[i]] for i in group]
+                numbers[label] += 1
+                planned.append(_group_dict(matcher, label if by == 'subject' else None,
+                                           f"{label} Study Group {numbers[label]}", records,
+                                           matrix[np.ix_(group, group)], [part[i][1] for i in group],
+                                           max_members))
+    return planned
+
+
+def _group_dict(matcher, subject, title, records, matrix, students, max_members) -> dict:
+    if subject is None:
+        subjects = Counter(subject for record in records for subject in record.subjects)
+        subject = subjects.most_common(1)[0][0] if subjects else None
+    # Cells free for most members, so the suggested time suits the majority
+    counts = Counter(cell for record in records for cell in cells(record.schedule_mask))
+    common = sum(1 << cell for cell, count in counts.items() if count * 2 > len(records))
+    day_cells = (1 << len(SLOTS)) - 1
+    common |= sum(1 << (DAY_SHIFT + day) for day in range(len(DAYS)) if common >> (day * len(SLOTS)) & day_cells)
+    # The member with the highest total compatibility with the others leads
+    leader = students[int(np.argmax(matrix.sum(axis=1)))]
+    return {
+        'title': title,
+        'subject': subject or 'General',
+        'description': f"Formed from {len(students)} compatible students "
+                       f"(average match {group_score(matrix, [list(range(len(students)))]):.0f}%)",
+        'schedule': matcher.format_schedule(mask_schedule(common)),
+        'location': 'Campus Study Areas',
+        'maxMembers': max(max_members, len(students)),
+        'leaderId': leader[0],
+        'leader': leader[1],
+        'members': students
+    }
+
+
+def save_groups(planned: list, regroup: bool = False) -> int:
+    """Insert StudyGroup and GroupMember rows (status 'active') for ``planned``; returns the group count.
+
+    With ``regroup`` the placed students' existing active memberships are
+    archived in the same transaction, so nobody ends up active in two
+    groups, and the member counts of the groups they left are recomputed.
+    """
+    from sqlalchemy import func, insert, select, update
+    from sqlalchemy.orm import Session
+    from database import engine
+    from models import GroupMember, StudyGroup
+    stamp = f"{time.time():.3f}"
+    with Session(engine) as session:
+        group_rows, member_rows = [], []
+        for i, group in enumerate(planned):
+            group['id'] = f"group_{stamp}_{i}"
+            group_rows.append({
+                'id': group['id'],
+                'title': group['title'],
+                'subject': group['subject'],
+                'description': group['description'],
+                'schedule': group['schedule'],
+                'location': group['location'],
+                'max_members': group['maxMembers'],
+                'current_members': len(group['members']),
+                'leader_id': group['leaderId'],
+                'leader_name': group['leader']
+            })
+            member_rows.extend({
+                'group_id': group['id'],
+                'user_id': user_id,
+                'user_name': name,
+                'user_major': major,
+                'role': 'leader' if user_id == group['leaderId'] else 'member',
+                'status': 'active'
+            } for user_id, name, major, _ in group['members'])
+        if not group_rows:
+            return 0
+        if regroup:
+            user_ids = [member['user_id'] for member in member_rows]
+            active = (GroupMember.user_id.in_(user_ids), GroupMember.status == 'active')
+            left = session.scalars(select(GroupMember.group_id).where(*active).distinct()).all()
+            session.execute(update(GroupMember).where(*active).values(status='archived'))
+            remaining = (select(func.count(GroupMember.id))
+                         .where(GroupMember.group_id == StudyGroup.id, GroupMember.status == 'active')
+                         .scalar_subquery())
+            session.execute(update(StudyGroup).where(StudyGroup.id.in_(left)).values(current_members=remaining))
+        session.execute(insert(StudyGroup), group_rows)
+        session.execute(insert(GroupMember), member_rows)
+        session.commit()
+    return len(planned)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--by', choices=['major', 'subject'], default='major')
+    parser.add_argument('--university')
+    parser.add_argument('--max-members', type=int, default=GROUP_MAX_MEMBERS)
+    parser.add_argument('--include-grouped', action='store_true',
+                        help='also regroup students already in a group (their current memberships are archived)')
+    parser.add_argument('--dry-run', action='store_true', help='print the groups without writing them')
+    args = parser.parse_args()
+
+    # Every student is loaded (embeddings come from the database) before scoring
+    os.environ.setdefault('STUDYSYNC_WARM_START', '1')
+    os.environ.setdefault('STUDYSYNC_PRELOAD_MODEL', '0')
+    import app
+
+    started = time.perf_counter()
+    cohorts = load_cohorts(args.by, args.university, args.include_grouped)
+    planned = plan_groups(app.matcher, cohorts, args.by, args.max_members)
+    if args.dry_run:
+        for group in planned:
+            print(f"{group['title']} ({group['schedule']}): {', '.join(m[1] for m in group['members'])}")
+    else:
+        save_groups(planned, regroup=args.include_grouped)
+    students = sum(len(group['members']) for group in planned)
+    print({'cohorts': len(cohorts), 'groups': len(planned), 'students_grouped': students,
+           'students_considered': sum(len(students) for students in cohorts.values()),
+           'seconds': round(time.perf_counter() - started, 2), 'written': not args.dry_run})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# group_index.py
+import threading
+from collections import Counter
+
+import numpy as np
+
+from embedding_cache import normalize_rows
+from lexical_index import LexicalIndex
+from schedule_grid import cells, mask_schedule, schedule_mask, DAY_SHIFT, DAYS
+from scoring import ScoringEngine, MATCH_THRESHOLD, DEFAULT_PERFORMANCE
+
+
+class _Contribution:
+    """What one member added to their group's aggregate, so leaving removes exactly that"""
+
+    __slots__ = ('subjects', 'cells', 'days', 'style_vector', 'performance')
+
+    def __init__(self, profile, style_vector):
+        mask = schedule_mask(profile.get('schedule'))
+        self.subjects = set(profile.get('subjects', []) or [])
+        self.cells = cells(mask)
+        self.days = [day for day in range(len(DAYS)) if mask >> (DAY_SHIFT + day) & 1]
+        self.style_vector = None if style_vector is None else np.asarray(style_vector, dtype=np.float32)
+        self.performance = profile.get('performanceLevel', DEFAULT_PERFORMANCE)
+
+
+class _Aggregate:
+    """Running member histograms and sums of one group"""
+
+    def __init__(self):
+        self.members = {}
+        self.subjects = Counter()
+        self.cells = Counter()
+        self.days = Counter()
+        self.style_sum = None
+        self.style_count = 0
+        self.performance_sum = 0
+
+    def apply(self, contribution, sign: int):
+        for subject in contribution.subjects:
+            self.subjects[subject] += sign
+        for cell in contribution.cells:
+            self.cells[cell] += sign
+        for day in contribution.days:
+            self.days[day] += sign
+        self.subjects, self.cells, self.days = +self.subjects, +self.cells, +self.days  # drop zero counts
+        if contribution.style_vector is not None:
+            if self.style_sum is None:
+                self.style_sum = np.zeros(len(contribution.style_vector), dtype=np.float64)
+            self.style_sum += sign * contribution.style_vector
+            self.style_count += sign
+        self.performance_sum += sign * contribution.performance
+
+    def profile(self) -> dict:
+        """The group as a scoring profile: union of subjects and schedule cells, mean performance"""
+        mask = sum(1 << cell for cell in self.cells) | sum(1 << (DAY_SHIFT + day) for day in self.days)
+        size = len(self.members)
+        return {
+            'subjects': list(self.subjects),
+            'schedule': mask_schedule(mask),
+            'performanceLevel': self.performance_sum / size if size else DEFAULT_PERFORMANCE
+        }
+
+    def centroid(self):
+        """Normalized mean learning-style embedding of the members, or None"""
+        if not self.style_count:
+            return None
+        return normalize_rows(self.style_sum)
+
+
+class GroupIndex:
+    """Study groups scored as aggregate profiles.
+
+    Each group keeps member histograms of subjects, schedule grid cells and
+    days plus sums of learning-style embeddings and performance levels.
+    Joining or leaving updates those in O(member features) and rewrites the
+    group's single row in a ScoringEngine, where the group's profile is the
+    union of its members' subjects and slots, the centroid of their styles
+    and their mean performance. Ranking G groups is then one vectorized
+    pass over G rows, independent of how many members they have.
+    """
+
+    def __init__(self):
+        self.engine = ScoringEngine()
+        self.groups = []  # row -> group info dict
+        self.rows = {}  # group id -> row
+        self.member_groups = {}  # user id -> set of group ids
+        self.lexical = LexicalIndex()  # BM25 over title, subject and description, one row per group
+        self.version = 0  # incremented on every change to a group or its members
+        self._aggregates = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.groups)
+
+    def upsert_group(self, group: dict) -> int:
+        """Add a group (StudyGroup.to_dict() shape) or update its details; returns its row"""
+        with self._lock:
+            row = self.rows.get(group['id'])
+            if row is None:
+                row = len(self.groups)
+                self.groups.append({})
+                self._aggregates.append(_Aggregate())
+                self.rows[group['id']] = row
+                self.engine.add(self._aggregates[row].profile())
+            # Stored again, so a group removed earlier (e.g. by a stale sync) is live again
+            self.groups[row].pop('deleted', None)
+            self.groups[row].update(group)
+            # The member count always comes from the aggregate, not the stored column
+            self.groups[row]['currentMembers'] = len(self._aggregates[row].members)
+            details = self.groups[row]
+            if not details.get('deleted'):
+                text = ' '.join(str(details.get(key) or '') for key in ('title', 'subject', 'description'))
+                self.lexical.upsert(row, text, [details.get('title'), details.get('subject')])
+            self.version += 1
+            return row
+
+    def join(self, group_id, profile: dict, style_vector=None):
+        """Add ``profile`` to the aggregate of ``group_id`` (re-joining replaces the old contribution)"""
+        with self._lock:
+            row = self.rows[group_id]
+            aggregate = self._aggregates[row]
+            old = aggregate.members.pop(profile['id'], None)
+            if old is not None:
+                aggregate.apply(old, -1)
+            contribution = _Contribution(profile, style_vector)
+            aggregate.members[profile['id']] = contribution
+            aggregate.apply(contribution, 1)
+            self.member_groups.setdefault(profile['id'], set()).add(group_id)
+            self._refresh(row)
+
+    def member_ids(self, group_id) -> set:
+        """Ids of the members in the aggregate of ``group_id``"""
+        with self._lock:
+            row = self.rows.get(group_id)
+            return set() if row is None else set(self._aggregates[row].members)
+
+    def leave(self, group_id, user_id):
+        """Remove ``user_id`` from the aggregate of ``group_id``"""
+        with self._lock:
+            row = self.rows.get(group_id)
+            if row is None:
+                return
+            aggregate = self._aggregates[row]
+            contribution = aggregate.members.pop(user_id, None)
+            if contribution is None:
+                return
+            aggregate.apply(contribution, -1)
+            self.member_groups.get(user_id, set()).discard(group_id)
+            self._refresh(row)
+
+    def remove_group(self, group_id):
+        """Hide a deleted group; its row is kept but can no longer match"""
+        with self._lock:
+            row = self.rows.get(group_id)
+            if row is None:
+                return
+            for user_id in self._aggregates[row].members:
+                self.member_groups.get(user_id, set()).discard(group_id)
+            self._aggregates[row] = _Aggregate()
+            self.groups[row]['deleted'] = True
+            self.lexical.remove(row)
+            self._refresh(row)
+
+    def _refresh(self, row: int):
+        aggregate = self._aggregates[row]
+        self.groups[row]['currentMembers'] = len(aggregate.members)
+        self.engine.update(row, aggregate.profile(), aggregate.centroid())
+        self.version += 1
+
+    def schedule_of(self, row: int) -> dict:
+        return self._aggregates[row].profile()['schedule']
+
+    def match(self, target, style_vector=None, threshold: int = MATCH_THRESHOLD) -> dict:
+        """Score every open group ``target`` is not already in; same arrays as ScoringEngine.match"""
+        with self._lock:
+            scores = self.engine.match(target, style_vector, threshold)
+            own = self.member_groups.get(target.get('id'), set())
+            keep = np.array([
+                group['id'] not in own and not group.get('deleted')
+                and group['currentMembers'] < (group.get('maxMembers') or 6)
+                for group in (self.groups[row] for row in scores['rows'])
+            ], dtype=bool)
+        return {key: value[keep] if isinstance(value, np.ndarray) else value for key, value in scores.items()}
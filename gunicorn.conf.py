@@ -0,0 +1,26 @@
+# gunicorn.conf.py
+import gc
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+# gthread workers only; under the ASGI entry point asgi.WSGI_THREADS reads the same variable
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+# Import app.py (and load the model) once in the master; workers inherit
+# the weights copy-on-write instead of each loading their own copy
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # Keep the objects loaded so far out of the cyclic GC, so collections in
+    # the workers do not touch (and un-share) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Threads do not survive fork(): warm the model up (and start torch's
+    # thread pools) inside each worker rather than in the master
+    from app import model
+    model.start_background()
@@ -0,0 +1,274 @@
+# lexical_index.py
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from scoring import text_key
+from vector_index import top_k_rows
+
+# BM25 parameters: term-frequency saturation and document-length normalization
+BM25_K1 = float(os.getenv('BM25_K1', '1.2'))
+BM25_B = float(os.getenv('BM25_B', '0.75'))
+
+# Letters and digits of any script; trailing '+' and '#' stay so 'C++', 'C#' and 'C' differ
+_TOKEN = re.compile(r'[^\W_]+[+#]*')
+_STOPWORDS = frozenset(('a', 'an', 'and', 'for', 'in', 'of', 'on', 'or', 'the', 'to', 'with'))
+
+
+def terms(text) -> list:
+    """Case-folded words of ``text``, other punctuation dropped ('C++ / Java' -> ['c++', 'java'])"""
+    return _TOKEN.findall(str(text or '').casefold())
+
+
+def tokenize(text) -> list:
+    """Indexed terms of ``text``: its ``terms`` without stopwords"""
+    return [term for term in terms(text) if term not in _STOPWORDS]
+
+
+def phrase_key(text) -> str:
+    """Normalized form of a whole field value ('Organic  chemistry' -> 'organic chemistry')"""
+    return ' '.join(terms(text))
+
+
+class LexicalIndex:
+    """BM25 inverted index over one text per row.
+
+    Rows line up with the other per-row structures (students, group rows);
+    ``upsert`` appends when ``row == size`` and otherwise replaces the row's
+    postings, so the index is maintained incrementally. Besides terms, each
+    row can register whole field values (a subject, a major, a group title)
+    as phrases: a query that is exactly one of them is a keyword lookup.
+
+    ``export`` flattens the index into CSR arrays and ``from_arrays`` serves
+    them again (e.g. memory-mapped from a shared snapshot) without building
+    any Python objects per row. Those arrays are never modified: a row
+    upserted afterwards is kept in dicts and its array postings are masked.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B, base=None):
+        self.k1 = k1
+        self.b = b
+        self.version = 0
+        self._base = base  # arrays of export(), or None
+        self._base_size = len(base['row_phrase_indptr']) - 1 if base is not None else 0
+        self.size = self._base_size
+        self._postings = {}  # term -> {row: term frequency}, rows upserted here
+        self._terms = {}  # row -> Counter of its terms, rows upserted here
+        # row -> number of terms (spare rows past size)
+        self._lengths = base['lengths'] if base is not None else np.zeros(64, dtype=np.float32)
+        self._total_length = int(self._lengths[:self.size].sum())
+        self._replaced = np.zeros(len(self._lengths), dtype=bool)  # base rows upserted since
+        self._phrases = Counter()  # phrase key -> rows registering it, on top of the base counts
+        self._row_phrases = {}  # row -> phrase keys, rows upserted here
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    @classmethod
+    def build(cls, entries):
+        """Index of ``(text, phrases)`` entries, one per row in row order"""
+        index = cls()
+        for row, (text, phrases) in enumerate(entries):
+            index.upsert(row, text, phrases)
+        return index
+
+    @classmethod
+    def from_arrays(cls, arrays: dict):
+        """Index served from the arrays of ``export``; ``lengths`` must be writable (copy-on-write)"""
+        return cls(base=arrays)
+
+    def upsert(self, row: int, text, phrases=()) -> int:
+        """Index ``text`` as ``row`` (``row == size`` appends) and return the row"""
+        terms = Counter(tokenize(text))
+        phrases = tuple(dict.fromkeys(text_key(key) for key in map(phrase_key, phrases) if key))
+        with self._lock:
+            if row > self.size:
+                raise IndexError(f"row {row} is past the end of the index ({self.size} rows)")
+            if row == self.size:
+                if row == len(self._lengths):
+                    self._lengths = np.concatenate([self._lengths, np.zeros_like(self._lengths)])
+                    self._replaced = np.concatenate([self._replaced, np.zeros_like(self._replaced)])
+                self.size += 1
+            if row in self._terms:
+                for term in self._terms[row]:
+                    postings = self._postings[term]
+                    del postings[row]
+                    if not postings:
+                        del self._postings[term]
+                for key in self._row_phrases[row]:
+                    self._discount(key)
+            elif row < self._base_size and not self._replaced[row]:
+                self._replaced[row] = True
+                indptr = self._base['row_phrase_indptr']
+                for key in self._base['row_phrase_keys'][indptr[row]:indptr[row + 1]].tolist():
+                    self._discount(key)
+            for term, count in terms.items():
+                self._postings.setdefault(term, {})[row] = count
+            length = sum(terms.values())
+            self._total_length += length - int(self._lengths[row])
+            self._terms[row] = terms
+            self._lengths[row] = length
+            self._phrases.update(phrases)
+            self._row_phrases[row] = phrases
+            self.version += 1
+        return row
+
+    def remove(self, row: int):
+        """Empty ``row`` so it no longer matches; the row itself is kept"""
+        self.upsert(row, '')
+
+    def _discount(self, key):
+        self._phrases[key] -= 1
+        if not self._phrases[key]:
+            del self._phrases[key]
+
+    @staticmethod
+    def _find(keys, key):
+        """Position of ``key`` in the sorted array ``keys``, or None"""
+        position = int(np.searchsorted(keys, key))
+        return position if position < len(keys) and keys[position] == key else None
+
+    def _term_postings(self, term):
+        """``(rows, frequencies)`` of every row containing ``term``"""
+        rows, frequencies = [], []
+        position = self._find(self._base['term_keys'], text_key(term)) if self._base is not None else None
+        if position is not None:
+            start, stop = self._base['term_indptr'][position:position + 2]
+            base_rows = self._base['posting_rows'][start:stop]
+            keep = ~self._replaced[base_rows]
+            rows.append(base_rows[keep])
+            frequencies.append(self._base['posting_counts'][start:stop][keep])
+        postings = self._postings.get(term)
+        if postings:
+            rows.append(np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)))
+            frequencies.append(np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return np.concatenate(rows), np.concatenate(frequencies).astype(np.float32)
+
+    def is_phrase(self, query) -> bool:
+        """Whether ``query`` is exactly a registered field value of some row"""
+        key = phrase_key(query)
+        if not key:
+            return False
+        key = text_key(key)
+        count = self._phrases.get(key, 0)
+        position = self._find(self._base['phrase_keys'], key) if self._base is not None else None
+        if position is not None:
+            count += int(self._base['phrase_counts'][position])
+        return count > 0
+
+    def scores(self, query):
+        """``(rows, scores)`` of every row containing a query term, in row order"""
+        terms = Counter(tokenize(query))
+        matched_rows, weights = [], []
+        with self._lock:
+            average_length = self._total_length / self.size if self.size else 0.0
+            for term, query_count in terms.items():
+                rows, frequencies = self._term_postings(term)
+                if not len(rows):
+                    continue
+                idf = math.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[rows] / (average_length or 1.0))
+                matched_rows.append(rows)
+                weights.append(query_count * idf * frequencies * (self.k1 + 1) / (frequencies + norm))
+        if not matched_rows:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        # Sum the per-term weights of rows matching several terms
+        rows, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+        return rows, np.bincount(inverse, weights=np.concatenate(weights)).astype(np.float32)
+
+    def ideal_score(self, query) -> float:
+        """BM25 score of a document made of exactly the query terms, each once"""
+        terms = Counter(tokenize(query))
+        with self._lock:
+            average_length = self._total_length / self.size if self.size else 0.0
+            norm = self.k1 * (1 - self.b + self.b * sum(terms.values()) / (average_length or 1.0))
+            return sum(
+                count * math.log(1 + (self.size - df + 0.5) / (df + 0.5)) * (self.k1 + 1) / (1 + norm)
+                for count, df in ((count, len(self._term_postings(term)[0])) for term, count in terms.items())
+            )
+
+    def search(self, query, top_k: int):
+        """``(rows, scores)`` of the ``top_k`` best BM25 matches, best first.
+
+        Scores are relative to ``ideal_score`` and capped at 1, so they are
+        comparable between indexes and queries: about the share of the query
+        a row covers, weighted by how rare each term is.
+        """
+        rows, scores = self.scores(query)
+        if not len(rows):
+            return rows, scores
+        rows, scores = top_k_rows(scores, top_k, rows)
+        return rows, np.minimum(scores / self.ideal_score(query), 1.0).astype(np.float32)
+
+    def export(self) -> dict:
+        """The whole index as CSR arrays: postings by sorted term key and phrase keys by row"""
+        with self._lock:
+            postings = {}  # term key -> [(rows, frequencies)]
+            base = self._base
+            if base is not None:
+                for position, key in enumerate(base['term_keys'].tolist()):
+                    start, stop = base['term_indptr'][position:position + 2]
+                    rows = base['posting_rows'][start:stop]
+                    keep = ~self._replaced[rows]
+                    if keep.any():
+                        postings[key] = [(rows[keep], base['posting_counts'][start:stop][keep])]
+            for term, rows in self._postings.items():
+                postings.setdefault(text_key(term), []).append((
+                    np.fromiter(rows.keys(), dtype=np.int64, count=len(rows)),
+                    np.fromiter(rows.values(), dtype=np.float32, count=len(rows))))
+            term_keys = np.array(sorted(postings), dtype=np.int64)
+            parts = [postings[key] for key in term_keys.tolist()]
+            term_indptr = np.zeros(len(term_keys) + 1, dtype=np.int64)
+            np.cumsum(np.array([sum(len(rows) for rows, _ in part) for part in parts], dtype=np.int64), out=term_indptr[1:])
+            posting_rows = np.concatenate([rows for part in parts for rows, _ in part] or [np.zeros(0, np.int64)])
+            posting_counts = np.concatenate([counts for part in parts for _, counts in part] or
+                                            [np.zeros(0, np.float32)])
+
+            # Phrase keys of each row: the base rows still current, then the rows upserted here
+            phrase_rows, phrase_keys = [np.zeros(0, np.int64)], [np.zeros(0, np.int64)]
+            if base is not None:
+                rows = np.repeat(np.arange(self._base_size), np.diff(base['row_phrase_indptr']))
+                keep = ~self._replaced[rows]
+                phrase_rows.append(rows[keep])
+                phrase_keys.append(np.asarray(base['row_phrase_keys'])[keep])
+            local = [(row, key) for row, keys in self._row_phrases.items() for key in keys]
+            phrase_rows.append(np.array([row for row, _ in local], dtype=np.int64))
+            phrase_keys.append(np.array([key for _, key in local], dtype=np.int64))
+            phrase_rows, phrase_keys = np.concatenate(phrase_rows), np.concatenate(phrase_keys)
+            order = np.argsort(phrase_rows, kind='stable')
+            row_phrase_indptr = np.zeros(self.size + 1, dtype=np.int64)
+            np.cumsum(np.bincount(phrase_rows, minlength=self.size), out=row_phrase_indptr[1:])
+            unique_phrases, phrase_counts = np.unique(phrase_keys, return_counts=True)
+            return {
+                'term_keys': term_keys,
+                'term_indptr': term_indptr,
+                'posting_rows': posting_rows.astype(np.int64),
+                'posting_counts': posting_counts.astype(np.float32),
+                'phrase_keys': unique_phrases.astype(np.int64),
+                'phrase_counts': phrase_counts.astype(np.int64),
+                'row_phrase_indptr': row_phrase_indptr,
+                'row_phrase_keys': phrase_keys[order],
+                'lengths': np.array(self._lengths[:self.size], dtype=np.float32)
+            }
+
+    def stats(self) -> dict:
+        terms = len(self._postings)
+        phrases = len(self._phrases)
+        if self._base is not None:
+            terms += len(self._base['term_keys']) - sum(
+                1 for term in self._postings if self._find(self._base['term_keys'], text_key(term)) is not None)
+            phrases += len(self._base['phrase_keys']) - sum(
+                1 for key in self._phrases if self._find(self._base['phrase_keys'], key) is not None)
+        return {
+            'rows': self.size,
+            'terms': terms,
+            'phrases': phrases,
+            'average_length': round(self._total_length / self.size, 2) if self.size else 0.0
+        }
@@ -0,0 +1,172 @@
+# metrics.py
+import os
+import threading
+import time
+
+# Instrumentation configuration
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds)"""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'sum_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.quantile(0.5),
+            'p90_ms': self.quantile(0.9),
+            'p99_ms': self.quantile(0.99),
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ('inf',), self.counts)}
+        }
+
+
+class _Timer:
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Metrics:
+    """Process-wide timing histograms and counters.
+
+    ``timer`` and ``increment`` also add to the breakdown of the request
+    running on the current thread (between ``begin_request`` and
+    ``end_request``). When disabled every call returns immediately.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def timer(self, name: str):
+        """Context manager timing a block under ``name``"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def observe(self, name: str, value_ms: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value_ms)
+        breakdown = getattr(self._local, 'breakdown', None)
+        if breakdown is not None:
+            breakdown[name] = breakdown.get(name, 0.0) + value_ms
+
+    def increment(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+        counts = getattr(self._local, 'counts', None)
+        if counts is not None:
+            counts[name] = counts.get(name, 0) + value
+
+    def begin_request(self):
+        if not self.enabled:
+            return
+        self._local.breakdown = {}
+        self._local.counts = {}
+        self._local.start = time.perf_counter()
+
+    def end_request(self, name: str):
+        """Record the request's total time under ``name`` and return its breakdown (or None)"""
+        if not self.enabled or getattr(self._local, 'breakdown', None) is None:
+            return None
+        total = (time.perf_counter() - self._local.start) * 1000
+        breakdown, counts = self._local.breakdown, self._local.counts
+        self._local.breakdown = self._local.counts = None
+        self.observe(name, total)
+        return {'total_ms': total, 'timings_ms': breakdown, 'counts': counts}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'histograms': {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())},
+                'counters': dict(sorted(self._counters.items()))
+            }
+
+
+def server_timing(breakdown) -> str:
+    """Format a request breakdown as a Server-Timing header value"""
+    parts = [f"{name.replace('.', '-')};dur={value:.2f}" for name, value in breakdown['timings_ms'].items()]
+    parts.append(f"total;dur={breakdown['total_ms']:.2f}")
+    return ', '.join(parts)
+
+
+def instrument_engine(engine):
+    """Time every SQL statement executed through ``engine`` as ``db``"""
+    if not metrics.enabled:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        metrics.observe('db', (time.perf_counter() - conn.info['query_start'].pop()) * 1000)
+
+
+metrics = Metrics()
@@ -0,0 +1,121 @@
+# model_loader.py
+import os
+import threading
+import time
+
+# Model startup configuration
+PRELOAD_MODEL = os.getenv('STUDYSYNC_PRELOAD_MODEL', '1') == '1'  # 0 = load in the background on first request
+MODEL_QUANTIZE = os.getenv('MODEL_QUANTIZE', 'none')  # 'int8' = dynamic int8 quantization for CPU inference
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', '1') == '1'
+
+_WARMUP_TEXTS = [
+    'Computer Science Mathematics visual learner',
+    'Hands-on practice with peer discussions'
+]
+
+
+class ModelHolder:
+    """Loads the SentenceTransformer lazily and reports honest status.
+
+    ``status`` moves through not_loaded -> loading -> loaded -> warming_up
+    -> ready (or failed). ``encode`` blocks until the weights are loaded, so
+    callers never see a half-initialized model. Under gunicorn with
+    ``preload_app`` the master calls ``load`` once and every worker shares the
+    weights copy-on-write; warm-up then runs in each worker after the fork.
+    """
+
+    def __init__(self, model_name: str, quantize: str = MODEL_QUANTIZE, warm_up: bool = MODEL_WARMUP):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.warm_up_enabled = warm_up
+        self.status = 'not_loaded'
+        self.error = None
+        self.load_seconds = None
+        self.warm_up_seconds = None
+        self._model = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def variant(self) -> str:
+        """Name of the weights actually served: the model name, plus the quantization when one applies.
+
+        Quantized weights produce slightly different vectors, so stored
+        embeddings are keyed by this rather than by ``model_name``.
+        """
+        return f"{self.model_name}@{self.quantize}" if self.quantize == 'int8' else self.model_name
+
+    def load(self):
+        """Load the weights (once) and return the model"""
+        with self._lock:
+            if self._model is not None:
+                return self._model
+            self.status = 'loading'
+            start = time.perf_counter()
+            try:
+                # Imported here so importing app.py does not pull in torch
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(self.model_name)
+                if self.quantize == 'int8':
+                    model = self._quantize_int8(model)
+                elif self.quantize != 'none':
+                    print(f"Unknown MODEL_QUANTIZE '{self.quantize}', using the full-precision model")
+            except Exception as e:
+                self.status = 'failed'
+                self.error = str(e)
+                raise
+            self._model = model
+            self.load_seconds = time.perf_counter() - start
+            self.status = 'loaded'
+            print(f"Model {self.model_name} loaded in {self.load_seconds:.1f}s (quantize={self.quantize})")
+            return model
+
+    @staticmethod
+    def _quantize_int8(model):
+        import torch
+        # Linear layers dominate MiniLM inference time on CPU
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def warm_up(self):
+        """Run a first inference so the first real request does not pay for lazy initialization"""
+        model = self.load()
+        if not self.warm_up_enabled:
+            self.status = 'ready'
+            return
+        self.status = 'warming_up'
+        start = time.perf_counter()
+        model.encode(_WARMUP_TEXTS)
+        self.warm_up_seconds = time.perf_counter() - start
+        self.status = 'ready'
+
+    def start_background(self):
+        """Load and warm up in a background thread of this process (once per pid, safe after fork)"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._pid = os.getpid()
+            if self._model is not None and self.status == 'ready':
+                return
+            self._thread = threading.Thread(target=self._background, daemon=True)
+            self._thread.start()
+
+    def _background(self):
+        try:
+            self.warm_up()
+        except Exception as e:
+            print(f"Model loading failed: {e}")
+
+    def encode(self, sentences, **kwargs):
+        return self.load().encode(sentences, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            'name': self.model_name,
+            'status': self.status,
+            'quantize': self.quantize,
+            'variant': self.variant,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'warm_up_seconds': round(self.warm_up_seconds, 3) if self.warm_up_seconds is not None else None,
+            'error': self.error
+        }
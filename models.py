@@ -1,7 +1,9 @@
 # models.py
-from sqlalchemy import Column, String, Integer, Text, Enum, TIMESTAMP, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, BigInteger, Float, Text, Enum, TIMESTAMP, ForeignKey, Index, JSON, LargeBinary
+from sqlalchemy.orm import validates
 from sqlalchemy.sql import func
 from database import Base
+import schedule_grid
 import json as json_lib
 
 class User(Base):
@@ -19,11 +21,17 @@ class User(Base):
     study_methods = Column(JSON)
     subjects = Column(JSON)
     schedule = Column(JSON)
+    schedule_mask = Column(BigInteger)  # schedule_grid bitmask, kept in sync with schedule
     performance_level = Column(Integer, default=3)
     group_preferences = Column(JSON)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     
+    @validates('schedule')
+    def _sync_schedule_mask(self, key, schedule):
+        self.schedule_mask = schedule_grid.schedule_mask(schedule)
+        return schedule
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -37,10 +45,36 @@ class User(Base):
             'studyMethods': self.study_methods or [],
             'subjects': self.subjects or [],
             'schedule': self.schedule or {},
+            # Rows written before the column existed have no mask yet
+            'scheduleMask': self.schedule_mask if self.schedule_mask is not None else schedule_grid.schedule_mask(self.schedule),
             'performanceLevel': self.performance_level,
             'groupPreferences': self.group_preferences or {}
         }
 
+class TextEmbedding(Base):
+    __tablename__ = 'text_embeddings'
+    
+    # Keyed like embedding_cache.EmbeddingCache, so any text is encoded once per model
+    model_name = Column(String(100), primary_key=True)
+    content_hash = Column(String(40), primary_key=True)
+    dim = Column(Integer, nullable=False)
+    vector = Column(LargeBinary, nullable=False)  # normalized float32 bytes
+    created_at = Column(TIMESTAMP, server_default=func.now())
+
+class CompatibilityEdge(Base):
+    __tablename__ = 'compatibility_edges'
+    
+    # Top-K neighbours per student from the last compat_graph run, best first
+    student_id = Column(String(50), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    neighbor_id = Column(String(50), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    match_percentage = Column(Integer, nullable=False)
+    subject = Column(Float, nullable=False)
+    schedule = Column(Float, nullable=False)
+    learning_style = Column(Float, nullable=False)
+    performance = Column(Float, nullable=False)
+    computed_at = Column(TIMESTAMP, nullable=False)  # database time the run started
+
 class StudyGroup(Base):
     __tablename__ = 'study_groups'
     
@@ -93,15 +127,20 @@ class GroupMember(Base):
             'joinedAt': self.joined_at.isoformat() if self.joined_at else None
         }
 
+# Allowed values of Message.type
+MESSAGE_TYPES = ('text', 'image', 'file', 'announcement')
+
 class Message(Base):
     __tablename__ = 'messages'
+    # Keyset pagination walks a group's messages by (timestamp, id)
+    __table_args__ = (Index('ix_messages_group_timestamp_id', 'group_id', 'timestamp', 'id'),)
     
     id = Column(String(50), primary_key=True)
     group_id = Column(String(50), ForeignKey('study_groups.id', ondelete='CASCADE'), nullable=False)
     sender_id = Column(String(50), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     sender_name = Column(String(100), nullable=False)
     message = Column(Text)
-    type = Column(Enum('text', 'image', 'file', 'announcement'), default='text')
+    type = Column(Enum(*MESSAGE_TYPES), default='text')
     image_uri = Column(Text)
     file_name = Column(String(255))
     timestamp = Column(TIMESTAMP, server_default=func.now())
@@ -121,6 +160,8 @@ class Message(Base):
 
 class MessageReaction(Base):
     __tablename__ = 'message_reactions'
+    # Reactions of a page of messages are loaded with one IN query
+    __table_args__ = (Index('ix_message_reactions_message_id', 'message_id'),)
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     message_id = Column(String(50), ForeignKey('messages.id', ondelete='CASCADE'), nullable=False)
@@ -0,0 +1,126 @@
+# profile_record.py
+import json
+import threading
+
+from schedule_grid import day_index, mask_schedule, schedule_mask, DAYS
+from scoring import text_key
+
+
+class Vocabulary:
+    """Interns strings into small integer ids"""
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.values)
+
+    def intern(self, value) -> int:
+        index = self.ids.get(value)
+        if index is None:
+            # Snapshot rows are decoded on request threads, so new ids are assigned under a lock
+            with self._lock:
+                index = self.ids.get(value)
+                if index is None:
+                    index = len(self.values)
+                    self.values.append(value)
+                    self.ids[value] = index
+        return index
+
+    def __getitem__(self, index: int):
+        return self.values[index]
+
+
+# Process-wide: snapshots store the strings, so ids never leave the process
+MAJORS = Vocabulary()
+SUBJECTS = Vocabulary()
+# Identical subject-id tuples and day orders are shared between records
+_SHARED = {}
+
+
+def _shared(value):
+    return _SHARED.setdefault(value, value)
+
+
+def profile_digest(profile) -> int:
+    """64-bit key of a full profile dict, to detect unchanged re-submissions"""
+    # scheduleMask is derived from schedule and only present once a profile was stored
+    profile = {key: value for key, value in profile.items() if key != 'scheduleMask'}
+    return text_key(json.dumps(profile, sort_keys=True, default=str))
+
+
+class ProfileRecord:
+    """What the matcher keeps per resident student.
+
+    Scoring features live in ScoringEngine; a record only holds what
+    response cards need (id, name, major, subjects, schedule) plus a digest
+    of the full profile. Majors and subjects are vocabulary ids, the
+    schedule is its schedule_grid mask plus the order the days were listed
+    in, and the full profile is read from the database when needed.
+    """
+
+    __slots__ = ('student_id', 'name', 'major_id', 'subject_ids', 'schedule_mask', 'day_order', 'digest')
+
+    # Profile keys readable through get()
+    _KEYS = {'id': 'student_id', 'name': 'name', 'major': 'major', 'subjects': 'subjects',
+             'schedule': 'schedule', 'scheduleMask': 'schedule_mask'}
+
+    def __init__(self, student_id, name, major_id, subject_ids, schedule_mask, day_order, digest):
+        self.student_id = student_id
+        self.name = name
+        self.major_id = major_id
+        self.subject_ids = _shared(tuple(subject_ids))
+        self.schedule_mask = schedule_mask
+        self.day_order = _shared(bytes(day_order))
+        self.digest = digest
+
+    @classmethod
+    def from_profile(cls, profile):
+        major = profile.get('major')
+        schedule = profile.get('schedule', {}) or {}
+        days = [day_index(day) for day in schedule]
+        return cls(
+            profile.get('id'),
+            profile.get('name'),
+            None if major is None else MAJORS.intern(major),
+            [SUBJECTS.intern(subject) for subject in profile.get('subjects', []) or []],
+            schedule_mask(schedule),
+            [day for day in dict.fromkeys(days) if day is not None],
+            profile_digest(profile)
+        )
+
+    @property
+    def major(self):
+        return None if self.major_id is None else MAJORS[self.major_id]
+
+    @property
+    def subjects(self) -> list:
+        return [SUBJECTS[index] for index in self.subject_ids]
+
+    @property
+    def schedule(self) -> dict:
+        """Canonical schedule dict, days in the order they were listed"""
+        grid = mask_schedule(self.schedule_mask)
+        return {DAYS[day]: grid[DAYS[day]] for day in self.day_order}
+
+    def matches(self, profile) -> bool:
+        """Whether ``profile`` is the full profile this record was built from"""
+        return self.digest == profile_digest(profile)
+
+    def get(self, key, default=None):
+        """Dict-style read of the kept fields, for code written against profile dicts"""
+        attribute = self._KEYS.get(key)
+        value = None if attribute is None else getattr(self, attribute)
+        return default if value is None else value
+
+    def to_json(self) -> list:
+        return [self.student_id, self.name, self.major, self.subjects, self.schedule_mask,
+                list(self.day_order), self.digest]
+
+    @classmethod
+    def from_json(cls, values):
+        student_id, name, major, subjects, mask, day_order, digest = values
+        return cls(student_id, name, None if major is None else MAJORS.intern(major),
+                   [SUBJECTS.intern(subject) for subject in subjects], mask, day_order, digest)
@@ -0,0 +1,207 @@
+# result_cache.py
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from embedding_cache import content_hash
+from schedule_grid import cells, schedule_mask
+
+# Recommendation cache configuration
+RECOMMENDATION_CACHE_SIZE = int(os.getenv('RECOMMENDATION_CACHE_SIZE', '10000'))  # 0 disables
+RECOMMENDATION_CACHE_TTL = float(os.getenv('RECOMMENDATION_CACHE_TTL', '300'))  # seconds
+
+# Search result cache configuration
+SEARCH_RESULT_CACHE_SIZE = int(os.getenv('SEARCH_RESULT_CACHE_SIZE', '1000'))  # 0 disables
+SEARCH_RESULT_TTL = float(os.getenv('SEARCH_RESULT_TTL', '30'))  # seconds
+
+
+def _features(profile):
+    """Subjects and free schedule cells of a profile: what decides who it can match"""
+    subjects = set(profile.get('subjects', []) or [])
+    return subjects, set(cells(schedule_mask(profile.get('schedule'))))
+
+
+class RecommendationCache:
+    """TTL + LRU cache of ranked matches keyed by the target profile's fingerprint.
+
+    A student can only match a target that shares a subject or a schedule cell
+    with them (see ScoringEngine.candidate_rows). Every stored profile change
+    therefore bumps a version counter for each subject and slot of the old
+    and the new profile, and an entry is only served while the counters of
+    the target's own subjects and slots are unchanged. Changes elsewhere in
+    the population leave the entry alone.
+    """
+
+    def __init__(self, max_entries: int = RECOMMENDATION_CACHE_SIZE, ttl_seconds: float = RECOMMENDATION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self.expired = 0
+        self.evictions = 0
+        self._epoch = 0
+        self._subject_versions = {}
+        self._slot_versions = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def fingerprint(target) -> str:
+        """Hash of every target field the ranking depends on"""
+        return content_hash(json.dumps({
+            'id': target.get('id'),
+            'subjects': sorted(set(target.get('subjects', []) or [])),
+            'schedule': schedule_mask(target.get('schedule')),
+            'learningStyle': target.get('learningStyle', ''),
+            'performanceLevel': target.get('performanceLevel')
+        }, sort_keys=True))
+
+    def tokens(self, target) -> tuple:
+        """Current versions of everything ``target``'s ranking depends on.
+
+        Take them before computing a result and pass them to ``put``, so a
+        change that lands meanwhile makes the stored entry stale.
+        """
+        subjects, slots = _features(target)
+        with self._lock:
+            return (
+                self._epoch,
+                tuple(sorted((s, self._subject_versions.get(s, 0)) for s in subjects)),
+                tuple(sorted((s, self._slot_versions.get(s, 0)) for s in slots))
+            )
+
+    def get(self, key: str, target):
+        """Return the cached value for ``key`` if it is still valid for ``target``"""
+        if not self.enabled:
+            return None
+        tokens = self.tokens(target)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created, entry_tokens, value = entry
+            if time.monotonic() - created > self.ttl:
+                self.expired += 1
+            elif entry_tokens != tokens:
+                self.invalidated += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, tokens: tuple, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), tokens, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *profiles):
+        """Record that ``profiles`` were added, changed or removed"""
+        with self._lock:
+            for profile in profiles:
+                subjects, slots = _features(profile)
+                for subject in subjects:
+                    self._subject_versions[subject] = self._subject_versions.get(subject, 0) + 1
+                for slot in slots:
+                    self._slot_versions[slot] = self._slot_versions.get(slot, 0) + 1
+
+    def clear(self):
+        """Drop every entry (e.g. after the whole population was replaced)"""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for monitoring"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'invalidated': self.invalidated,
+            'expired': self.expired,
+            'evictions': self.evictions
+        }
+
+
+class SearchResultCache:
+    """Short-lived LRU cache of final search results for repeated queries.
+
+    Entries are keyed by the normalized query and search mode and store the
+    index version they were ranked against (see
+    AIStudentMatcher.search_version). They are served only while that
+    version is unchanged and for at most ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = SEARCH_RESULT_CACHE_SIZE, ttl_seconds: float = SEARCH_RESULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version):
+        """Return the cached value for ``key`` if it was ranked against ``version`` within the TTL"""
+        if self.max_entries <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            created, entry_version, value = entry
+            if entry_version == version and time.monotonic() - created <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self.stale += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'stale': self.stale
+        }
@@ -0,0 +1,126 @@
+# schedule_grid.py
+"""Weekly availability as integer bitmasks.
+
+A schedule ({'Monday': ['Evening (5-9 PM)'], ...}) is normalized onto a
+fixed grid of 7 days x 4 time slots. Bit ``day * len(SLOTS) + slot`` is set
+for every free cell, and bit ``DAY_SHIFT + day`` for every day the student
+listed, even without slots: overlap is only counted on days both students
+listed, exactly like the original set-based calculate_schedule_overlap.
+"""
+import re
+
+import numpy as np
+
+DAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+SLOTS = ('Morning (8-12 PM)', 'Afternoon (12-5 PM)', 'Evening (5-9 PM)', 'Night (9 PM-12 AM)')
+CELLS = len(DAYS) * len(SLOTS)
+DAY_SHIFT = CELLS
+CELL_MASK = (1 << CELLS) - 1
+
+_DAY_PREFIXES = {day[:3].lower(): i for i, day in enumerate(DAYS)}
+_SLOT_KEYWORDS = (('morning', 0), ('afternoon', 1), ('evening', 2), ('night', 3))
+_HOUR = re.compile(r'(\d{1,2})(?::\d{2})?\s*(am|pm)?', re.IGNORECASE)
+
+# Day-presence bits (7 bits) -> mask of every cell on those days
+_DAY_CELLS = np.array([
+    sum(((1 << len(SLOTS)) - 1) << (day * len(SLOTS)) for day in range(len(DAYS)) if days >> day & 1)
+    for days in range(1 << len(DAYS))
+], dtype=np.uint64)
+
+
+def day_index(day):
+    """Grid index of a day name ('Monday', 'mon', 'MONDAY'), or None"""
+    return _DAY_PREFIXES.get(str(day).strip()[:3].lower())
+
+
+def slot_index(slot):
+    """Grid index of a free-form slot ('Evening (5-9 PM)', 'evening', '14:00'), or None"""
+    text = str(slot).lower()
+    for keyword, index in _SLOT_KEYWORDS:
+        if keyword in text:
+            return index
+    match = _HOUR.search(text)
+    if match is None:
+        return None
+    hour = int(match.group(1)) % 12 if match.group(2) else int(match.group(1))
+    if (match.group(2) or '').lower() == 'pm':
+        hour += 12
+    if hour < 12:
+        return 0
+    if hour < 17:
+        return 1
+    return 2 if hour < 21 else 3
+
+
+def schedule_mask(schedule) -> int:
+    """Bitmask of a schedule dict; unknown days and slots are dropped"""
+    mask = 0
+    for day, slots in (schedule or {}).items():
+        day = day_index(day)
+        if day is None:
+            continue
+        mask |= 1 << (DAY_SHIFT + day)
+        for slot in slots or []:
+            slot = slot_index(slot)
+            if slot is not None:
+                mask |= 1 << (day * len(SLOTS) + slot)
+    return mask
+
+
+def mask_schedule(mask: int) -> dict:
+    """Inverse of schedule_mask with canonical day and slot names"""
+    return {
+        day: [slot for s, slot in enumerate(SLOTS) if mask >> (d * len(SLOTS) + s) & 1]
+        for d, day in enumerate(DAYS) if mask >> (DAY_SHIFT + d) & 1
+    }
+
+
+def cells(mask: int) -> list:
+    """Indices of the free cells in ``mask``"""
+    return [cell for cell in range(CELLS) if mask >> cell & 1]
+
+
+def cell_matrix(masks) -> np.ndarray:
+    """(rows, CELLS) bool matrix of the free cells of each mask"""
+    masks = np.asarray(masks, dtype=np.uint64)
+    return (masks[:, None] >> np.arange(CELLS, dtype=np.uint64) & np.uint64(1)).astype(bool)
+
+
+def popcount(masks) -> np.ndarray:
+    """Number of free cells in every mask of a uint64 array (SWAR popcount; numpy < 2 has no bitwise_count)"""
+    # Cells fit in 32 bits, so the bit tricks run on half-width lanes
+    x = (np.asarray(masks, dtype=np.uint64) & np.uint64(CELL_MASK)).astype(np.uint32)
+    x = x - ((x >> np.uint32(1)) & np.uint32(0x55555555))
+    x = (x & np.uint32(0x33333333)) + ((x >> np.uint32(2)) & np.uint32(0x33333333))
+    x = (x + (x >> np.uint32(4))) & np.uint32(0x0F0F0F0F)
+    return ((x * np.uint32(0x01010101)) >> np.uint32(24)).astype(np.int32)
+
+
+def overlap_scores(target_mask: int, masks) -> np.ndarray:
+    """Shared free cells / union of free cells on the days both listed, for every mask at once"""
+    masks = np.asarray(masks, dtype=np.uint64)
+    if not target_mask:
+        return np.zeros(len(masks))
+    target = np.uint64(target_mask)
+    shared = masks & target
+    overlap = popcount(shared)
+    # Day bits are < 2**7, so the shifted values can be reinterpreted as indexes without a copy
+    union = popcount((masks | target) & _DAY_CELLS[(shared >> np.uint64(DAY_SHIFT)).view(np.int64)])
+    return overlap / np.maximum(union, 1)
+
+
+def overlap_matrix(row_masks, column_masks) -> np.ndarray:
+    """overlap_scores of every row mask against every column mask, as a (rows, columns) matrix"""
+    rows = np.asarray(row_masks, dtype=np.uint64)[:, None]
+    columns = np.asarray(column_masks, dtype=np.uint64)[None, :]
+    shared = rows & columns
+    union = popcount((rows | columns) & _DAY_CELLS[(shared >> np.uint64(DAY_SHIFT)).view(np.int64)])
+    return popcount(shared) / np.maximum(union, 1)
+
+
+def schedule_overlap(mask1: int, mask2: int) -> float:
+    """Scalar overlap_scores for one pair"""
+    shared_days = (mask1 & mask2) >> DAY_SHIFT
+    overlap = bin(mask1 & mask2 & CELL_MASK).count('1')
+    union = bin((mask1 | mask2) & int(_DAY_CELLS[shared_days])).count('1')
+    return overlap / max(union, 1)
@@ -0,0 +1,371 @@
+# scoring.py
+import hashlib
+from array import array
+
+import numpy as np
+
+from schedule_grid import cells, overlap_scores, popcount, schedule_mask, CELL_MASK
+
+# Composite score weights (must add up to 1.0)
+WEIGHTS = {
+    'subject': 0.4,
+    'schedule': 0.3,
+    'learning_style': 0.2,
+    'performance': 0.1
+}
+
+# Only matches strictly above this percentage are recommended
+MATCH_THRESHOLD = 50
+
+DEFAULT_PERFORMANCE = 3
+
+# Float32 dot products differ in the last bits depending on summation order;
+# rounding keeps batch and pairwise scoring on the same side of the cutoff
+STYLE_PRECISION = 6
+_INITIAL_ROWS = 64
+_INITIAL_COLUMNS = 16
+
+# Arrays exported by ScoringEngine.export_arrays / accepted by attach_arrays
+ARRAY_NAMES = (
+    'subjects', 'subject_counts', 'schedule',
+    'performance', 'has_style', 'style_keys', 'styles'
+)
+
+
+def text_key(text: str) -> int:
+    """64-bit key for a piece of text (ids, learning styles)"""
+    return int.from_bytes(hashlib.sha1(str(text).encode('utf-8')).digest()[:8], 'little', signed=True)
+
+
+def _grow(array, rows=None, columns=None):
+    """Return a zero-padded copy of ``array`` with at least the requested shape"""
+    shape = list(array.shape)
+    if rows is not None and rows > shape[0]:
+        shape[0] = max(rows, shape[0] * 2)
+    if columns is not None and columns > shape[1]:
+        shape[1] = max(columns, shape[1] * 2)
+    if tuple(shape) == array.shape:
+        return array
+    grown = np.zeros(shape, dtype=array.dtype)
+    grown[tuple(slice(0, n) for n in array.shape)] = array
+    return grown
+
+
+class Postings:
+    """Append-only inverted index from a column to the rows that have it.
+
+    Entries are never removed when a profile changes; a stale entry only adds
+    a candidate that is then scored exactly from the bit matrices. A compacted
+    CSR copy (``indptr``/``indices``) can be rebuilt from a bit matrix, e.g.
+    when a shared snapshot is published.
+    """
+
+    def __init__(self, indptr=None, indices=None):
+        self.indptr = np.zeros(1, dtype=np.int64) if indptr is None else indptr
+        self.indices = np.zeros(0, dtype=np.int64) if indices is None else indices
+        self._extra = {}
+
+    @classmethod
+    def from_matrix(cls, matrix):
+        """Build the CSR postings of a boolean rows x columns matrix"""
+        columns, rows = np.nonzero(matrix.T)
+        indptr = np.zeros(matrix.shape[1] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(columns, minlength=matrix.shape[1]), out=indptr[1:])
+        return cls(indptr, rows.astype(np.int64))
+
+    def add(self, column, row):
+        self._extra.setdefault(column, array('q')).append(row)
+
+    def rows(self, columns) -> np.ndarray:
+        """Sorted unique rows listed under any of ``columns``"""
+        parts = []
+        for column in columns:
+            if column + 1 < len(self.indptr):
+                parts.append(self.indices[self.indptr[column]:self.indptr[column + 1]])
+            if column in self._extra:
+                parts.append(np.frombuffer(self._extra[column], dtype=np.int64))
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(parts))
+
+
+class RowIds:
+    """Maps student ids to rows.
+
+    Ids added in this process live in a dict; ids loaded from a snapshot are
+    looked up by 64-bit key in a sorted array so they cost no Python objects.
+    Rows of students without an id are kept in ``anonymous``.
+    """
+
+    def __init__(self, keys=None, rows=None, anonymous=None):
+        self.keys = np.zeros(0, dtype=np.int64) if keys is None else keys
+        self.rows = np.zeros(0, dtype=np.int64) if rows is None else rows
+        self.anonymous = array('q', [] if anonymous is None else anonymous)
+        self._local = {}
+
+    def get(self, student_id):
+        if student_id is None:
+            return None
+        row = self._local.get(student_id)
+        if row is not None or not len(self.keys):
+            return row
+        key = text_key(student_id)
+        position = np.searchsorted(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return int(self.rows[position])
+        return None
+
+    def set(self, student_id, row):
+        if student_id is None:
+            self.anonymous.append(row)
+        else:
+            self._local[student_id] = row
+
+    def export(self):
+        """Return ``(keys, rows)`` sorted by key, covering every known id"""
+        keys = np.concatenate([self.keys, np.fromiter((text_key(i) for i in self._local), dtype=np.int64)])
+        rows = np.concatenate([self.rows, np.fromiter(self._local.values(), dtype=np.int64)])
+        keys, first = np.unique(keys[::-1], return_index=True)  # later entries win
+        return keys, rows[::-1][first]
+
+
+class ScoringEngine:
+    """Columnar copy of the matching features for every resident student.
+
+    Row ``i`` mirrors ``AIStudentMatcher.students[i]``:
+      - subjects as a multi-hot bit matrix
+      - schedules as schedule_grid bitmasks (free cells plus listed days)
+      - learning-style embeddings as a normalized float32 matrix
+      - performance levels as a float array (group aggregates store a mean)
+
+    ``score`` evaluates the weighted composite for all rows in a handful of
+    NumPy operations instead of one Python iteration per candidate.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.row_ids = RowIds()
+        self.subject_ids = {}
+        # Inverted indexes: subject column -> rows, schedule grid cell -> rows
+        self.subject_postings = Postings()
+        self.slot_postings = Postings()
+
+        self._subjects = np.zeros((_INITIAL_ROWS, _INITIAL_COLUMNS), dtype=bool)
+        self._subject_counts = np.zeros(_INITIAL_ROWS, dtype=np.int32)
+        self._schedule = np.zeros(_INITIAL_ROWS, dtype=np.uint64)
+        self._performance = np.full(_INITIAL_ROWS, DEFAULT_PERFORMANCE, dtype=np.float64)
+        self._has_style = np.zeros(_INITIAL_ROWS, dtype=bool)
+        self._style_keys = np.zeros(_INITIAL_ROWS, dtype=np.int64)
+        self._styles = None  # allocated once the embedding size is known
+
+    @staticmethod
+    def _intern(vocabulary, value):
+        column = vocabulary.get(value)
+        if column is None:
+            column = len(vocabulary)
+            vocabulary[value] = column
+        return column
+
+    def _ensure_rows(self, rows):
+        if rows <= self._subjects.shape[0]:
+            return
+        self._subjects = _grow(self._subjects, rows=rows)
+        self._subject_counts = _grow(self._subject_counts, rows=rows)
+        self._schedule = _grow(self._schedule, rows=rows)
+        old_size = self._performance.shape[0]
+        self._performance = _grow(self._performance, rows=rows)
+        self._performance[old_size:] = DEFAULT_PERFORMANCE
+        self._has_style = _grow(self._has_style, rows=rows)
+        self._style_keys = _grow(self._style_keys, rows=rows)
+        if self._styles is not None:
+            self._styles = _grow(self._styles, rows=rows)
+
+    def add(self, student, style_vector=None) -> int:
+        """Append a student and return its row"""
+        row = self.size
+        self._ensure_rows(row + 1)
+        self.row_ids.set(student.get('id'), row)
+        self.size += 1
+        self.update(row, student, style_vector)
+        return row
+
+    def update(self, row, student, style_vector=None):
+        """Overwrite the features stored in ``row``"""
+        subjects = set(student.get('subjects', []) or [])
+        subject_columns = [self._intern(self.subject_ids, subject) for subject in subjects]
+        for column in subject_columns:
+            self.subject_postings.add(column, row)
+        self._subjects = _grow(self._subjects, columns=len(self.subject_ids))
+        self._subjects[row] = False
+        self._subjects[row, subject_columns] = True
+        self._subject_counts[row] = len(subjects)
+
+        mask = schedule_mask(student.get('schedule'))
+        for cell in cells(mask):
+            self.slot_postings.add(cell, row)
+        self._schedule[row] = mask
+
+        self._performance[row] = student.get('performanceLevel', DEFAULT_PERFORMANCE)
+
+        if style_vector is None:
+            self._has_style[row] = False
+            self._style_keys[row] = 0
+            if self._styles is not None:
+                self._styles[row] = 0
+        else:
+            if self._styles is None:
+                self._styles = np.zeros((self._subjects.shape[0], len(style_vector)), dtype=np.float32)
+            self._styles[row] = style_vector
+            self._has_style[row] = True
+            self._style_keys[row] = text_key(student.get('learningStyle', ''))
+
+    def rows_for(self, student_id):
+        """Return every row holding ``student_id``"""
+        if student_id is None:
+            return list(self.row_ids.anonymous)
+        row = self.row_ids.get(student_id)
+        return [] if row is None else [row]
+
+    def stored_style_vector(self, row, learning_style):
+        """Return the stored embedding of ``row`` if it was computed from ``learning_style``"""
+        if self._has_style[row] and self._style_keys[row] == text_key(learning_style):
+            return self._styles[row]
+        return None
+
+    def export_arrays(self) -> dict:
+        """Populated part of every feature array, keyed by ARRAY_NAMES"""
+        n = self.size
+        arrays = {
+            'subjects': self._subjects[:n, :len(self.subject_ids)],
+            'subject_counts': self._subject_counts[:n],
+            'schedule': self._schedule[:n],
+            'performance': self._performance[:n],
+            'has_style': self._has_style[:n],
+            'style_keys': self._style_keys[:n]
+        }
+        if self._styles is not None:
+            arrays['styles'] = self._styles[:n]
+        return arrays
+
+    def export_meta(self) -> dict:
+        return {
+            'size': self.size,
+            'subject_ids': list(self.subject_ids)
+        }
+
+    def attach_arrays(self, arrays: dict, meta: dict, row_ids: RowIds, subject_postings: Postings, slot_postings: Postings):
+        """Use externally owned arrays (e.g. a memory-mapped snapshot) as storage.
+
+        The arrays may have spare rows and columns beyond ``meta``; writes into
+        them (new students) go to those spare slots.
+        """
+        self.size = meta['size']
+        self.subject_ids = {value: i for i, value in enumerate(meta['subject_ids'])}
+        self.row_ids = row_ids
+        self.subject_postings = subject_postings
+        self.slot_postings = slot_postings
+        for name in ARRAY_NAMES:
+            setattr(self, f"_{name}", arrays.get(name))
+
+    def candidate_rows(self, target) -> np.ndarray:
+        """Rows sharing at least one subject or free schedule cell with ``target``.
+
+        Any other row scores 0 on both subject and schedule, so its composite
+        is at most learning style + performance = 30%, below MATCH_THRESHOLD.
+        """
+        subject_columns = [self.subject_ids[s] for s in set(target.get('subjects', []) or []) if s in self.subject_ids]
+        slot_columns = cells(schedule_mask(target.get('schedule')))
+        return np.union1d(self.subject_postings.rows(subject_columns), self.slot_postings.rows(slot_columns))
+
+    def _take(self, array, rows):
+        return array[:self.size] if rows is None else array[rows]
+
+    def subject_scores(self, target, rows=None):
+        counts = self._take(self._subject_counts, rows)
+        subjects = set(target.get('subjects', []) or [])
+        if not subjects:
+            return np.zeros(len(counts))
+        columns = [self.subject_ids[s] for s in subjects if s in self.subject_ids]
+        intersection = self._take(self._subjects, rows)[:, columns].sum(axis=1)
+        union = counts + len(subjects) - intersection
+        return np.where(counts > 0, intersection / np.maximum(union, 1), 0.0)
+
+    def schedule_scores(self, target, rows=None):
+        return overlap_scores(schedule_mask(target.get('schedule')), self._take(self._schedule, rows))
+
+    def available_rows(self, mask: int, min_overlap: int = 1):
+        """Rows with at least ``min_overlap`` free cells in common with ``mask``, and that count"""
+        rows = self.slot_postings.rows(cells(mask))
+        common = popcount(self._schedule[rows] & np.uint64(mask & CELL_MASK))
+        keep = common >= min_overlap
+        return rows[keep], common[keep]
+
+    def learning_style_scores(self, style_vector, rows=None):
+        has_style = self._take(self._has_style, rows)
+        if style_vector is None or self._styles is None:
+            return np.zeros(len(has_style))
+        similarity = (self._take(self._styles, rows) @ np.asarray(style_vector, dtype=np.float32)).astype(np.float64)
+        similarity = np.round(similarity, STYLE_PRECISION)
+        return np.where(has_style, np.maximum(similarity, 0.0), 0.0)
+
+    def performance_scores(self, target, rows=None):
+        level = target.get('performanceLevel', DEFAULT_PERFORMANCE)
+        return 1 - np.abs(level - self._take(self._performance, rows)) / 4
+
+    @staticmethod
+    def _combine(subject, schedule, learning_style, performance):
+        composite = (
+            subject * WEIGHTS['subject'] +
+            schedule * WEIGHTS['schedule'] +
+            learning_style * WEIGHTS['learning_style'] +
+            performance * WEIGHTS['performance']
+        )
+        # int() truncation, as in the original per-pair loop
+        return (composite * 100).astype(np.int64)
+
+    def score(self, target, style_vector=None, rows=None) -> dict:
+        """Score ``target`` against ``rows`` (default: every row); one array per factor"""
+        if rows is None:
+            rows = np.arange(self.size)
+        subject = self.subject_scores(target, rows)
+        schedule = self.schedule_scores(target, rows)
+        learning_style = self.learning_style_scores(style_vector, rows)
+        performance = self.performance_scores(target, rows)
+        return {
+            'rows': rows,
+            'subject': subject,
+            'schedule': schedule,
+            'learning_style': learning_style,
+            'performance': performance,
+            'match_percentage': self._combine(subject, schedule, learning_style, performance)
+        }
+
+    def match(self, target, style_vector=None, threshold: int = MATCH_THRESHOLD) -> dict:
+        """Like ``score`` but only returns rows above ``threshold``.
+
+        Candidates come from the inverted indexes, and rows whose composite
+        cannot pass even with a perfect learning-style score are dropped
+        before any embedding dot products are computed.
+        """
+        rows = self.candidate_rows(target)
+        candidates = len(rows)
+        subject = self.subject_scores(target, rows)
+        schedule = self.schedule_scores(target, rows)
+        performance = self.performance_scores(target, rows)
+        upper_bound = self._combine(subject, schedule, np.ones(len(rows)), performance)
+        keep = upper_bound > threshold
+        rows, subject, schedule, performance = rows[keep], subject[keep], schedule[keep], performance[keep]
+
+        learning_style = self.learning_style_scores(style_vector, rows)
+        match_percentage = self._combine(subject, schedule, learning_style, performance)
+        keep = match_percentage > threshold
+        return {
+            'candidates': candidates,
+            'scored': len(rows),
+            'rows': rows[keep],
+            'subject': subject[keep],
+            'schedule': schedule[keep],
+            'learning_style': learning_style[keep],
+            'performance': performance[keep],
+            'match_percentage': match_percentage[keep]
+        }
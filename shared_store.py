@@ -0,0 +1,330 @@
+# shared_store.py
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from ann_index import make_backend
+from lexical_index import LexicalIndex
+from profile_record import ProfileRecord
+from schedule_grid import cell_matrix
+from scoring import ARRAY_NAMES, Postings, RowIds, ScoringEngine
+from vector_index import VectorIndex
+
+# Shared snapshot configuration (gunicorn workers on one host)
+SHARED_STORE_DIR = os.getenv('SHARED_STORE_DIR', '')  # empty = every worker keeps its own copy
+SHARED_REFRESH_SECONDS = float(os.getenv('SHARED_REFRESH_SECONDS', '30'))
+SHARED_HEADROOM = float(os.getenv('SHARED_HEADROOM', '0.25'))  # spare rows for local appends
+SHARED_PENDING_LIMIT = int(os.getenv('SHARED_PENDING_LIMIT', '1000'))  # unpublished local profiles kept per worker
+
+_SPARE_COLUMNS = 64
+_KEEP_VERSIONS = 2
+# Bumped whenever the snapshot layout changes; older snapshots are ignored
+SNAPSHOT_FORMAT = 4
+
+
+class SharedProfiles:
+    """List-like view of the ProfileRecords stored in a snapshot.
+
+    Records are kept as JSON in one memory-mapped blob and decoded on
+    access, so a worker only materializes the rows it actually reads.
+    Records written after the snapshot was taken live in a local dict.
+    """
+
+    def __init__(self, blob, offsets, size: int):
+        self._blob = blob
+        self._offsets = offsets
+        self._size = size
+        self._local = {}
+
+    def __len__(self):
+        return self._size
+
+    def raw(self, row: int) -> bytes:
+        """JSON encoding of ``row``"""
+        if row in self._local:
+            return json.dumps(self._local[row].to_json()).encode('utf-8')
+        return self._blob[self._offsets[row]:self._offsets[row + 1]].tobytes()
+
+    def __getitem__(self, row):
+        row = int(row)
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError(row)
+        if row in self._local:
+            return self._local[row]
+        return ProfileRecord.from_json(json.loads(self.raw(row)))
+
+    def __setitem__(self, row, record):
+        self._local[int(row)] = record
+
+    def append(self, record):
+        self._local[self._size] = record
+        self._size += 1
+
+    def __iter__(self):
+        for row in range(self._size):
+            yield self[row]
+
+
+def _write_array(path, array, rows=None, columns=None):
+    """Write ``array`` as .npy, padded with zero rows/columns for local appends"""
+    shape = list(array.shape)
+    if rows is not None:
+        shape[0] = rows
+    if columns is not None and array.ndim == 2:
+        shape[1] = columns
+    out = open_memmap(path, mode='w+', dtype=array.dtype, shape=tuple(shape))
+    out[tuple(slice(0, n) for n in array.shape)] = array
+    out.flush()
+    del out
+
+
+def publish(matcher, directory: str) -> str:
+    """Write the matcher's students, features and embeddings as a new snapshot.
+
+    Files are written into a fresh version directory which becomes visible
+    through an atomic rename of ``CURRENT``. Returns the version name.
+    """
+    engine = matcher.scoring
+    size = engine.size
+    capacity = size + max(_SPARE_COLUMNS, int(size * SHARED_HEADROOM))
+    version = f"{int(time.time() * 1000)}-{os.getpid()}"
+    staging = os.path.join(directory, 'versions', f".{version}.tmp")
+    os.makedirs(staging)
+
+    arrays = engine.export_arrays()
+    for name, array in arrays.items():
+        columns = array.shape[1] + _SPARE_COLUMNS if array.ndim == 2 and name != 'styles' else None
+        _write_array(os.path.join(staging, f"{name}.npy"), array, rows=capacity, columns=columns)
+    for name, postings in (('subject', Postings.from_matrix(arrays['subjects'])),
+                           ('slot', Postings.from_matrix(cell_matrix(arrays['schedule'])))):
+        np.save(os.path.join(staging, f"{name}_indptr.npy"), postings.indptr)
+        np.save(os.path.join(staging, f"{name}_indices.npy"), postings.indices)
+    keys, rows = engine.row_ids.export()
+    np.save(os.path.join(staging, 'id_keys.npy'), keys)
+    np.save(os.path.join(staging, 'id_rows.npy'), rows)
+    _write_array(os.path.join(staging, 'vectors.npy'), matcher.search_index.vectors, rows=capacity)
+    # BM25 postings, so readers search without re-tokenizing every profile
+    lexical_index = matcher.lexical_index
+    if lexical_index is None:
+        lexical_index = LexicalIndex.build(matcher.search_terms(record) for record in matcher.students)
+    for name, array in lexical_index.export().items():
+        _write_array(os.path.join(staging, f"lexical_{name}.npy"), array, rows=capacity if name == 'lengths' else None)
+
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    with open(os.path.join(staging, 'profiles.json'), 'wb') as f:
+        for row in range(size):
+            raw = matcher.students.raw(row) if isinstance(matcher.students, SharedProfiles) \
+                else json.dumps(matcher.students[row].to_json()).encode('utf-8')
+            f.write(raw)
+            offsets[row + 1] = offsets[row] + len(raw)
+    np.save(os.path.join(staging, 'profile_offsets.npy'), offsets)
+
+    meta = engine.export_meta()
+    meta['anonymous'] = list(engine.row_ids.anonymous)
+    meta['arrays'] = sorted(arrays)
+    meta['format'] = SNAPSHOT_FORMAT
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    os.rename(staging, os.path.join(directory, 'versions', version))
+    pointer = os.path.join(directory, 'CURRENT.tmp')
+    with open(pointer, 'w') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(directory, 'CURRENT'))
+    _prune(directory, version)
+    return version
+
+
+def _prune(directory: str, current: str):
+    # Mapped files stay valid after unlink, so readers on an old version are unaffected
+    versions = sorted(name for name in os.listdir(os.path.join(directory, 'versions')) if not name.startswith('.'))
+    for name in versions[:-_KEEP_VERSIONS]:
+        if name != current:
+            shutil.rmtree(os.path.join(directory, 'versions', name), ignore_errors=True)
+
+
+def current_version(directory: str):
+    """Name of the latest published snapshot, or None"""
+    try:
+        with open(os.path.join(directory, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load(directory: str, version: str, backend):
+    """Map a snapshot and return ``(scoring, search_index, students, lexical_index)``.
+
+    Feature arrays and embeddings are mapped copy-on-write: pages are shared
+    with every other worker until this process writes to them.
+    """
+    path = os.path.join(directory, 'versions', version)
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError(f"snapshot {version} has format {meta.get('format')}, expected {SNAPSHOT_FORMAT}")
+
+    def mapped(name, mode='r'):
+        return np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mode)
+
+    scoring = ScoringEngine()
+    scoring.attach_arrays(
+        {name: mapped(name, 'c') for name in ARRAY_NAMES if name in meta['arrays']},
+        meta,
+        RowIds(mapped('id_keys'), mapped('id_rows'), meta['anonymous']),
+        Postings(mapped('subject_indptr'), mapped('subject_indices')),
+        Postings(mapped('slot_indptr'), mapped('slot_indices'))
+    )
+    search_index = VectorIndex(backend)
+    search_index.attach(mapped('vectors', 'c'), meta['size'])
+    blob = np.memmap(os.path.join(path, 'profiles.json'), dtype=np.uint8, mode='r') if meta['size'] else np.zeros(0, np.uint8)
+    students = SharedProfiles(blob, mapped('profile_offsets'), meta['size'])
+    lexical_index = LexicalIndex.from_arrays({
+        name: mapped(f"lexical_{name}", 'c' if name == 'lengths' else 'r')
+        for name in ('term_keys', 'term_indptr', 'posting_rows', 'posting_counts', 'phrase_keys', 'phrase_counts',
+                     'row_phrase_indptr', 'row_phrase_keys', 'lengths')
+    })
+    return scoring, search_index, students, lexical_index
+
+
+class SharedStore:
+    """Keeps one matcher snapshot per host and every worker attached to it.
+
+    Whichever worker holds ``writer.lock`` refreshes students changed in the
+    database, publishes a new snapshot when the matcher changed and attaches
+    to it itself. The other workers only poll ``CURRENT`` and re-attach. If
+    the writer dies its lock is released and the next poller takes over.
+    Profiles that exist only in a worker's memory (no database row) are
+    ``forward``-ed to the writer through ``inbox/`` so snapshots include them.
+    """
+
+    def __init__(self, directory: str = SHARED_STORE_DIR, refresh_seconds: float = SHARED_REFRESH_SECONDS):
+        self.directory = directory
+        self.refresh_seconds = refresh_seconds
+        self.version = None
+        self.is_writer = False
+        self._lock_file = None
+        self._published = None
+        self._synced_at = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        os.makedirs(os.path.join(directory, 'versions'), exist_ok=True)
+        os.makedirs(os.path.join(directory, 'inbox'), exist_ok=True)
+
+    def start(self, matcher, refresh):
+        """Start the background loop in this process (once per pid, safe after fork).
+
+        ``refresh(matcher, since)`` loads students changed in the database
+        after ``since`` and returns the database time to resume from.
+        """
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # A forked child must not inherit the parent's writer lock
+            self.is_writer = False
+            self._lock_file = None
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(matcher, refresh), daemon=True)
+            self._thread.start()
+
+    def _try_become_writer(self) -> bool:
+        import fcntl  # POSIX only; the shared store is an opt-in Linux deployment mode
+        if self.is_writer:
+            return True
+        lock_file = open(os.path.join(self.directory, 'writer.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        self.is_writer = True
+        print(f"Shared store: worker {os.getpid()} is the writer")
+        return True
+
+    def attach(self, matcher, published=None) -> bool:
+        """Switch ``matcher`` to the latest snapshot if it is newer than ours.
+
+        ``published`` is the matcher version the snapshot was written from,
+        when ``matcher`` wrote it itself (see AIStudentMatcher.attach).
+        """
+        version = current_version(self.directory)
+        if version is None or version == self.version:
+            return False
+        # Fresh search backend: in-flight requests keep using the old index and its lists
+        backend = make_backend(matcher.search_index.backend.name)
+        try:
+            snapshot = load(self.directory, version, backend)
+        except ValueError as e:
+            # Written by an older release; the writer replaces it on its next publish
+            print(f"Shared store: skipping {e}")
+            self.version = version
+            return False
+        matcher.attach(*snapshot, published=published)
+        self.version = version
+        print(f"Shared store: attached snapshot {version} ({len(matcher.students)} students)")
+        return True
+
+    def forward(self, profiles):
+        """Queue ``profiles`` for the writer, which adds them before its next publish"""
+        path = os.path.join(self.directory, 'inbox', f"{time.time():.6f}-{os.getpid()}-{threading.get_ident()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(profiles, f)
+        os.replace(tmp_path, path)
+
+    def _receive(self, matcher) -> list:
+        """Add every forwarded profile to ``matcher``; returns the inbox files read"""
+        inbox = os.path.join(self.directory, 'inbox')
+        paths = sorted(os.path.join(inbox, name) for name in os.listdir(inbox) if name.endswith('.json'))
+        profiles = []
+        for path in paths:
+            try:
+                with open(path) as f:
+                    profiles.extend(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Shared store: dropping unreadable {path}: {e}")
+        if profiles:
+            matcher.add_students(profiles)
+        return paths
+
+    def sync(self, matcher, refresh):
+        """One iteration of the background loop"""
+        if not self._try_become_writer():
+            self.attach(matcher)
+            return
+        if self._published is None:
+            # New writer: start from the latest snapshot, then catch up with the database
+            self.attach(matcher)
+            self._published = matcher.version
+        self._synced_at = refresh(matcher, self._synced_at)
+        received = self._receive(matcher)
+        if matcher.version != self._published:
+            with matcher.write_lock:
+                published = matcher.version
+                publish(matcher, self.directory)
+            # Map our own snapshot too, so the writer's private copy is released
+            self.attach(matcher, published=published)
+            self._published = published
+        # Only once they are in a snapshot, so a writer dying before it publishes loses nothing
+        for path in received:
+            os.remove(path)
+
+    def _run(self, matcher, refresh):
+        while True:
+            try:
+                self.sync(matcher, refresh)
+            except Exception as e:
+                print(f"Shared store sync failed: {e}")
+            time.sleep(self.refresh_seconds)
+
+    def stats(self) -> dict:
+        return {'directory': self.directory, 'version': self.version, 'writer': self.is_writer}
@@ -0,0 +1,151 @@
+# student_store.py
+import os
+
+import numpy as np
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from database import db_session, engine
+from embedding_cache import content_hash
+from models import GroupMember, StudyGroup, User, TextEmbedding
+
+WARM_START_PAGE_SIZE = int(os.getenv('WARM_START_PAGE_SIZE', '1000'))
+
+
+def load_embeddings(session, model_name: str, hashes) -> dict:
+    """Return stored embeddings for ``hashes`` as {content_hash: vector}"""
+    if not hashes:
+        return {}
+    rows = session.execute(
+        select(TextEmbedding.content_hash, TextEmbedding.vector)
+        .where(TextEmbedding.model_name == model_name, TextEmbedding.content_hash.in_(hashes))
+    )
+    return {key: np.frombuffer(vector, dtype=np.float32) for key, vector in rows}
+
+
+def save_embeddings(session, model_name: str, vectors: dict):
+    """Store {content_hash: vector} with one multi-row insert"""
+    if not vectors:
+        return
+    rows = [{
+        'model_name': model_name,
+        'content_hash': key,
+        'dim': len(vector),
+        'vector': np.asarray(vector, dtype=np.float32).tobytes()
+    } for key, vector in vectors.items()]
+    # Another worker may have stored the same text concurrently
+    statement = insert(TextEmbedding).prefix_with('IGNORE', dialect='mysql').prefix_with('OR IGNORE', dialect='sqlite')
+    session.execute(statement, rows)
+    session.commit()
+
+
+def _unchanged(matcher, profile) -> bool:
+    rows = matcher.scoring.rows_for(profile['id'])
+    return bool(rows) and matcher.students[rows[0]].matches(profile)
+
+
+def refresh_students(matcher, model_name: str, since=None):
+    """Load users changed since ``since`` (all users if None); returns the time to resume from"""
+    now = db_session.execute(select(func.now())).scalar()
+    warm_start(matcher, model_name, since=since)
+    return now
+
+
+def warm_start(matcher, model_name: str, page_size: int = WARM_START_PAGE_SIZE, since=None) -> int:
+    """Load every user profile into ``matcher`` and return how many were loaded.
+
+    Users are streamed in pages with yield_per. For each page the stored
+    embeddings are fetched in one query; only texts that were never encoded
+    go through the model, and those are written back for the next start.
+    Profiles the matcher already holds unchanged are skipped; with
+    ``since`` only users updated after that time are read.
+    """
+    loaded = 0
+    statement = select(User).execution_options(yield_per=page_size)
+    if since is not None:
+        statement = statement.where(User.updated_at >= since)
+    # Embedding lookups need their own connection while the user stream is open
+    with Session(engine) as lookup:
+        for users in db_session.execute(statement).scalars().partitions():
+            profiles = [profile for profile in (user.to_dict() for user in users) if not _unchanged(matcher, profile)]
+            texts = {}
+            for profile in profiles:
+                for text in matcher.get_embedding_texts(profile):
+                    key = content_hash(text)
+                    # Texts shared with an earlier page are already cached
+                    if key not in texts and matcher.embeddings.get(key) is None:
+                        texts[key] = text
+
+            stored = load_embeddings(lookup, model_name, list(texts))
+            for key, vector in stored.items():
+                matcher.embeddings.put(key, vector, persist=False)
+
+            missing = {key: text for key, text in texts.items() if key not in stored}
+            if missing:
+                vectors = matcher.embeddings.encode_many(list(missing.values()))
+                save_embeddings(lookup, model_name, dict(zip(missing.keys(), vectors)))
+
+            for profile in profiles:
+                matcher.add_student(profile)
+            loaded += len(profiles)
+            print(f"Warm start: {loaded} students loaded ({len(stored)} embeddings reused, {len(missing)} encoded)")
+    db_session.remove()
+    return loaded
+
+
+def load_groups(matcher, page_size: int = WARM_START_PAGE_SIZE) -> int:
+    """Build the group aggregates from StudyGroup and active GroupMember rows; returns the group count.
+
+    Member profiles come from the users table in the same pass, so style
+    vectors of students the matcher already holds are reused, not re-encoded.
+    """
+    for group in db_session.execute(select(StudyGroup)).scalars():
+        matcher.groups.upsert_group(group.to_dict())
+    statement = (
+        select(GroupMember.group_id, User)
+        .join(User, User.id == GroupMember.user_id)
+        .where(GroupMember.status == 'active')
+        .execution_options(yield_per=page_size)
+    )
+    members = 0
+    for group_id, user in db_session.execute(statement):
+        profile = user.to_dict()
+        matcher.groups.join(group_id, profile, matcher.get_style_vector(profile))
+        members += 1
+    db_session.remove()
+    print(f"Loaded {len(matcher.groups)} study groups ({members} active members)")
+    return len(matcher.groups)
+
+
+def sync_group(matcher, group_id) -> bool:
+    """Make one group's aggregate match its StudyGroup row and active GroupMember rows.
+
+    Returns False (and hides the group) when the group no longer exists.
+    """
+    group = db_session.get(StudyGroup, group_id)
+    if group is None:
+        db_session.remove()
+        matcher.groups.remove_group(group_id)
+        return False
+    matcher.groups.upsert_group(group.to_dict())
+    members = db_session.execute(
+        select(User).join(GroupMember, GroupMember.user_id == User.id)
+        .where(GroupMember.group_id == group_id, GroupMember.status == 'active')
+    ).scalars()
+    profiles = {user.id: user.to_dict() for user in members}
+    db_session.remove()
+    for user_id in matcher.groups.member_ids(group_id) - set(profiles):
+        matcher.groups.leave(group_id, user_id)
+    for profile in profiles.values():
+        matcher.join_group(group_id, profile)
+    return True
+
+
+def fetch_profiles(student_ids) -> dict:
+    """Full profiles of ``student_ids`` from the users table, as {id: profile}"""
+    if not student_ids:
+        return {}
+    users = db_session.execute(select(User).where(User.id.in_(list(student_ids)))).scalars()
+    profiles = {user.id: user.to_dict() for user in users}
+    db_session.remove()
+    return profiles
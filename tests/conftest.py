@@ -0,0 +1,80 @@
+# tests/conftest.py
+"""Shared fixtures: an offline stand-in for the sentence-transformer and a throwaway SQLite database.
+
+Run from the repository root with ``python -m pytest tests``.
+"""
+import hashlib
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# app.py must not load the model or the database at import
+os.environ.setdefault('STUDYSYNC_PRELOAD_MODEL', '0')
+os.environ.setdefault('STUDYSYNC_WARM_START', '0')
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STUB_DIM = 32
+
+
+class StubModel:
+    """Deterministic SentenceTransformer stand-in: one pseudo-random vector per distinct text"""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, sentences, **kwargs):
+        self.calls.append(list(sentences))
+        vectors = np.empty((len(sentences), STUB_DIM), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            seed = int.from_bytes(hashlib.sha1(sentence.encode('utf-8')).digest()[:8], 'little')
+            vectors[i] = np.random.default_rng(seed).normal(size=STUB_DIM)
+        return vectors
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """The stub behind app's shared encoder for the duration of a test"""
+    import app
+    model = StubModel()
+    monkeypatch.setattr(app.encoder, 'model', model)
+    return model
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Every model's table in a fresh SQLite file, bound to database.db_session and database.engine"""
+    from sqlalchemy import create_engine
+    import database
+    import models  # noqa: F401  (registers the tables)
+    engine = create_engine(f"sqlite:///{tmp_path / 'studysync.db'}", connect_args={'check_same_thread': False})
+    database.Base.metadata.create_all(bind=engine)
+    database.db_session.remove()
+    database.db_session.configure(bind=engine)
+    monkeypatch.setattr(database, 'engine', engine)
+    if 'student_store' in sys.modules:
+        monkeypatch.setattr(sys.modules['student_store'], 'engine', engine)
+    yield database.db_session
+    database.db_session.remove()
+    engine.dispose()
+
+
+@pytest.fixture
+def group_members(db):
+    """Group 'g1' led by 'u1' with 'u2' as a member, plus 'u3' outside it; returns {user id: bearer headers}"""
+    from auth import generate_token
+    from models import GroupMember, StudyGroup, User
+    headers = {}
+    for number in (1, 2, 3):
+        user_id = f"u{number}"
+        db.add(User(id=user_id, name=f"User {number}", email=f"{user_id}@example.edu", password_hash='x',
+                    university='State University', major='Physics', year='Junior'))
+        headers[user_id] = {'Authorization': f"Bearer {generate_token(user_id, f'{user_id}@example.edu')}"}
+    db.add(StudyGroup(id='g1', title='Physics Study Group', subject='Physics', leader_id='u1', leader_name='User 1'))
+    db.add(GroupMember(group_id='g1', user_id='u1', user_name='User 1', role='leader', status='active'))
+    db.add(GroupMember(group_id='g1', user_id='u2', user_name='User 2', role='member', status='active'))
+    db.commit()
+    db.remove()
+    return headers
@@ -0,0 +1,135 @@
+# tests/test_asgi.py
+"""ASGI entry point: Flask routes on a thread pool, inference admission control"""
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+from flask import Flask
+
+from asgi import InferencePool, Overloaded, PooledWsgiToAsgi, StudySyncASGI
+
+
+def _get(asgi_app, path, method='GET', body=b''):
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'headers': [],
+             'http_version': '1.1', 'root_path': ''}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        await asgi_app(scope, receive, send)
+        return messages
+    return run()
+
+
+def _concurrent(asgi_app, path, count):
+    async def run():
+        return await asyncio.gather(*[_get(asgi_app, path) for _ in range(count)])
+    return asyncio.run(run())
+
+
+def test_flask_routes_run_concurrently():
+    flask_app = Flask(__name__)
+    threads = set()
+
+    @flask_app.route('/slow')
+    def slow():
+        threads.add(threading.get_ident())
+        time.sleep(0.3)
+        return 'done'
+
+    started = time.perf_counter()
+    responses = _concurrent(PooledWsgiToAsgi(flask_app, threads=3), '/slow', 3)
+    assert time.perf_counter() - started < 0.8
+    assert len(threads) == 3
+    assert [messages[0]['status'] for messages in responses] == [200, 200, 200]
+    assert responses[0][1]['body'] == b'done'
+
+
+def test_flask_routes_beyond_the_pool_wait_for_a_thread():
+    flask_app = Flask(__name__)
+    flask_app.add_url_rule('/slow', 'slow', lambda: time.sleep(0.2) or 'done')
+    started = time.perf_counter()
+    responses = _concurrent(PooledWsgiToAsgi(flask_app, threads=2), '/slow', 4)
+    assert time.perf_counter() - started >= 0.4
+    assert all(messages[0]['status'] == 200 for messages in responses)
+
+
+def test_wsgi_chat_streams_are_capped_per_process(group_members, monkeypatch):
+    import app
+    monkeypatch.setattr(app, '_wsgi_streams', threading.BoundedSemaphore(1))
+    client = app.app.test_client()
+    first = client.get('/api/chat/g1/stream', headers=group_members['u1'], buffered=False)
+    assert first.status_code == 200
+    second = client.get('/api/chat/g1/stream', headers=group_members['u2'])
+    assert second.status_code == 503 and second.headers['Retry-After']
+    # A refused stream (not a member) gives its slot back at once, an open one when closed
+    first.close()
+    assert client.get('/api/chat/g1/stream', headers=group_members['u3']).status_code == 403
+    third = client.get('/api/chat/g1/stream', headers=group_members['u2'], buffered=False)
+    assert third.status_code == 200
+    third.close()
+
+
+def _blocked_pool(**options):
+    """A pool whose first request holds a slot until the returned event is set"""
+    pool, release = InferencePool(**options), threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+        return 'held'
+    return pool, release, started, hold
+
+
+def test_inference_pool_rejects_beyond_max_pending():
+    pool, release, started, hold = _blocked_pool(workers=1, max_pending=1, timeout=5)
+
+    async def run():
+        first = asyncio.ensure_future(pool.run(hold))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        with pytest.raises(Overloaded):
+            await pool.run(lambda: 'never')
+        release.set()
+        return await first
+    assert asyncio.run(run()) == 'held'
+    assert pool.stats()['rejected'] == 1 and pool.pending == 0
+
+
+def test_timed_out_inference_keeps_its_slot_until_the_handler_finishes():
+    pool, release, started, hold = _blocked_pool(workers=1, max_pending=2, timeout=0.1)
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool.run(hold)
+        assert pool.pending == 1
+        release.set()
+        assert await pool.run(lambda: 'next') == 'next'
+    asyncio.run(run())
+    assert pool.stats()['timed_out'] == 1 and pool.pending == 0
+
+
+def test_inference_routes_map_pool_errors_to_responses(monkeypatch):
+    handler = lambda data: (time.sleep(data.get('sleep', 0)) or {'success': True, 'echo': data}, 200)
+    monkeypatch.setattr(StudySyncASGI, 'routes', {('POST', '/api/recommend'): (handler, 'http.test')})
+    asgi_app = StudySyncASGI(Flask(__name__), InferencePool(workers=1, max_pending=1, timeout=0.2))
+
+    def post(body, count=1):
+        async def run():
+            return await asyncio.gather(*[_get(asgi_app, '/api/recommend', 'POST', body) for _ in range(count)])
+        return [(messages[0]['status'], json.loads(messages[1]['body'])) for messages in asyncio.run(run())]
+
+    assert post(b'{"a": 1}') == [(200, {'success': True, 'echo': {'a': 1}})]
+    assert post(b'not json')[0][0] == 400
+    assert post(b'[1]')[0][0] == 400
+    assert post(b'{"sleep": 0.3}')[0][0] == 504
+    time.sleep(0.2)
+    statuses = sorted(status for status, _ in post(b'{"sleep": 0.1}', count=2))
+    assert statuses == [200, 503]
@@ -0,0 +1,109 @@
+# tests/test_auth.py
+"""Login: hash upgrades, constant-work failures, the hashing pool and the verified-token cache"""
+import threading
+import time
+
+import pytest
+
+import auth
+from auth import AuthBusy, PasswordHasher, TokenCache, _hashpw
+
+
+@pytest.fixture
+def client(db):
+    import app
+    return app.app.test_client()
+
+
+def _add_user(db, email, password_hash):
+    from models import User
+    db.add(User(id='u1', name='User 1', email=email, password_hash=password_hash,
+                university='State University', major='Physics', year='Junior'))
+    db.commit()
+    db.remove()
+
+
+def _stored_hash(db):
+    from models import User
+    hashed = db.get(User, 'u1').password_hash
+    db.remove()
+    return hashed
+
+
+def test_login_upgrades_hashes_made_at_an_older_cost(db, client, monkeypatch):
+    monkeypatch.setattr(auth, 'password_hasher', PasswordHasher(workers=2, rounds=4))
+    _add_user(db, 'u1@example.edu', _hashpw('secret', 5))
+    response = client.post('/api/auth/login', json={'email': 'u1@example.edu', 'password': 'secret'})
+    assert response.status_code == 200
+    assert _stored_hash(db).startswith('$2b$04$')
+    assert auth.password_hasher.rehashed == 1
+    # Already at the current cost: verified, not rehashed again
+    assert client.post('/api/auth/login', json={'email': 'u1@example.edu', 'password': 'secret'}).status_code == 200
+    assert auth.password_hasher.rehashed == 1
+
+
+def test_failed_logins_do_the_same_bcrypt_work(db, client, monkeypatch):
+    monkeypatch.setattr(auth, 'password_hasher', PasswordHasher(workers=2, rounds=4))
+    _add_user(db, 'u1@example.edu', _hashpw('secret', 4))
+    checks = []
+    real_checkpw = auth._checkpw
+    monkeypatch.setattr(auth, '_checkpw', lambda password, hashed: checks.append(hashed) or real_checkpw(password, hashed))
+    for email in ('u1@example.edu', 'nobody@example.edu'):
+        response = client.post('/api/auth/login', json={'email': email, 'password': 'wrong'})
+        assert response.status_code == 401
+        assert response.get_json()['error'] == 'Invalid email or password'
+    assert len(checks) == 2 and all(hashed.startswith('$2b$04$') for hashed in checks)
+
+
+def test_hashing_pool_rejects_work_beyond_max_pending():
+    hasher = PasswordHasher(workers=1, max_pending=1, rounds=4)
+    started, release = threading.Event(), threading.Event()
+
+    def blocking():
+        started.set()
+        release.wait(5)
+
+    worker = threading.Thread(target=hasher.run, args=(blocking,))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(AuthBusy):
+        hasher.hash('secret')
+    release.set()
+    worker.join()
+    assert hasher.stats()['rejected'] == 1 and hasher.pending == 0
+
+
+def test_concurrent_rehashes_are_all_counted():
+    hasher = PasswordHasher(workers=4, rounds=4)
+    old = _hashpw('secret', 5)
+    threads = [threading.Thread(target=hasher.rehash, args=('secret', old)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert hasher.rehashed == 8
+
+
+def test_token_cache_never_outlives_ttl_or_exp(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    cache = TokenCache(max_size=2, ttl_seconds=60)
+    cache.put('a', {'user_id': 'u1', 'exp': 2000})
+    cache.put('b', {'user_id': 'u2', 'exp': 1010})
+    now[0] = 1030
+    assert cache.get('a') == {'user_id': 'u1', 'exp': 2000}
+    assert cache.get('b') is None  # its own exp came first
+    now[0] = 1061
+    assert cache.get('a') is None  # verified more than ttl seconds ago
+    cache.put('c', {'exp': 2000})
+    cache.put('d', {'exp': 2000})
+    cache.put('e', {'exp': 2000})
+    assert cache.get('c') is None and cache.stats()['entries'] == 2
+
+
+def test_protected_routes_reject_expired_tokens(client, monkeypatch):
+    monkeypatch.setattr(auth, 'verified_tokens', TokenCache())
+    monkeypatch.setattr(auth, 'JWT_EXPIRATION_HOURS', -1)
+    headers = {'Authorization': f"Bearer {auth.generate_token('u1', 'u1@example.edu')}"}
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
+    assert auth.verified_tokens.stats()['entries'] == 0
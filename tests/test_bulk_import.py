@@ -0,0 +1,107 @@
+# tests/test_bulk_import.py
+"""Profile validation, JSONL/CSV parsing, batch import and registration conflicts"""
+import io
+
+import pytest
+
+import app
+from bulk_import import BulkImporter, read_csv, read_jsonl, validate
+
+
+def _profile(number, **fields):
+    return dict({'id': f"s{number}", 'name': f"Student {number}", 'email': f"s{number}@example.edu",
+                 'university': 'State University', 'major': 'Physics', 'year': 'Junior',
+                 'subjects': ['Physics', 'Mathematics'], 'schedule': {'Monday': ['Evening (5-9 PM)']},
+                 'learningStyle': 'Visual learning with diagrams'}, **fields)
+
+
+def test_validate_fills_defaults_and_normalizes():
+    profile = {'id': 7, 'name': 'Sam', 'email': 'sam@example.edu', 'university': 'State University',
+               'major': 'Physics', 'year': 2, 'performanceLevel': '4'}
+    assert validate(profile) == []
+    assert profile['id'] == '7' and profile['year'] == '2' and profile['performanceLevel'] == 4
+    assert profile['subjects'] == [] and profile['schedule'] == {} and profile['learningStyle'] == ''
+
+
+@pytest.mark.parametrize('fields, error', [
+    ({'email': ''}, 'missing email'),
+    ({'subjects': 'Physics'}, 'subjects must be a list of strings'),
+    ({'studyMethods': [1, 2]}, 'studyMethods must be a list of strings'),
+    ({'schedule': ['Monday']}, 'schedule must be an object'),
+    ({'schedule': {'Monday': 'Evening'}}, 'schedule values must be lists of time slots'),
+    ({'performanceLevel': 6}, 'performanceLevel must be an integer from 1 to 5'),
+    ({'performanceLevel': 'high'}, 'performanceLevel must be an integer from 1 to 5'),
+    ({'learningStyle': ['visual']}, 'learningStyle must be a string')
+])
+def test_validate_reports_each_problem(fields, error):
+    assert validate(_profile(1, **fields)) == [error]
+
+
+def test_readers_report_line_numbers():
+    jsonl = io.StringIO('{"id": "a"}\n\nnot json\n')
+    records = list(read_jsonl(jsonl))
+    assert records[0] == (1, {'id': 'a'})
+    assert records[1][0] == 3 and records[1][1].startswith('invalid JSON')
+    csv_text = ('id,subjects,studyMethods,schedule\n'
+                'a,Physics; Biology,"[""Flashcards""]","{""Monday"": [""Morning (8-12 PM)""]}"\n'
+                'b,,,{broken\n')
+    records = list(read_csv(io.StringIO(csv_text)))
+    assert records[0] == (2, {'id': 'a', 'subjects': ['Physics', 'Biology'], 'studyMethods': ['Flashcards'],
+                              'schedule': {'Monday': ['Morning (8-12 PM)']}})
+    assert records[1][0] == 3 and records[1][1].startswith('invalid column value')
+
+
+def test_import_skips_duplicates_and_existing_users(stub_model, group_members):
+    matcher = app.AIStudentMatcher()
+    records = [(1, _profile(1)), (2, _profile(2)), (3, _profile(1, email='other@example.edu')),
+               (4, _profile(3, email='s2@example.edu')), (5, _profile(4, email='u1@example.edu')),
+               (6, _profile(5, major='')), (7, 'invalid JSON: boom')]
+    report = BulkImporter(matcher, app.EMBEDDING_MODEL, batch_size=2, progress=None).run(records)
+    assert (report['received'], report['imported'], report['skipped_existing'], report['invalid']) == (7, 2, 1, 4)
+    assert report['errors'] == [
+        {'line': 3, 'errors': ['duplicate id s1']},
+        {'line': 4, 'errors': ['duplicate email s2@example.edu']},
+        {'line': 6, 'errors': ['missing major']},
+        {'line': 7, 'errors': ['invalid JSON: boom']}
+    ]
+    assert [student.student_id for student in matcher.students] == ['s1', 's2']
+    # A second run finds everything already stored and encodes nothing new
+    stub_model.calls.clear()
+    report = BulkImporter(app.AIStudentMatcher(), app.EMBEDDING_MODEL, progress=None).run(records[:2])
+    assert report['skipped_existing'] == 2 and stub_model.calls == []
+
+
+def test_bulk_endpoint_needs_the_import_key(monkeypatch):
+    monkeypatch.setattr(app, 'BULK_IMPORT_KEY', 'secret')
+    client = app.app.test_client()
+    response = client.post('/api/students/bulk', data='', headers={'X-Import-Key': 'wrong'})
+    assert response.status_code == 403
+
+
+def test_register_conflicts_return_409(stub_model, db, monkeypatch):
+    import auth
+    from sqlalchemy.orm import Session
+    from bulk_import import user_row
+    from models import User
+    monkeypatch.setattr(app, 'matcher', app.AIStudentMatcher())
+    client = app.app.test_client()
+    body = dict(_profile(1), password='secret')
+    del body['id']
+    assert client.post('/api/auth/register', json=body).status_code == 200
+    response = client.post('/api/auth/register', json=body)
+    assert response.status_code == 409
+
+    # Another worker registers the same email after our check but before our commit
+    other = _profile(9, email='race@example.edu')
+    validate(other)
+
+    def racing_hash(password):
+        with Session(db.get_bind()) as session:
+            session.add(User(**user_row(other)))
+            session.commit()
+        return 'x'
+    monkeypatch.setattr(auth, 'hash_password', racing_hash)
+    response = client.post('/api/auth/register', json=dict(body, email='race@example.edu'))
+    assert response.status_code == 409
+    assert response.get_json() == {'success': False, 'error': 'Email is already registered'}
+    assert len(app.matcher.students) == 1
@@ -0,0 +1,93 @@
+# tests/test_chat_store.py
+"""Chat history: keyset paging, the recent-messages cache and message validation"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import chat_store
+from chat_store import RecentMessages, message_page, messages_after
+from models import Message, MessageReaction
+
+START = datetime(2026, 1, 5, 9, 0, 0)
+
+
+@pytest.fixture
+def recent(monkeypatch):
+    cache = RecentMessages(per_group=10)
+    monkeypatch.setattr(chat_store, 'recent_messages', cache)
+    return cache
+
+
+def _add_messages(db, count, first=0):
+    # Pairs share a timestamp, so paging has to break ties by id
+    for i in range(first, first + count):
+        db.add(Message(id=f"msg_{i:04d}", group_id='g1', sender_id='u1', sender_name='User 1',
+                       message=f"message {i}", timestamp=START + timedelta(seconds=i // 2)))
+    db.commit()
+    db.remove()
+
+
+def _walk(limit):
+    ids, cursor = [], None
+    while True:
+        page = message_page('g1', limit=limit, before=cursor)
+        ids[:0] = [message['id'] for message in page['messages']]
+        cursor = page['nextCursor']
+        if cursor is None:
+            return ids
+
+
+def test_pages_walk_the_whole_history_in_order(group_members, recent):
+    _add_messages(chat_store.db_session, 37)
+    expected = [f"msg_{i:04d}" for i in range(37)]
+    assert _walk(limit=5) == expected
+    assert _walk(limit=50) == expected
+
+
+def test_messages_after_resumes_behind_a_cursor(group_members, recent):
+    _add_messages(chat_store.db_session, 9)
+    page = message_page('g1', limit=4)
+    cursor = chat_store.encode_cursor(page['messages'][0])
+    newer, has_more = messages_after('g1', cursor, limit=3)
+    assert [message['id'] for message in newer] == ['msg_0006', 'msg_0007', 'msg_0008']
+    assert has_more is False
+    with pytest.raises(ValueError):
+        chat_store.decode_cursor('not a cursor')
+
+
+def test_cached_page_is_served_while_nothing_changed(group_members, recent):
+    _add_messages(chat_store.db_session, 6)
+    first = message_page('g1', limit=5)
+    assert message_page('g1', limit=5) == first
+    assert recent.hits == 1 and recent.stale == 0
+
+
+def test_cached_page_sees_writes_from_other_workers(group_members, recent):
+    db = chat_store.db_session
+    _add_messages(db, 6)
+    message_page('g1', limit=5)
+    # Stored by another worker: this process's cache was not told
+    _add_messages(db, 1, first=6)
+    assert message_page('g1', limit=5)['messages'][-1]['id'] == 'msg_0006'
+    db.add(MessageReaction(message_id='msg_0005', user_id='u2', user_name='User 2', emoji='👍'))
+    db.commit()
+    db.remove()
+    reacted = message_page('g1', limit=5)['messages']
+    assert [reaction['emoji'] for reaction in reacted[-2]['reactions']] == ['👍']
+    db.query(MessageReaction).delete()
+    db.commit()
+    db.remove()
+    assert message_page('g1', limit=5)['messages'][-2]['reactions'] == []
+    assert recent.stale == 3
+
+
+def test_send_rejects_unknown_message_types(group_members, recent):
+    import app
+    client = app.app.test_client()
+    response = client.post('/api/chat/g1/send', headers=group_members['u2'], json={'message': 'hi', 'type': 'video'})
+    assert response.status_code == 400
+    assert 'announcement' in response.get_json()['error']
+    response = client.post('/api/chat/g1/send', headers=group_members['u2'], json={'message': 'hi', 'type': 'announcement'})
+    assert response.status_code == 200
+    assert message_page('g1')['messages'][-1]['message'] == 'hi'
+    assert client.post('/api/chat/g1/send', headers=group_members['u3'], json={'message': 'hi'}).status_code == 403
@@ -0,0 +1,65 @@
+# tests/test_embedding_cache.py
+"""Embedding caches: keys per model variant and the search-query cache"""
+import numpy as np
+
+from conftest import STUB_DIM, StubModel
+from embedding_cache import EmbeddingCache, QueryEmbeddingCache, content_hash, normalize_query
+from model_loader import ModelHolder
+
+NAME = 'sentence-transformers/all-MiniLM-L6-v2'
+
+
+def test_quantized_weights_get_their_own_variant():
+    assert ModelHolder(NAME, quantize='none').variant == NAME
+    assert ModelHolder(NAME, quantize='int8').variant == f"{NAME}@int8"
+    # Unknown modes load the full-precision weights, so they share its vectors
+    assert ModelHolder(NAME, quantize='fp16').variant == NAME
+
+
+def test_disk_cache_keeps_variants_apart(tmp_path):
+    full, quantized = StubModel(), StubModel()
+    EmbeddingCache(full.encode, cache_dir=str(tmp_path)).encode('Physics')
+    # A restarted int8 worker must not read the fp32 vector back from disk
+    EmbeddingCache(quantized.encode, cache_dir=str(tmp_path), namespace='int8').encode('Physics')
+    assert quantized.calls == [['Physics']]
+    restarted = StubModel()
+    vector = EmbeddingCache(restarted.encode, cache_dir=str(tmp_path), namespace='int8').encode('Physics')
+    assert restarted.calls == []
+    assert np.allclose(np.linalg.norm(vector), 1.0)
+
+
+def test_stored_embeddings_are_keyed_by_variant(db):
+    from student_store import load_embeddings, save_embeddings
+    key = content_hash('Physics')
+    save_embeddings(db, NAME, {key: np.ones(4, dtype=np.float32)})
+    save_embeddings(db, f"{NAME}@int8", {key: np.full(4, 2, dtype=np.float32)})
+    assert load_embeddings(db, NAME, [key])[key].tolist() == [1, 1, 1, 1]
+    assert load_embeddings(db, f"{NAME}@int8", [key])[key].tolist() == [2, 2, 2, 2]
+
+
+def test_query_variants_share_one_entry():
+    model = StubModel()
+    cache = QueryEmbeddingCache(model.encode)
+    first = cache.encode('Calculus')
+    assert cache.encode(' calculus!') is first and cache.encode('CALCULUS') is first
+    assert model.calls == [['Calculus']]
+    assert normalize_query('C++') != normalize_query('C#') != normalize_query('C')
+    assert cache.stats()['hits'] == 2
+
+
+def test_query_cache_is_bounded_by_bytes():
+    model = StubModel()
+    entry_bytes = STUB_DIM * 4 + len('q00')
+    cache = QueryEmbeddingCache(model.encode, max_bytes=3 * entry_bytes)
+    for i in range(5):
+        cache.encode(f"q{i:02d}")
+    assert list(cache._entries) == ['q02', 'q03', 'q04']
+    assert cache.bytes == 3 * entry_bytes and cache.evictions == 2
+
+
+def test_prewarm_encodes_new_distinct_queries_in_batches():
+    model = StubModel()
+    cache = QueryEmbeddingCache(model.encode)
+    cache.encode('Physics')
+    assert cache.prewarm(['Physics', 'physics', 'Biology', 'History', '', 'Chemistry'], limit=3) == 2
+    assert model.calls == [['Physics'], ['Biology', 'History']]
@@ -0,0 +1,67 @@
+# tests/test_group_formation.py
+"""Batch group formation: partitioning a cohort and writing the groups"""
+import numpy as np
+import pytest
+
+from group_formation import form_groups, group_score, load_cohorts, save_groups
+
+
+@pytest.fixture
+def matrix():
+    rng = np.random.default_rng(8)
+    scores = rng.uniform(20, 90, size=(30, 30)).astype(np.float32)
+    scores = (scores + scores.T) / 2
+    np.fill_diagonal(scores, 0)
+    return scores
+
+
+def test_groups_partition_the_cohort_within_size_limits(matrix):
+    preferred = [2, 3, 4, 5, 6, 9] * 5
+    groups = form_groups(matrix, preferred, max_members=6, min_size=2)
+    placed = [student for group in groups for student in group]
+    assert len(placed) == len(set(placed)) == len(matrix)
+    assert all(2 <= len(group) <= 6 for group in groups)
+
+
+def test_swaps_never_lower_the_score(matrix):
+    preferred = [4] * len(matrix)
+    seeded = form_groups(matrix, preferred, passes=0)
+    swapped = form_groups(matrix, preferred)
+    assert sorted(map(len, swapped)) == sorted(map(len, seeded))
+    assert group_score(matrix, swapped) >= group_score(matrix, seeded)
+
+
+def _planned(*members):
+    return [{'title': 'Physics Study Group 1', 'subject': 'Physics', 'description': 'Formed', 'schedule': 'Flexible',
+             'location': 'Campus Study Areas', 'maxMembers': 6, 'leaderId': members[0], 'leader': members[0],
+             'members': [(user_id, user_id, 'Physics', 4) for user_id in members]}]
+
+
+def _memberships(db):
+    from models import GroupMember, StudyGroup
+    active = sorted((member.user_id, member.group_id) for member in db.query(GroupMember).filter_by(status='active'))
+    counts = {group.id: group.current_members for group in db.query(StudyGroup)}
+    db.remove()
+    return active, counts
+
+
+def test_only_ungrouped_students_are_considered_by_default(group_members):
+    assert [user_id for students in load_cohorts().values() for user_id, *_ in students] == ['u3']
+    assert len([student for students in load_cohorts(include_grouped=True).values() for student in students]) == 3
+
+
+def test_regrouping_archives_the_old_memberships(group_members, db):
+    from models import StudyGroup
+    db.query(StudyGroup).filter_by(id='g1').update({'current_members': 2})
+    db.commit()
+    save_groups(_planned('u1', 'u3'), regroup=True)
+    active, counts = _memberships(db)
+    new_group = next(group_id for group_id in counts if group_id != 'g1')
+    assert active == [('u1', new_group), ('u2', 'g1'), ('u3', new_group)]
+    assert counts == {'g1': 1, new_group: 2}
+
+
+def test_plain_save_leaves_existing_memberships_alone(group_members, db):
+    save_groups(_planned('u3'))
+    active, _ = _memberships(db)
+    assert [user_id for user_id, _ in active] == ['u1', 'u2', 'u3']
@@ -0,0 +1,75 @@
+# tests/test_group_index.py
+"""Study groups as aggregate profiles: upsert, membership changes and deletion"""
+import pytest
+
+from group_index import GroupIndex
+
+EVENING = {'Monday': ['Evening (5-9 PM)'], 'Wednesday': ['Evening (5-9 PM)']}
+
+
+def _group(group_id, title, subject, max_members=6):
+    return {'id': group_id, 'title': title, 'subject': subject, 'description': f"Weekly {subject} problem sets",
+            'maxMembers': max_members, 'currentMembers': 99}
+
+
+@pytest.fixture
+def index():
+    index = GroupIndex()
+    index.upsert_group(_group('g1', 'Quantum Mechanics', 'Physics'))
+    index.upsert_group(_group('g2', 'Organic Chemistry', 'Chemistry', max_members=2))
+    index.join('g1', {'id': 'a', 'subjects': ['Physics'], 'schedule': EVENING, 'performanceLevel': 4})
+    index.join('g1', {'id': 'b', 'subjects': ['Mathematics'], 'schedule': {'Monday': ['Morning (8-12 PM)']},
+                      'performanceLevel': 2})
+    index.join('g2', {'id': 'd', 'subjects': ['Chemistry'], 'schedule': EVENING})
+    return index
+
+
+def _matched(index, target):
+    return [index.groups[row]['id'] for row in index.match(target, threshold=0)['rows']]
+
+
+def test_upsert_updates_details_but_not_the_member_count(index):
+    assert index.upsert_group(_group('g1', 'Quantum Mechanics II', 'Physics')) == 0
+    assert len(index) == 2
+    assert index.groups[0]['title'] == 'Quantum Mechanics II'
+    assert index.groups[0]['currentMembers'] == 2
+    rows, _ = index.lexical.search('mechanics ii', 5)
+    assert rows.tolist() == [0]
+
+
+def test_aggregate_follows_joins_and_leaves(index):
+    profile = index._aggregates[0].profile()
+    assert sorted(profile['subjects']) == ['Mathematics', 'Physics']
+    assert profile['schedule']['Monday'] == ['Morning (8-12 PM)', 'Evening (5-9 PM)']
+    assert profile['performanceLevel'] == 3
+    index.leave('g1', 'b')
+    profile = index._aggregates[0].profile()
+    assert profile['subjects'] == ['Physics'] and profile['schedule'] == EVENING
+    assert index.member_ids('g1') == {'a'}
+    # Re-joining replaces the earlier contribution instead of counting twice
+    index.join('g1', {'id': 'a', 'subjects': ['Biology'], 'schedule': {}, 'performanceLevel': 1})
+    assert index._aggregates[0].profile()['subjects'] == ['Biology']
+    assert index.groups[0]['currentMembers'] == 1
+
+
+def test_match_skips_own_full_and_deleted_groups(index):
+    target = {'id': 'c', 'subjects': ['Physics', 'Chemistry'], 'schedule': EVENING}
+    assert _matched(index, target) == ['g1', 'g2']
+    assert _matched(index, dict(target, id='a')) == ['g2']
+    index.join('g2', {'id': 'e', 'subjects': ['Chemistry']})
+    assert _matched(index, target) == ['g1']
+    index.remove_group('g1')
+    assert _matched(index, target) == []
+    assert index.member_groups['a'] == set()
+    assert index.lexical.search('quantum', 5)[0].tolist() == []
+
+
+def test_upserting_a_removed_group_brings_it_back(index):
+    index.remove_group('g1')
+    version = index.version
+    index.upsert_group(_group('g1', 'Quantum Mechanics', 'Physics'))
+    assert index.version > version
+    assert 'deleted' not in index.groups[0]
+    assert index.lexical.search('quantum', 5)[0].tolist() == [0]
+    index.join('g1', {'id': 'a', 'subjects': ['Physics'], 'schedule': EVENING})
+    assert _matched(index, {'id': 'c', 'subjects': ['Physics'], 'schedule': EVENING}) == ['g1', 'g2']
@@ -0,0 +1,91 @@
+# tests/test_lexical_index.py
+"""BM25 keyword index: ranking, phrases, incremental updates and the exported array form"""
+import numpy as np
+import pytest
+
+from lexical_index import LexicalIndex, phrase_key, tokenize
+
+DOCUMENTS = [
+    ('Organic chemistry lab partner', ['Organic Chemistry']),
+    ('Chemistry and physics problem sets', ['Chemistry', 'Physics']),
+    ('Physics', ['Physics']),
+    ('History reading group for the history exam', ['History']),
+    ('C++ programming and data structures', ['Computer Science']),
+    ('C programming', ['Computer Science'])
+]
+QUERIES = ['chemistry', 'organic chemistry', 'physics problem', 'history', 'c++', 'c programming', 'biology']
+
+
+def _mapped(index):
+    """Index served from export() arrays, as a shared snapshot maps them (with spare length rows)"""
+    arrays = index.export()
+    arrays['lengths'] = np.concatenate([arrays['lengths'], np.zeros(8, dtype=np.float32)])
+    return LexicalIndex.from_arrays(arrays)
+
+
+def _assert_same(expected, actual):
+    assert len(actual) == len(expected)
+    for query in QUERIES + ['Physics', 'Computer Science', 'Organic  chemistry']:
+        expected_rows, expected_scores = expected.search(query, 10)
+        rows, scores = actual.search(query, 10)
+        assert rows.tolist() == expected_rows.tolist(), query
+        assert np.allclose(scores, expected_scores), query
+        assert actual.is_phrase(query) == expected.is_phrase(query), query
+
+
+def test_tokenize_keeps_language_suffixes_and_drops_stopwords():
+    assert tokenize('Intro to C++ and C# / Straße') == ['intro', 'c++', 'c#', 'strasse']
+    assert phrase_key('  Organic   Chemistry!') == 'organic chemistry'
+
+
+def test_rare_terms_and_short_documents_rank_first():
+    index = LexicalIndex.build(DOCUMENTS)
+    rows, scores = index.search('physics', 10)
+    # Both rows contain 'physics' once; the one-word profile is the closer match
+    assert rows.tolist() == [2, 1]
+    assert scores[0] > scores[1]
+    assert np.all(scores <= 1.0)
+    rows, _ = index.search('organic chemistry', 10)
+    assert rows[0] == 0
+    assert index.search('c++', 10)[0].tolist() == [4]
+    assert index.search('biology', 10)[0].tolist() == []
+
+
+def test_phrases_are_whole_field_values():
+    index = LexicalIndex.build(DOCUMENTS)
+    assert index.is_phrase('organic chemistry')
+    assert index.is_phrase('Computer  Science')
+    assert not index.is_phrase('organic')
+
+
+def test_upsert_replaces_and_remove_empties_a_row():
+    index = LexicalIndex.build(DOCUMENTS)
+    index.upsert(2, 'Biology field trips', ['Biology'])
+    assert index.search('physics', 10)[0].tolist() == [1]
+    assert index.search('biology', 10)[0].tolist() == [2]
+    assert index.is_phrase('biology')
+    index.remove(3)
+    assert index.search('history', 10)[0].tolist() == []
+    assert not index.is_phrase('history')
+    with pytest.raises(IndexError):
+        index.upsert(len(index) + 1, 'too far')
+
+
+def test_exported_arrays_search_like_the_original():
+    index = LexicalIndex.build(DOCUMENTS)
+    mapped = _mapped(index)
+    _assert_same(index, mapped)
+    assert mapped.stats() == index.stats()
+
+
+def test_updates_on_top_of_exported_arrays():
+    index = LexicalIndex.build(DOCUMENTS)
+    mapped = _mapped(index)
+    for target in (index, mapped):
+        target.upsert(0, 'Biology lab partner', ['Biology'])
+        target.remove(4)
+        target.upsert(len(target), 'Organic chemistry tutoring', ['Organic Chemistry'])
+        target.upsert(len(target), 'History of physics', ['History'])
+    _assert_same(index, mapped)
+    # Re-exporting merges the updates into fresh arrays
+    _assert_same(index, _mapped(mapped))
@@ -0,0 +1,97 @@
+# tests/test_matcher.py
+"""Recommendation ranking checks against the original per-pair loop"""
+import random
+
+import numpy as np
+import pytest
+
+import app
+from scoring import MATCH_THRESHOLD
+
+SUBJECTS = ['Mathematics', 'Physics', 'Computer Science', 'Biology', 'Chemistry', 'History', 'Economics']
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SLOTS = ['Morning (8-12 PM)', 'Afternoon (12-5 PM)', 'Evening (5-9 PM)']
+LEARNING_STYLES = ['Visual learning with diagrams', 'Hands-on coding practice', 'Group discussions', '']
+POPULATION = 400
+TARGETS = 25
+
+
+def make_population(count: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    return [{
+        'id': f"s{i}",
+        'name': f"Student {i}",
+        'major': rng.choice(SUBJECTS),
+        'subjects': rng.sample(SUBJECTS, rng.randint(0, 3)),
+        'schedule': {day: rng.sample(SLOTS, rng.randint(1, 2)) for day in rng.sample(DAYS, rng.randint(0, 3))},
+        'learningStyle': rng.choice(LEARNING_STYLES),
+        'performanceLevel': rng.randint(1, 5)
+    } for i in range(count)]
+
+
+@pytest.fixture
+def population():
+    return make_population(POPULATION)
+
+
+@pytest.fixture
+def matcher(stub_model, population):
+    matcher = app.AIStudentMatcher()
+    # Rank from scratch on every call rather than from cached results
+    matcher.results.max_entries = 0
+    matcher.add_students([dict(student) for student in population])
+    return matcher
+
+
+def per_pair_ranking(matcher, population, target):
+    """(id, matchPercentage) of every match as the original loop over all students produced them"""
+    matches = []
+    for student in population:
+        if student['id'] == target['id']:
+            continue
+        subject = matcher.calculate_subject_similarity(target, student)
+        schedule = matcher.calculate_schedule_overlap(target.get('schedule', {}), student.get('schedule', {}))
+        learning_style = matcher.calculate_learning_style_similarity(target, student)
+        performance = 1 - abs(target.get('performanceLevel', 3) - student.get('performanceLevel', 3)) / 4
+        match_percentage = int((subject * 0.4 + schedule * 0.3 + learning_style * 0.2 + performance * 0.1) * 100)
+        if match_percentage > MATCH_THRESHOLD:
+            matches.append((len(matches) + 1, match_percentage))
+    # Stable: equal percentages keep population order
+    return sorted(matches, key=lambda match: match[1], reverse=True)
+
+
+def matches_of(cards):
+    return [(card['id'], card['matchPercentage']) for card in cards if card['matchPercentage'] is not None]
+
+
+def test_columnar_scorer_matches_per_pair_ranking(matcher, population):
+    matched = 0
+    for target in population[:TARGETS]:
+        expected = per_pair_ranking(matcher, population, target)
+        assert matches_of(matcher.generate_recommendations(target)) == expected
+        matched += len(expected)
+    assert matched > TARGETS
+
+
+def test_cursor_pages_concatenate_to_full_list(matcher, population):
+    for target in population[:TARGETS]:
+        full = [card['id'] for card in matcher.generate_recommendations(target)]
+        paged, cursor = [], None
+        while True:
+            page = matcher.recommendation_page(target, limit=7, cursor=cursor)
+            paged.extend(card['id'] for card in page['recommendations'])
+            cursor = page['nextCursor']
+            if cursor is None:
+                break
+        assert paged == full
+
+
+def test_candidate_pruning_loses_no_match(matcher, population):
+    scoring = matcher.scoring
+    for target in population[:TARGETS]:
+        style_vector = matcher.get_style_vector(target)
+        pruned = scoring.match(target, style_vector, MATCH_THRESHOLD)
+        full = scoring.score(target, style_vector)
+        keep = full['match_percentage'] > MATCH_THRESHOLD
+        assert np.array_equal(pruned['rows'], full['rows'][keep])
+        assert np.array_equal(pruned['match_percentage'], full['match_percentage'][keep])
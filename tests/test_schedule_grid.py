@@ -0,0 +1,76 @@
+# tests/test_schedule_grid.py
+"""Schedule parsing onto the weekly grid, overlap scores and /api/availability"""
+import numpy as np
+import pytest
+
+from schedule_grid import (DAY_SHIFT, SLOTS, day_index, mask_schedule, overlap_scores, popcount, schedule_mask,
+                           schedule_overlap, slot_index)
+
+
+@pytest.mark.parametrize('day, index', [('Monday', 0), ('mon', 0), (' SUNDAY ', 6), ('Thurs', 3), ('someday', None)])
+def test_day_names(day, index):
+    assert day_index(day) == index
+
+
+@pytest.mark.parametrize('slot, index', [
+    ('Morning (8-12 PM)', 0), ('afternoon', 1), ('Evening (5-9 PM)', 2), ('Night (9 PM-12 AM)', 3),
+    ('9am', 0), ('14:00', 1), ('2 pm', 1), ('12pm', 1), ('6:30 PM', 2), ('22:00', 3), ('whenever', None)
+])
+def test_slot_names(slot, index):
+    assert slot_index(slot) == index
+
+
+def test_free_form_schedules_normalize_to_canonical_names():
+    schedule = {'mon': ['evening', '18:00'], 'Tue': [], 'Funday': ['Morning (8-12 PM)'], 'WED': ['noonish', '9 AM']}
+    assert mask_schedule(schedule_mask(schedule)) == {
+        'Monday': ['Evening (5-9 PM)'],
+        'Tuesday': [],
+        'Wednesday': ['Morning (8-12 PM)']
+    }
+    # A listed day without slots still counts as listed
+    assert schedule_mask({'Tuesday': None}) == 1 << (DAY_SHIFT + 1)
+    assert schedule_mask(None) == 0
+
+
+def _set_overlap(schedule1, schedule2):
+    # The original set-based calculation: only days both students listed count
+    shared_days = set(schedule1) & set(schedule2)
+    overlap = union = 0
+    for day in shared_days:
+        overlap += len(set(schedule1[day]) & set(schedule2[day]))
+        union += len(set(schedule1[day]) | set(schedule2[day]))
+    return overlap / max(union, 1)
+
+
+def test_overlap_matches_the_set_based_calculation():
+    rng = np.random.default_rng(5)
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    schedules = [{day: sorted(rng.choice(SLOTS, rng.integers(0, 3), replace=False)) for day in
+                  rng.choice(days, rng.integers(0, 4), replace=False)} for _ in range(60)]
+    masks = np.array([schedule_mask(schedule) for schedule in schedules], dtype=np.uint64)
+    for schedule in schedules[:10]:
+        target = schedule_mask(schedule)
+        expected = [_set_overlap(schedule, other) for other in schedules]
+        assert np.allclose(overlap_scores(target, masks), expected if target else 0)
+        assert [schedule_overlap(target, int(mask)) for mask in masks] == pytest.approx(expected)
+    assert popcount(masks).tolist() == [sum(len(slots) for slots in schedule.values()) for schedule in schedules]
+
+
+def test_availability_requires_a_token_and_hides_names(stub_model, group_members, monkeypatch):
+    import app
+    matcher = app.AIStudentMatcher()
+    monkeypatch.setattr(app, 'matcher', matcher)
+    evening = {'Monday': ['Evening (5-9 PM)'], 'Friday': ['Evening (5-9 PM)']}
+    matcher.add_students([
+        {'id': 'u1', 'name': 'User 1', 'major': 'Physics', 'schedule': evening},
+        {'id': 'u2', 'name': 'User 2', 'major': 'Biology', 'schedule': {'Monday': ['Evening (5-9 PM)']}},
+        {'id': 'u3', 'name': 'User 3', 'major': 'History', 'schedule': {'Monday': ['Morning (8-12 PM)']}}
+    ])
+    client = app.app.test_client()
+    assert client.post('/api/availability', json={'schedule': evening}).status_code == 401
+    body = client.post('/api/availability', headers=group_members['u1'], json={'schedule': evening}).get_json()
+    assert body == {'success': True, 'total': 1, 'students': [
+        {'id': 'u2', 'major': 'Biology', 'commonSlots': 1, 'commonSchedule': {'Monday': ['Evening (5-9 PM)']}}
+    ]}
+    response = client.post('/api/availability', headers=group_members['u1'], json={'schedule': evening, 'limit': 0})
+    assert response.status_code == 400
@@ -0,0 +1,121 @@
+# tests/test_shared_store.py
+"""Shared snapshots: publish and attach, replay of unpublished profiles, forwarding to the writer"""
+import os
+from collections import deque
+
+import pytest
+
+import app
+from shared_store import SharedStore, publish
+from test_matcher import make_population
+
+
+@pytest.fixture
+def population():
+    return make_population(60, seed=11)
+
+
+def _matcher(population=()):
+    matcher = app.AIStudentMatcher()
+    matcher.pending_profiles = deque()
+    matcher.add_students([dict(student) for student in population])
+    return matcher
+
+
+def _ranking(matcher, target):
+    return [(card['id'], card['matchPercentage']) for card in matcher.generate_recommendations(target)]
+
+
+def test_attached_snapshot_ranks_like_the_source(stub_model, tmp_path, population):
+    source = _matcher(population)
+    publish(source, str(tmp_path))
+    reader = _matcher()
+    assert SharedStore(str(tmp_path)).attach(reader)
+    assert len(reader.students) == len(population)
+    for target in population[:10]:
+        assert _ranking(reader, target) == _ranking(source, target)
+
+
+def test_reader_replays_profiles_missing_from_the_snapshot(stub_model, tmp_path, population):
+    publish(_matcher(population[:50]), str(tmp_path))
+    reader = _matcher(population[50:])
+    SharedStore(str(tmp_path)).attach(reader)
+    assert len(reader.students) == len(population)
+    assert all(reader.scoring.rows_for(student['id']) for student in population)
+    assert len(reader.pending_profiles) == 10
+
+
+def test_writer_keeps_profiles_added_while_publishing(stub_model, tmp_path, population):
+    writer = _matcher(population[:50])
+    store = SharedStore(str(tmp_path))
+    with writer.write_lock:
+        published = writer.version
+        publish(writer, str(tmp_path))
+    # Arrives after the snapshot was written but before the writer maps it
+    writer.add_student(dict(population[50]))
+    store.attach(writer, published=published)
+    assert len(writer.students) == 51
+    assert writer.scoring.rows_for(population[50]['id'])
+    assert [profile['id'] for _, profile in writer.pending_profiles] == [population[50]['id']]
+
+
+def test_forwarded_profiles_reach_the_next_snapshot(stub_model, tmp_path, population):
+    writer = _matcher(population[:50])
+    writer_store, reader_store = SharedStore(str(tmp_path)), SharedStore(str(tmp_path))
+    publish(writer, str(tmp_path))
+    writer_store.attach(writer)
+    reader = _matcher()
+    reader_store.attach(reader)
+
+    posted = [dict(student) for student in population[50:]]
+    reader.add_students(posted)
+    reader_store.forward(posted)
+    writer_store.is_writer = True
+    writer_store._published = writer.version
+    writer_store.sync(writer, lambda matcher, since: since)
+
+    assert os.listdir(tmp_path / 'inbox') == []
+    assert all(writer.scoring.rows_for(student['id']) for student in population[50:])
+    reader_store.attach(reader)
+    assert len(reader.students) == len(population)
+    assert not reader.pending_profiles
+
+
+def test_pending_profiles_are_bounded(stub_model, tmp_path, population, monkeypatch):
+    monkeypatch.setattr(app, 'SHARED_PENDING_LIMIT', 5)
+    publish(_matcher(population[:10]), str(tmp_path))
+    reader = _matcher()
+    SharedStore(str(tmp_path)).attach(reader)
+    reader.add_students([dict(student) for student in population[10:30]])
+    assert len(reader.pending_profiles) == 5
+
+
+def test_snapshot_carries_the_keyword_index(stub_model, tmp_path, population, monkeypatch):
+    source = _matcher(population)
+    source.keyword_index()
+    publish(source, str(tmp_path))
+    reader = _matcher()
+    SharedStore(str(tmp_path)).attach(reader)
+    assert reader.lexical_index is not None and len(reader.lexical_index) == len(population)
+    reader.add_student(dict(population[0], id='late', subjects=['History'], major='History'))
+    source.add_student(dict(population[0], id='late', subjects=['History'], major='History'))
+    for query in ('Physics', 'history visual', 'Computer Science coding'):
+        for mode in ('hybrid', 'lexical'):
+            monkeypatch.setattr(app, 'matcher', source)
+            expected = app.hybrid_search_groups(query, mode=mode)
+            monkeypatch.setattr(app, 'matcher', reader)
+            assert app.hybrid_search_groups(query, mode=mode) == expected
+
+
+def test_snapshot_worker_prewarms_its_subjects(stub_model, tmp_path, population, monkeypatch):
+    from embedding_cache import normalize_query
+    publish(_matcher(population), str(tmp_path))
+    reader = _matcher()
+    SharedStore(str(tmp_path)).attach(reader)
+    monkeypatch.setattr(app, 'matcher', reader)
+    monkeypatch.setattr(app, 'shared_store', None)
+    monkeypatch.setattr(app.model, 'start_background', lambda: None)
+    app.start_background_work()
+    reader.query_embeddings._thread.join(5)
+    subjects = {subject for student in population for subject in student['subjects']}
+    assert set(reader.query_embeddings._entries) == {normalize_query(subject) for subject in subjects}
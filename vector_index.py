@@ -0,0 +1,98 @@
+# vector_index.py
+import threading
+
+import numpy as np
+
+_INITIAL_ROWS = 64
+
+
+def top_k_rows(scores, top_k: int, rows=None):
+    """Return ``(rows, scores)`` for the ``top_k`` highest scores, best first"""
+    top_k = min(top_k, len(scores))
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    order = candidates[np.argsort(-scores[candidates], kind='stable')]
+    if rows is None:
+        return order, scores[order]
+    return rows[order], scores[order]
+
+
+class ExactSearch:
+    """Brute-force backend: scores every row of the index"""
+
+    name = 'exact'
+
+    def on_upsert(self, index, row, vector):
+        pass
+
+    def on_attach(self, index):
+        pass
+
+    def search(self, index, query, top_k: int):
+        return top_k_rows(index.vectors @ query, top_k)
+
+    def stats(self) -> dict:
+        return {'backend': self.name}
+
+
+class VectorIndex:
+    """Resident matrix of normalized embeddings, one row per student row.
+
+    Rows are appended when ``row == size`` and overwritten in place
+    otherwise, so the matrix never has to be rebuilt. ``version`` increases
+    on every write. Queries are delegated to ``backend`` (exact scan by
+    default, see ann_index.py for IVF).
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or ExactSearch()
+        self.size = 0
+        self.version = 0
+        self._vectors = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """Live view of the populated rows"""
+        if self._vectors is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._vectors[:self.size]
+
+    def attach(self, vectors, size: int):
+        """Use ``vectors`` (e.g. a memory-mapped snapshot) as storage; rows past ``size`` are spare"""
+        with self._lock:
+            self._vectors = vectors
+            self.size = size
+            self.version += 1
+        self.backend.on_attach(self)
+
+    def upsert(self, row: int, vector) -> int:
+        """Store ``vector`` in ``row`` (``row == size`` appends) and return the row"""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        with self._lock:
+            if row > self.size:
+                raise IndexError(f"row {row} is past the end of the index ({self.size} rows)")
+            if self._vectors is None:
+                self._vectors = np.zeros((_INITIAL_ROWS, vector.shape[0]), dtype=np.float32)
+            elif row >= self._vectors.shape[0]:
+                grown = np.zeros((self._vectors.shape[0] * 2, self._vectors.shape[1]), dtype=np.float32)
+                grown[:row] = self._vectors[:row]
+                self._vectors = grown
+            self._vectors[row] = vector
+            if row == self.size:
+                self.size += 1
+            self.version += 1
+        self.backend.on_upsert(self, row, vector)
+        return row
+
+    def search(self, query_vector, top_k: int = 5):
+        """Return ``(rows, scores)`` of the ``top_k`` best dot-product matches"""
+        if self.size == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32).reshape(-1)
+        return self.backend.search(self, query, top_k)